@@ -1,34 +1,95 @@
 from django.contrib import admin
-from .models import Document, QASession, Test, TestAttempt
+from .models import (
+    BankQuestion, Document, DocumentStats, QASession, SearchEntry, Test, TestAttempt, ProcessingJob, UserStats,
+)
+from .search import matching_object_ids
+
+
+class FullTextSearchMixin:
+    """Add the full-text index's matches (see ``core.search``) to the admin's search results."""
+    full_text_kinds = []
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            ids = matching_object_ids(search_term, self.full_text_kinds)
+            if ids:
+                results = results | queryset.filter(pk__in=ids)
+        return results, may_have_duplicates
 
 
 @admin.register(Document)
-class DocumentAdmin(admin.ModelAdmin):
+class DocumentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ['title', 'user', 'is_processed', 'uploaded_at']
+    list_select_related = ['user']
     list_filter = ['is_processed', 'uploaded_at', 'user']
     search_fields = ['title', 'user__username']
+    full_text_kinds = [SearchEntry.KIND_DOCUMENT, SearchEntry.KIND_SUMMARY]
     readonly_fields = ['id', 'uploaded_at', 'updated_at']
 
+    def get_queryset(self, request):
+        # The changelist doesn't show the summary; the change form loads it with the object
+        return super().get_queryset(request).listing()
+
 
 @admin.register(QASession)
-class QASessionAdmin(admin.ModelAdmin):
+class QASessionAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ['document', 'user', 'created_at']
+    list_select_related = ['document', 'user']
     list_filter = ['created_at', 'user']
-    search_fields = ['question', 'answer', 'document__title']
+    search_fields = ['document__title']
+    full_text_kinds = [SearchEntry.KIND_QA]  # question and answer, through the full-text index
     readonly_fields = ['id', 'created_at']
 
 
 @admin.register(Test)
 class TestAdmin(admin.ModelAdmin):
     list_display = ['title', 'document', 'user', 'created_at']
+    list_select_related = ['document', 'user']
     list_filter = ['created_at', 'user']
     search_fields = ['title', 'document__title']
     readonly_fields = ['id', 'created_at']
 
 
+@admin.register(BankQuestion)
+class BankQuestionAdmin(admin.ModelAdmin):
+    list_display = ['question', 'document', 'correct_answer', 'times_served', 'created_at']
+    list_select_related = ['document']
+    list_filter = ['created_at']
+    search_fields = ['question', 'document__title']
+    readonly_fields = ['question_hash', 'created_at']
+
+
 @admin.register(TestAttempt)
 class TestAttemptAdmin(admin.ModelAdmin):
     list_display = ['test', 'user', 'score', 'total_questions', 'percentage', 'completed_at']
+    list_select_related = ['test', 'user']
     list_filter = ['completed_at', 'user']
     search_fields = ['test__title', 'user__username']
-    readonly_fields = ['id', 'completed_at', 'percentage']
\ No newline at end of file
+    readonly_fields = ['id', 'completed_at', 'percentage']
+
+
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    list_display = ['document', 'kind', 'status', 'stage', 'progress', 'attempts', 'created_at']
+    list_select_related = ['document']
+    list_filter = ['kind', 'status', 'stage', 'created_at']
+    search_fields = ['document__title', 'error']
+    readonly_fields = ['id', 'created_at', 'updated_at', 'started_at', 'finished_at']
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'document_count', 'attempt_count', 'qa_count', 'average_percentage', 'is_stale', 'updated_at']
+    list_select_related = ['user']
+    list_filter = ['is_stale']
+    search_fields = ['user__username']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(DocumentStats)
+class DocumentStatsAdmin(admin.ModelAdmin):
+    list_display = ['document', 'test_count', 'attempt_count', 'qa_count', 'average_percentage', 'updated_at']
+    list_select_related = ['document']
+    search_fields = ['document__title']
+    readonly_fields = ['updated_at']
@@ -0,0 +1,221 @@
+"""
+Prompt-keyed response cache for AI model calls.
+
+Responses are cached in two tiers: a per-process in-memory LRU with a TTL,
+backed by a persistent Django cache (``AI_RESPONSE_CACHE['PERSISTENT_CACHE']``,
+file-based by default) shared between worker processes. The cache wraps the
+model handle returned by ``core.utils.get_model()``, so callers keep calling
+``model.generate_content(prompt)``.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TTL': 60 * 60 * 24,
+    'MAX_ENTRIES': 512,
+    'PERSISTENT_CACHE': 'ai_responses',
+    'DISABLED_FUNCTIONS': [],
+}
+
+
+def get_cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'AI_RESPONSE_CACHE', {})}
+
+
+class CachedResponse:
+    """Stand-in for a model response served from the cache."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + persistent) cache of response texts with hit/miss counters."""
+
+    def __init__(self, max_entries, ttl, persistent_alias=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persistent_alias = persistent_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'memory_hits': 0, 'persistent_hits': 0, 'misses': 0})
+
+    @property
+    def persistent(self):
+        if not self.persistent_alias:
+            return None
+        try:
+            return caches[self.persistent_alias]
+        except InvalidCacheBackendError:
+            return None
+
+    def get(self, key, namespace='default'):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, text = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats[namespace]['memory_hits'] += 1
+                    return text
+                del self._entries[key]
+
+        text = self.persistent.get(key) if self.persistent else None
+        with self._lock:
+            if text is None:
+                self._stats[namespace]['misses'] += 1
+                return None
+            self._stats[namespace]['persistent_hits'] += 1
+        self._remember(key, text)
+        return text
+
+    def set(self, key, text):
+        self._remember(key, text)
+        if self.persistent:
+            self.persistent.set(key, text, timeout=self.ttl)
+
+    def _remember(self, key, text):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.persistent:
+            self.persistent.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'functions': {name: dict(counts) for name, counts in self._stats.items()},
+            }
+
+
+class CachedModel:
+    """
+    Wrap a generative model so identical prompts are answered from the cache.
+
+    ``generate_content(prompt, cache_namespace=...)`` names the calling
+    function; namespaces listed in ``DISABLED_FUNCTIONS`` bypass the cache.
+    The wrapped model gets the namespace too (see core/singleflight.py).
+    Any other attribute is delegated to the wrapped model.
+    """
+
+    def __init__(self, model, cache, model_name='', disabled_functions=()):
+        self._model = model
+        self._cache = cache
+        self._model_name = model_name
+        self._disabled_functions = set(disabled_functions)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def cache_key(self, prompt):
+        digest = hashlib.sha256(f"{self._model_name}\0{prompt}".encode('utf-8')).hexdigest()
+        return f"ai-response:{digest}"
+
+    def _caches(self, cache_namespace):
+        return self._cache is not None and cache_namespace not in self._disabled_functions
+
+    def cached_text(self, prompt, cache_namespace='default'):
+        """Cached response text for a prompt, or None (used by streaming callers)."""
+        if not self._caches(cache_namespace):
+            return None
+        return self._cache.get(self.cache_key(prompt), namespace=cache_namespace)
+
+    def cache_text(self, prompt, text, cache_namespace='default'):
+        """Store a response assembled by the caller, e.g. from a stream."""
+        if text and self._caches(cache_namespace):
+            self._cache.set(self.cache_key(prompt), text)
+
+    def generate_content(self, prompt, *args, cache_namespace='default', **kwargs):
+        # Streaming or customised calls aren't byte-identical requests; pass them through.
+        if args or kwargs or not isinstance(prompt, str):
+            return self._model.generate_content(prompt, *args, **kwargs)
+        if not self._caches(cache_namespace):
+            return self._model.generate_content(prompt, cache_namespace=cache_namespace)
+
+        key = self.cache_key(prompt)
+        text = self._cache.get(key, namespace=cache_namespace)
+        if text is not None:
+            logger.debug(f"AI response cache hit for {cache_namespace}")
+            return CachedResponse(text)
+
+        response = self._model.generate_content(prompt, cache_namespace=cache_namespace)
+        try:
+            text = response.text if response else None
+        except ValueError:
+            # Blocked responses raise on .text; don't cache them.
+            text = None
+        if text:
+            self._cache.set(key, text)
+        return response
+
+    async def generate_content_async(self, prompt, *args, cache_namespace='default', **kwargs):
+        """Async counterpart of generate_content, sharing the same cache."""
+        if args or kwargs or not isinstance(prompt, str):
+            return await self._model.generate_content_async(prompt, *args, **kwargs)
+        if not self._caches(cache_namespace):
+            return await self._model.generate_content_async(prompt, cache_namespace=cache_namespace)
+
+        key = self.cache_key(prompt)
+        # Cache lookups may touch the persistent (file) tier; keep that off the event loop.
+        text = await sync_to_async(self._cache.get, thread_sensitive=False)(key, namespace=cache_namespace)
+        if text is not None:
+            logger.debug(f"AI response cache hit for {cache_namespace}")
+            return CachedResponse(text)
+
+        response = await self._model.generate_content_async(prompt, cache_namespace=cache_namespace)
+        try:
+            text = response.text if response else None
+        except ValueError:
+            text = None
+        if text:
+            await sync_to_async(self._cache.set, thread_sensitive=False)(key, text)
+        return response
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide response cache."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            options = get_cache_settings()
+            _response_cache = ResponseCache(
+                max_entries=options['MAX_ENTRIES'],
+                ttl=options['TTL'],
+                persistent_alias=options['PERSISTENT_CACHE'],
+            )
+    return _response_cache
+
+
+def wrap_model(model, model_name=''):
+    """Wrap a model handle with the response cache (a pass-through when disabled)."""
+    options = get_cache_settings()
+    if model is None:
+        return None
+    return CachedModel(
+        model,
+        get_response_cache() if options['ENABLED'] else None,
+        model_name=model_name,
+        disabled_functions=options['DISABLED_FUNCTIONS'],
+    )
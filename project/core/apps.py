@@ -3,4 +3,12 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'core'
\ No newline at end of file
+    name = 'core'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from . import caching, metrics, search, stats, tasks, uploads  # noqa: F401 -- they register signal receivers
+
+        # Resume unfinished document processing once the process serves traffic,
+        # rather than touching the database during migrate/check.
+        request_started.connect(tasks.resume_on_first_request, dispatch_uid='core.tasks.resume')
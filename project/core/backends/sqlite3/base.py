@@ -0,0 +1,36 @@
+"""
+SQLite backend tuned for concurrent requests.
+
+SQLite's defaults suit a single writer: each commit fsyncs a rollback
+journal, and a writer locks readers out. Every new connection therefore
+sets the pragmas in ``settings.SQLITE_PRAGMAS``:
+
+- ``journal_mode=WAL``, when ``SQLITE_JOURNAL_MODE=wal`` opts in, lets
+  readers carry on while one connection writes;
+- ``synchronous=NORMAL``, with WAL, skips the fsync on each commit (a
+  power cut can lose the last commits but not corrupt the database);
+- ``busy_timeout`` makes a writer wait for the write lock instead of
+  failing with "database is locked";
+- ``mmap_size`` serves reads from the page cache without copying.
+
+Transactions also start with ``BEGIN IMMEDIATE`` (``SQLITE_TRANSACTION_MODE``),
+taking the write lock up front. A deferred transaction that reads first and
+then writes can't wait for the lock: if another connection wrote in between,
+SQLite fails it at once, whatever the busy timeout.
+"""
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            if value in ('', None):
+                continue  # Left at SQLite's default
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = getattr(settings, 'SQLITE_TRANSACTION_MODE', '')
+        self.cursor().execute(f"BEGIN {mode}".strip())
@@ -0,0 +1,27 @@
+"""
+Django template backend that times each render (see core/metrics.py).
+
+Only templates rendered through the backend are timed, i.e. the page
+templates views render; ``{% include %}`` and ``{% extends %}`` count
+towards the page that pulls them in.
+"""
+import time
+
+from django.template.backends import django as base
+
+from ..metrics import is_enabled, observe_template
+
+
+class Template(base.Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            observe_template(self.template.name, time.perf_counter() - started)
+
+
+class DjangoTemplates(base.DjangoTemplates):
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return Template(template.template, self) if is_enabled() else template
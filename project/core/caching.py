@@ -0,0 +1,119 @@
+"""
+Caching for pages whose content doesn't change once created.
+
+A test's questions, a finished attempt's results and a document's summary
+are rendered once into the ``fragments`` cache by ``{% cache %}`` blocks
+keyed by the object and its owner. The receivers below drop them on the
+rare saves and deletes that change them. The cache is file-based, so an
+invalidation in one worker process is seen by all of them.
+
+The same views answer conditional GETs: ``conditional_page`` sets ETag and
+Last-Modified from the page's timestamp, so a browser revalidating an
+unchanged page gets a 304 after one small query.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models.signals import post_delete, post_save
+from django.db.models import Max
+from django.dispatch import receiver
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .models import Document, Test, TestAttempt
+
+FRAGMENT_CACHE = 'fragments'
+
+# {% cache %} fragment names, keyed in templates by [object id, user id]
+DOCUMENT_FRAGMENTS = ['document_summary']
+TEST_FRAGMENTS = ['test_header', 'test_questions']
+ATTEMPT_FRAGMENTS = ['attempt_result']
+
+
+def invalidate_fragments(names, object_id, user_id):
+    caches[FRAGMENT_CACHE].delete_many(
+        [make_template_fragment_key(name, [object_id, user_id]) for name in names]
+    )
+
+
+def latest_change(queryset, *fields):
+    """The latest of the given timestamp fields over ``queryset``, or None if it has no rows."""
+    row = queryset.aggregate(**{f'latest_{i}': Max(field) for i, field in enumerate(fields)})
+    timestamps = [timestamp for timestamp in row.values() if timestamp]
+    return max(timestamps) if timestamps else None
+
+
+def conditional_page(timestamp_func):
+    """
+    Answer conditional GETs for a per-user page.
+
+    ``timestamp_func(request, *args, **kwargs)`` returns when the page last
+    changed, or None if it doesn't exist for this user (the view then 404s).
+    The ETag also covers the user and their CSRF cookie, since pages embed a
+    CSRF token and that changes at login. While messages are queued (e.g.
+    after a redirect with an error) the page is rendered in full, without
+    validators, so the messages are shown.
+    """
+    def decorator(view_func):
+        def last_modified(request, *args, **kwargs):
+            # condition() asks for the ETag and Last-Modified separately; look up once
+            if not hasattr(request, '_page_timestamp'):
+                request._page_timestamp = timestamp_func(request, *args, **kwargs)
+            return request._page_timestamp
+
+        def etag(request, *args, **kwargs):
+            timestamp = last_modified(request, *args, **kwargs)
+            if timestamp is None:
+                return None
+            csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+            return hashlib.sha256(f"{request.user.pk}:{csrf_cookie}:{timestamp.isoformat()}".encode()).hexdigest()[:32]
+
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view_func)
+
+        @wraps(view_func)
+        def view(request, *args, **kwargs):
+            # len() doesn't mark the messages as seen; the template still shows them
+            if len(get_messages(request)):
+                return view_func(request, *args, **kwargs)
+            return conditional_view(request, *args, **kwargs)
+
+        # Browsers may keep the page but must revalidate it; shared caches must not store it
+        return cache_control(private=True, no_cache=True)(view)
+    return decorator
+
+
+@receiver(post_save, sender=Document, dispatch_uid='core.caching.document_saved')
+def document_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        return
+    if update_fields is None or {'summary', 'title'} & set(update_fields):
+        invalidate_fragments(DOCUMENT_FRAGMENTS, instance.id, instance.user_id)
+    if update_fields is None or 'title' in update_fields:
+        # Test and result pages show the document title
+        for test_id in Test.objects.filter(document=instance).values_list('id', flat=True):
+            invalidate_fragments(TEST_FRAGMENTS, test_id, instance.user_id)
+        for attempt_id in TestAttempt.objects.filter(test__document=instance).values_list('id', flat=True):
+            invalidate_fragments(ATTEMPT_FRAGMENTS, attempt_id, instance.user_id)
+
+
+@receiver(post_delete, sender=Document, dispatch_uid='core.caching.document_deleted')
+def document_deleted(sender, instance, **kwargs):
+    invalidate_fragments(DOCUMENT_FRAGMENTS, instance.id, instance.user_id)
+
+
+@receiver(post_save, sender=Test, dispatch_uid='core.caching.test_saved')
+@receiver(post_delete, sender=Test, dispatch_uid='core.caching.test_deleted')
+def test_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_fragments(TEST_FRAGMENTS, instance.id, instance.user_id)
+
+
+@receiver(post_save, sender=TestAttempt, dispatch_uid='core.caching.attempt_saved')
+@receiver(post_delete, sender=TestAttempt, dispatch_uid='core.caching.attempt_deleted')
+def attempt_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_fragments(ATTEMPT_FRAGMENTS, instance.id, instance.user_id)
@@ -0,0 +1,213 @@
+"""
+Compression for large text columns (see ``core.fields.CompressedTextField``).
+
+Values are stored as a small header followed by the compressed bytes:
+
+    1 byte   codec (raw, zlib or zstd), with WIDE_ID set
+    4 bytes  id of the CompressionDictionary used, 0 for none (not for raw)
+
+Values written before dictionary ids took 4 bytes have WIDE_ID clear and a
+2-byte id; they are still read.
+
+Short values are stored raw, since compressing them doesn't pay off. A
+shared dictionary trained on existing content (``manage.py
+train_compression_dictionary``) makes even medium-sized values compress
+well, because the common vocabulary doesn't have to be repeated in every
+row. zstd is used when the ``zstandard`` package is installed and
+configured; otherwise zlib, which is in the standard library. Data
+migrations compress inside ``dictionaries_disabled()``, since the active
+dictionary is looked up with the live model.
+"""
+import logging
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_NAMES = {'zlib': CODEC_ZLIB, 'zstd': CODEC_ZSTD}
+
+# Flag in the codec byte: the dictionary id that follows takes 4 bytes, not 2
+WIDE_ID = 0x80
+HEADER = struct.Struct('>BI')
+LEGACY_HEADER = struct.Struct('>BH')
+
+DEFAULTS = {
+    'CODEC': 'zlib',
+    'LEVEL': 6,
+    'MIN_LENGTH': 128,  # bytes; shorter values are stored raw
+}
+
+# zlib can only look back 32 KB, so a longer dictionary is wasted
+ZLIB_MAX_DICTIONARY = 32 * 1024
+
+# How long a process keeps using its cached active dictionary before checking for a newer one
+ACTIVE_DICTIONARY_TTL = 300
+
+_dictionaries = {}  # id -> bytes
+_active = {}  # codec -> (checked_at, id, bytes)
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_compression_settings():
+    options = {**DEFAULTS, **getattr(settings, 'TEXT_COMPRESSION', {})}
+    if options['CODEC'] == 'zstd' and zstandard is None:
+        logger.warning("TEXT_COMPRESSION uses zstd but the zstandard package is not installed; using zlib")
+        options['CODEC'] = 'zlib'
+    return options
+
+
+def get_dictionary(dictionary_id):
+    """Dictionary bytes by id (dictionaries never change, so they are cached for good)."""
+    with _lock:
+        data = _dictionaries.get(dictionary_id)
+    if data is None:
+        from .models import CompressionDictionary
+
+        data = bytes(CompressionDictionary.objects.values_list('data', flat=True).get(id=dictionary_id))
+        with _lock:
+            _dictionaries[dictionary_id] = data
+    return data
+
+
+def get_active_dictionary(codec):
+    """``(id, bytes)`` of the newest dictionary for a codec, or ``(0, None)``."""
+    now = time.monotonic()
+    with _lock:
+        cached = _active.get(codec)
+    if cached and now - cached[0] < ACTIVE_DICTIONARY_TTL:
+        return cached[1], cached[2]
+
+    from .models import CompressionDictionary
+
+    latest = CompressionDictionary.objects.filter(codec=codec).order_by('-id').values_list('id', 'data').first()
+    dictionary_id, data = (latest[0], bytes(latest[1])) if latest else (0, None)
+    with _lock:
+        _active[codec] = (now, dictionary_id, data)
+        if dictionary_id:
+            _dictionaries[dictionary_id] = data
+    return dictionary_id, data
+
+
+@contextmanager
+def dictionaries_disabled():
+    """Compress without a shared dictionary in this thread for the duration of the block."""
+    previous = getattr(_local, 'disabled', False)
+    _local.disabled = True
+    try:
+        yield
+    finally:
+        _local.disabled = previous
+
+
+def reset_dictionary_cache():
+    with _lock:
+        _dictionaries.clear()
+        _active.clear()
+
+
+def _compress_bytes(data, codec, level, dictionary):
+    if codec == CODEC_ZSTD:
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdCompressor(level=level, dict_data=dict_data).compress(data)
+    compressor = zlib.compressobj(level, zdict=dictionary) if dictionary else zlib.compressobj(level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _decompress_bytes(body, codec, dictionary):
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Value was compressed with zstd but the zstandard package is not installed")
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(body)
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return decompressor.decompress(body) + decompressor.flush()
+
+
+def compress_text(text, use_dictionary=True):
+    """Encode text for storage."""
+    data = text.encode('utf-8')
+    if not data:
+        return b''
+
+    options = get_compression_settings()
+    if len(data) < options['MIN_LENGTH']:
+        return bytes([CODEC_RAW]) + data
+
+    codec = CODEC_NAMES[options['CODEC']]
+    if use_dictionary and not getattr(_local, 'disabled', False):
+        dictionary_id, dictionary = get_active_dictionary(options['CODEC'])
+    else:
+        dictionary_id, dictionary = 0, None
+    body = _compress_bytes(data, codec, options['LEVEL'], dictionary)
+    if len(body) + HEADER.size >= len(data) + 1:
+        return bytes([CODEC_RAW]) + data
+    return HEADER.pack(codec | WIDE_ID, dictionary_id) + body
+
+
+def decompress_text(value):
+    """Decode a stored value back to text. Plain strings (not yet compressed) pass through."""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    if not value:
+        return ''
+    if value[0] == CODEC_RAW:
+        return value[1:].decode('utf-8')
+
+    header = HEADER if value[0] & WIDE_ID else LEGACY_HEADER
+    codec, dictionary_id = header.unpack_from(value)
+    dictionary = get_dictionary(dictionary_id) if dictionary_id else None
+    return _decompress_bytes(value[header.size:], codec & ~WIDE_ID, dictionary).decode('utf-8')
+
+
+def train_zlib_dictionary(samples, size=ZLIB_MAX_DICTIONARY):
+    """
+    Build a zlib preset dictionary from sample texts.
+
+    zlib has no trainer, so this collects the word sequences that would save
+    the most bytes (frequency x length) and concatenates them, most valuable
+    last, since zlib finds matches closer to the end of the window cheaper.
+    """
+    counts = Counter()
+    for text in samples:
+        words = text.split()
+        for n in (2, 3, 4, 6):
+            for i in range(0, len(words) - n + 1):
+                counts[" ".join(words[i:i + n])] += 1
+
+    scored = sorted(
+        ((count - 1) * len(phrase), phrase) for phrase, count in counts.items() if count > 1
+    )
+    chosen = []
+    total = 0
+    for _, phrase in reversed(scored):
+        piece = phrase + " "
+        if total + len(piece.encode('utf-8')) > size:
+            break
+        chosen.append(piece)
+        total += len(piece.encode('utf-8'))
+    return "".join(reversed(chosen)).encode('utf-8')
+
+
+def train_dictionary(samples, codec, size):
+    """Train a dictionary for ``codec`` from sample texts."""
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Training a zstd dictionary requires the zstandard package")
+        return zstandard.train_dictionary(size, [sample.encode('utf-8') for sample in samples]).as_bytes()
+    return train_zlib_dictionary(samples, min(size, ZLIB_MAX_DICTIONARY))
@@ -0,0 +1,72 @@
+"""
+Content-addressed storage and extraction cache for uploaded PDFs.
+
+Uploads are identified by the SHA-256 of their bytes. The first upload of a
+file stores it on disk and records an ``ExtractionCache`` row; later uploads
+of the same bytes reuse the stored file, extracted text and summary.
+"""
+import hashlib
+
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ExtractionCache
+
+
+def sha256_of_file(uploaded_file):
+    """Hash an uploaded file chunk by chunk without loading it into memory."""
+    # PDFUploadHandler hashed it while it was being received
+    if getattr(uploaded_file, 'sha256', None):
+        return uploaded_file.sha256
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    if hasattr(uploaded_file, 'seek'):
+        uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def get_cache_entry(sha256):
+    if not sha256:
+        return None
+    return ExtractionCache.objects.filter(sha256=sha256).first()
+
+
+def save_document_upload(document, sha256):
+    """
+    Save a new document, storing its file only if these bytes are not stored yet.
+
+    Returns the cache entry for the file's hash.
+    """
+    document.content_hash = sha256
+    entry = get_cache_entry(sha256)
+    if entry:
+        # Point at the existing copy; an already-committed FieldFile isn't re-written.
+        document.file = entry.file.name
+        document.save()
+        return entry
+
+    document.save()
+    try:
+        entry = ExtractionCache.objects.create(sha256=sha256, file=document.file.name)
+    except IntegrityError:
+        # Another request stored the same file concurrently; keep ours as-is.
+        entry = ExtractionCache.objects.get(sha256=sha256)
+    return entry
+
+
+def record_hit(entry):
+    ExtractionCache.objects.filter(sha256=entry.sha256).update(hit_count=F('hit_count') + 1)
+
+
+def store_extraction(sha256, content, page_offsets):
+    if sha256:
+        ExtractionCache.objects.filter(sha256=sha256).update(
+            content=content, page_offsets=page_offsets, updated_at=timezone.now()
+        )
+
+
+def store_summary(sha256, summary):
+    if sha256:
+        ExtractionCache.objects.filter(sha256=sha256).update(summary=summary, updated_at=timezone.now())
@@ -0,0 +1,297 @@
+"""
+Page-parallel PDF text extraction.
+
+Large PDFs are split into contiguous page ranges that are extracted on a
+process pool, so multi-hundred page textbooks use every core instead of one.
+Small PDFs go through the same pool as a single range. Each worker re-opens
+the PDF itself and enforces a per-page timeout, so a single pathological page
+only loses that page instead of stalling the whole document; if a worker
+hangs anyway, the caller gives up on its range and new work moves to a fresh
+pool, while other documents' ranges finish on the old one.
+"""
+import io
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+import PyPDF2
+from django.conf import settings
+
+from .metrics import observe_pages, pdf_document_seconds
+
+logger = logging.getLogger(__name__)
+
+_pool = None  # The _ExtractionPool new work goes to
+_pool_lock = threading.Lock()
+
+
+class PageTimeout(Exception):
+    """Raised inside a worker when a single page takes too long to extract."""
+
+
+def get_extraction_workers():
+    return getattr(settings, 'PDF_EXTRACTION_WORKERS', None) or os.cpu_count() or 1
+
+
+def get_page_timeout():
+    return getattr(settings, 'PDF_EXTRACTION_PAGE_TIMEOUT', 10)
+
+
+def _report_pid(pids):
+    """Pool worker initializer: tell the parent our pid so it can kill us if we hang."""
+    pids.put(os.getpid())
+
+
+class _ExtractionPool:
+    """
+    A process pool and the calls using it.
+
+    Killing one worker breaks a ``ProcessPoolExecutor`` for everything queued
+    on it, so a pool with a hung worker is retired instead: new calls get a
+    fresh pool, the calls still using this one finish their ranges, and the
+    workers are killed once the last of them is done.
+    """
+
+    def __init__(self, workers):
+        # spawn rather than fork: the web process runs other threads
+        # (request handlers, the job queue) that must not be forked.
+        context = multiprocessing.get_context('spawn')
+        self.workers = workers
+        self.users = 0
+        self.retired = False
+        self._pids = context.SimpleQueue()
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_report_pid,
+            initargs=(self._pids,),
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        while not self._pids.empty():
+            try:
+                os.kill(self._pids.get(), signal.SIGTERM)
+            except OSError:
+                pass  # Already gone
+
+
+def _acquire_pool(workers):
+    """Return the current pool (creating it if needed) and count the caller as using it."""
+    global _pool
+    idle = None
+    with _pool_lock:
+        if _pool is None or _pool.workers != workers:
+            if _pool is not None and _retire(_pool):
+                idle = _pool
+            _pool = _ExtractionPool(workers)
+        _pool.users += 1
+        pool = _pool
+    if idle is not None:
+        idle.close()
+    return pool
+
+
+def _release_pool(pool):
+    with _pool_lock:
+        pool.users -= 1
+        done = pool.retired and pool.users == 0
+    if done:
+        pool.close()
+
+
+def _retire(pool):
+    """
+    Stop giving out ``pool``; it is closed when its last user releases it.
+    Returns True if nobody is using it, so the caller should close it now.
+    Caller holds the lock.
+    """
+    global _pool
+    if _pool is pool:
+        _pool = None
+    pool.retired = True
+    return pool.users == 0
+
+
+def _discard_pool(pool):
+    """Retire a pool whose workers may be stuck so later calls start fresh."""
+    with _pool_lock:
+        _retire(pool)
+
+
+@contextmanager
+def _page_deadline(seconds):
+    """Interrupt the current page after ``seconds`` (main thread on POSIX only)."""
+    usable = (
+        seconds
+        and hasattr(signal, 'SIGALRM')
+        and threading.current_thread() is threading.main_thread()
+    )
+    if not usable:
+        yield
+        return
+
+    def _on_timeout(signum, frame):
+        raise PageTimeout()
+
+    previous = signal.signal(signal.SIGALRM, _on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _open_reader(source):
+    if isinstance(source, (bytes, bytearray)):
+        return PyPDF2.PdfReader(io.BytesIO(source))
+    return PyPDF2.PdfReader(source)
+
+
+def _extract_page_range(source, start, stop, page_timeout):
+    """
+    Extract pages ``[start, stop)``; runs inside a pool worker. Returns the
+    page texts, the seconds each page took, which the caller records, and
+    the number of pages that failed or timed out.
+    """
+    reader = _open_reader(source)
+    texts = []
+    timings = []
+    failed = 0
+    for page_num in range(start, stop):
+        started = time.perf_counter()
+        try:
+            with _page_deadline(page_timeout):
+                texts.append(reader.pages[page_num].extract_text() or "")
+        except PageTimeout:
+            logger.warning(f"Timed out extracting text from page {page_num}")
+            texts.append("")
+            failed += 1
+        except Exception as e:
+            logger.warning(f"Error extracting text from page {page_num}: {str(e)}")
+            texts.append("")
+            failed += 1
+        timings.append(time.perf_counter() - started)
+    return texts, timings, failed
+
+
+def _pdf_source(pdf_file):
+    """Return something a worker process can open: a local path or the raw bytes."""
+    if isinstance(pdf_file, (str, os.PathLike)):
+        return os.fspath(pdf_file)
+    try:
+        path = pdf_file.path
+        if os.path.exists(path):
+            return path
+    except (AttributeError, NotImplementedError, ValueError):
+        pass
+    pdf_file.seek(0)
+    return pdf_file.read()
+
+
+def _shard(page_count, workers):
+    """Split pages into contiguous ranges, a few per worker for load balancing."""
+    shard_count = min(page_count, workers * 4)
+    size = math.ceil(page_count / shard_count)
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def extract_pages_serial(source, page_timeout=None, page_count=None):
+    """
+    Extract every page of a PDF in the current process.
+
+    The page timeout only applies on the main thread, so this is for
+    benchmarks and scripts; the app extracts through the pool.
+    """
+    if page_count is None:
+        page_count = len(_open_reader(source).pages)
+    texts, timings, _ = _extract_page_range(source, 0, page_count, page_timeout)
+    observe_pages(timings)
+    return texts
+
+
+def extract_pages_parallel(source, workers=None, page_timeout=None, page_count=None):
+    """
+    Extract every page of a PDF across the process pool.
+
+    Returns a list with one string per page, in page order. Pages that fail
+    or time out come back as empty strings.
+    """
+    workers = workers or get_extraction_workers()
+    if page_count is None:
+        page_count = len(_open_reader(source).pages)
+    if page_count == 0:
+        return []
+    pages, _ = _extract_shards(source, _shard(page_count, workers), workers, page_timeout)
+    return pages
+
+
+def _extract_shards(source, shards, workers, page_timeout):
+    """
+    Extract page ranges on a pool of ``workers`` processes. Returns the page
+    texts, with pages that failed left empty, and the number that failed.
+    """
+    pool = _acquire_pool(workers)
+    try:
+        futures = [
+            pool.executor.submit(_extract_page_range, source, start, stop, page_timeout) for start, stop in shards
+        ]
+        pages = []
+        failed = 0
+        for (start, stop), future in zip(shards, futures):
+            # Backstop for a worker that hangs despite its page timeout (or where
+            # SIGALRM is unavailable): give up on the range and retire the pool
+            shard_timeout = (page_timeout * (stop - start) + 30) if page_timeout else None
+            try:
+                texts, timings, shard_failed = future.result(timeout=shard_timeout)
+                pages.extend(texts)
+                observe_pages(timings)
+                failed += shard_failed
+            except FutureTimeoutError:
+                logger.warning(f"Timed out extracting pages {start}-{stop - 1}; retiring the extraction pool")
+                _discard_pool(pool)
+                pages.extend([""] * (stop - start))
+                failed += stop - start
+            except Exception as e:
+                logger.warning(f"Error extracting pages {start}-{stop - 1}: {str(e)}")
+                pages.extend([""] * (stop - start))
+                failed += stop - start
+        return pages, failed
+    finally:
+        _release_pool(pool)
+
+
+def extract_pdf_pages(pdf_file):
+    """
+    Extract the text of each page of a PDF file.
+
+    Returns the page texts and the number of pages that failed or timed out
+    (left empty); an extraction with failures shouldn't be cached. Anything
+    with at least ``PDF_EXTRACTION_PARALLEL_MIN_PAGES`` pages is sharded
+    across the pool; smaller documents are extracted by one pool worker, so
+    the same timeouts protect the calling thread either way.
+    """
+    source = _pdf_source(pdf_file)
+    page_count = len(_open_reader(source).pages)
+    if page_count == 0:
+        return [], 0
+    min_pages = getattr(settings, 'PDF_EXTRACTION_PARALLEL_MIN_PAGES', 16)
+    workers = get_extraction_workers()
+    page_timeout = get_page_timeout()
+
+    started = time.perf_counter()
+    if workers > 1 and page_count >= min_pages:
+        result = _extract_shards(source, _shard(page_count, workers), workers, page_timeout)
+        pdf_document_seconds.observe(time.perf_counter() - started, 'parallel')
+    else:
+        result = _extract_shards(source, [(0, page_count)], workers, page_timeout)
+        pdf_document_seconds.observe(time.perf_counter() - started, 'serial')
+    return result
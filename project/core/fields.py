@@ -0,0 +1,45 @@
+from django import forms
+from django.db import models
+
+from .compression import compress_text, decompress_text
+
+
+class CompressedTextField(models.Field):
+    """
+    Text stored compressed in a binary column (see ``core.compression``).
+
+    Models, views and templates get and set plain ``str`` as with a
+    TextField, but the column can't be filtered or searched in SQL beyond
+    exact matches on the empty string.
+    """
+    description = "Compressed text"
+
+    def get_internal_type(self):
+        return 'BinaryField'
+
+    def from_db_value(self, value, expression, connection):
+        return decompress_text(value)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return decompress_text(value)
+        return value
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        return compress_text(str(value))
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        return connection.Database.Binary(value)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'form_class': forms.CharField, 'widget': forms.Textarea, **kwargs})
@@ -1,7 +1,9 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import Document
+from .uploads import too_large_message
 
 
 class CustomUserCreationForm(UserCreationForm):
@@ -45,13 +47,19 @@ class DocumentUploadForm(forms.ModelForm):
             })
         }
 
+    def __init__(self, *args, upload_error=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if upload_error:
+            # The upload handler stopped the file on its way in (see core/uploads.py), so it's missing
+            self.fields['file'].error_messages['required'] = upload_error
+
     def clean_file(self):
         file = self.cleaned_data.get('file')
         if file:
             if not file.name.lower().endswith('.pdf'):
                 raise forms.ValidationError('Please upload a PDF file only.')
-            if file.size > 10 * 1024 * 1024:  # 10MB limit
-                raise forms.ValidationError('File size cannot exceed 10MB.')
+            if file.size > settings.DOCUMENT_UPLOAD_MAX_SIZE:
+                raise forms.ValidationError(too_large_message())
         return file
 
 
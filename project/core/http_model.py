@@ -0,0 +1,129 @@
+"""
+Client for local model servers with an OpenAI-compatible API.
+
+llama.cpp's server, vLLM, Ollama and most other local model servers answer
+``POST {URL}/chat/completions``. ``HTTPModel`` sends each prompt there as a
+single user message and exposes the subset of ``GenerativeModel`` that
+``core.utils`` uses: ``generate_content`` and ``generate_content_async``,
+both with ``stream``.
+"""
+import asyncio
+import json
+import weakref
+
+import httpx
+
+COMPLETIONS_PATH = '/chat/completions'
+
+
+class HTTPResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def _event_text(line):
+    """Text of one server-sent event line of a streamed completion, or None."""
+    if not line.startswith('data:'):
+        return None
+    data = line[len('data:'):].strip()
+    if not data or data == '[DONE]':
+        return None
+    choices = json.loads(data).get('choices') or [{}]
+    return choices[0].get('delta', {}).get('content') or None
+
+
+class LoopClients:
+    """
+    One ``httpx.AsyncClient`` per event loop, created on first use.
+
+    An async client's connections belong to the loop that opened them, so a
+    client can't be shared across loops. Each is closed when its loop shuts
+    down (``asyncio.run``, and so ``async_to_sync``, closes open async
+    generators then), so the loop per request of a WSGI server doesn't leak
+    connections.
+    """
+
+    def __init__(self, **options):
+        self._options = options
+        self._clients = weakref.WeakKeyDictionary()
+
+    async def get(self):
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None:
+            client = httpx.AsyncClient(**self._options)
+            closer = self._close_at_shutdown(client)
+            await closer.__anext__()
+            # The closer is kept with the client; dropping it would close the client early
+            entry = self._clients[loop] = (client, closer)
+        return entry[0]
+
+    async def _close_at_shutdown(self, client):
+        try:
+            yield
+        finally:
+            await client.aclose()
+
+
+class AsyncHTTPStream:
+    """Async iterator over streamed chunks, mirroring the SDK's streaming response."""
+
+    def __init__(self, client, payload):
+        self._client = client
+        self._payload = payload
+
+    async def __aiter__(self):
+        async with self._client.stream('POST', COMPLETIONS_PATH, json=self._payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                text = _event_text(line)
+                if text:
+                    yield HTTPResponse(text)
+
+
+class HTTPModel:
+    """
+    HTTP client for an OpenAI-compatible model server.
+
+    Connections are pooled and kept alive: one sync client per model, and an
+    async client per event loop that uses it (see ``LoopClients``).
+    """
+
+    def __init__(self, base_url, model='', api_key='', timeout=120):
+        self.model_name = model
+        self._base_url = base_url.rstrip('/')
+        self._headers = {'Authorization': f'Bearer {api_key}'} if api_key else {}
+        self._client = httpx.Client(base_url=self._base_url, headers=self._headers, timeout=timeout)
+        self._async_clients = LoopClients(base_url=self._base_url, headers=self._headers, timeout=timeout)
+
+    def _payload(self, prompt, stream):
+        payload = {'messages': [{'role': 'user', 'content': prompt}], 'stream': stream}
+        if self.model_name:
+            payload['model'] = self.model_name
+        return payload
+
+    def _text(self, response):
+        response.raise_for_status()
+        choices = response.json().get('choices') or [{}]
+        return HTTPResponse(choices[0].get('message', {}).get('content') or '')
+
+    def _stream(self, payload):
+        with self._client.stream('POST', COMPLETIONS_PATH, json=payload) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                text = _event_text(line)
+                if text:
+                    yield HTTPResponse(text)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        payload = self._payload(prompt, stream)
+        if stream:
+            return self._stream(payload)
+        return self._text(self._client.post(COMPLETIONS_PATH, json=payload))
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        client = await self._async_clients.get()
+        payload = self._payload(prompt, stream)
+        if stream:
+            return AsyncHTTPStream(client, payload)
+        return self._text(await client.post(COMPLETIONS_PATH, json=payload))
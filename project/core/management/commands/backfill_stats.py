@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from core.stats import refresh_user_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the precomputed user and document statistics from the "
+        "documents, Q&A sessions and test attempts tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only recompute stats for this username.")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['user']:
+            users = users.filter(username=options['user'])
+
+        count = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            refresh_user_stats(user_id)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Recomputed stats for {count} user(s)."))
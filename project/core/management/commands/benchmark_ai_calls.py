@@ -0,0 +1,56 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.providers import get_provider_name
+from core.utils import aanswer_question, answer_question
+
+CONTEXT = "Loops repeat a block of statements while a condition holds. " * 40
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare AI call throughput of sync calls on a fixed worker pool (like WSGI workers) "
+        "against async calls on one event loop. Run against the stub model server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--sync-workers', type=int, default=4, help="Threads for the sync run.")
+        parser.add_argument('--concurrency', type=int, default=50, help="In-flight calls for the async run.")
+        parser.add_argument('--allow-real-api', action='store_true', help="Run even against the Gemini API.")
+
+    def handle(self, *args, **options):
+        if get_provider_name() == 'gemini' and not options['allow_real_api']:
+            raise CommandError(
+                "Set AI_STUB_SERVER_URL (see `manage.py stub_model_server`), use a local AI_PROVIDER "
+                "or pass --allow-real-api."
+            )
+
+        count = options['requests']
+        # Distinct questions so the response cache doesn't answer them
+        run_id = time.time_ns()
+        questions = [f"Benchmark {run_id} question {i}: what does a loop do?" for i in range(count)]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['sync_workers']) as executor:
+            list(executor.map(lambda q: answer_question("sync " + q, CONTEXT), questions))
+        sync_elapsed = time.perf_counter() - start
+
+        async def run_async():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+
+            async def one(question):
+                async with semaphore:
+                    return await aanswer_question("async " + question, CONTEXT)
+
+            await asyncio.gather(*(one(q) for q in questions))
+
+        start = time.perf_counter()
+        asyncio.run(run_async())
+        async_elapsed = time.perf_counter() - start
+
+        self.stdout.write(f"sync  ({options['sync_workers']} workers): {count / sync_elapsed:8.1f} calls/s ({sync_elapsed:.2f}s)")
+        self.stdout.write(f"async ({options['concurrency']} in flight): {count / async_elapsed:8.1f} calls/s ({async_elapsed:.2f}s)")
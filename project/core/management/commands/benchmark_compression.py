@@ -0,0 +1,94 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.functions import Length
+
+from core.compression import compress_text, decompress_text, get_compression_settings
+from core.management.commands.train_compression_dictionary import COLUMNS
+
+
+def _database_size():
+    if connection.vendor == 'sqlite':
+        return os.path.getsize(connection.settings_dict['NAME'])
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_database_size(current_database())")
+            return cursor.fetchone()[0]
+    return None
+
+
+def _mb(size):
+    return f"{size / 1024 / 1024:.2f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Report how much the compressed text columns save (stored vs. uncompressed "
+        "size, with and without the shared dictionary) and what reading them costs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=1000, help="Rows read per column for the latency test.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Codec: {get_compression_settings()['CODEC']}")
+        size = _database_size()
+        if size is not None:
+            self.stdout.write(f"Database size: {_mb(size)}")
+
+        total_raw = total_stored = 0
+        for model, field in COLUMNS:
+            label = f"{model._meta.model_name}.{field}"
+            stored = model.objects.aggregate(total=Sum(Length(field)))['total'] or 0
+            blobs, fetch_time = self._fetch_stored(model, field, options['limit'])
+            if not blobs:
+                self.stdout.write(f"\n{label}: no rows")
+                continue
+
+            started = time.perf_counter()
+            texts = [decompress_text(blob) for blob in blobs]
+            decompress_time = time.perf_counter() - started
+
+            raw = sum(
+                len(text.encode('utf-8'))
+                for text in model.objects.values_list(field, flat=True).iterator()
+            )
+            total_raw += raw
+            total_stored += stored
+
+            sample_raw = sum(len(text.encode('utf-8')) for text in texts) or 1
+            without_dictionary = sum(len(compress_text(text, use_dictionary=False)) for text in texts)
+            with_dictionary = sum(len(compress_text(text)) for text in texts)
+
+            self.stdout.write(f"\n{label}: {model.objects.count()} rows")
+            self.stdout.write(f"  uncompressed {_mb(raw)}, stored {_mb(stored)} ({stored / max(raw, 1):.1%})")
+            self.stdout.write(
+                f"  recompressing {len(texts)} rows: {without_dictionary / sample_raw:.1%} without the "
+                f"dictionary, {with_dictionary / sample_raw:.1%} with the current one"
+            )
+            self.stdout.write(
+                f"  reading {len(texts)} rows: {fetch_time * 1000:.1f} ms to fetch, "
+                f"+{decompress_time * 1000:.1f} ms to decompress"
+            )
+
+        if total_raw:
+            self.stdout.write(self.style.SUCCESS(
+                f"\nText columns: {_mb(total_raw)} uncompressed -> {_mb(total_stored)} stored "
+                f"({total_stored / total_raw:.1%})"
+            ))
+
+    def _fetch_stored(self, model, field, limit):
+        """Fetch the stored bytes with plain SQL, so the timing excludes decompression."""
+        quote = connection.ops.quote_name
+        sql = (
+            f"SELECT {quote(model._meta.get_field(field).column)} FROM {quote(model._meta.db_table)} "
+            f"ORDER BY {quote(model._meta.pk.column)} LIMIT %s"
+        )
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [limit])
+            blobs = [row[0] for row in cursor.fetchall()]
+        return blobs, time.perf_counter() - started
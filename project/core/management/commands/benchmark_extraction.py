@@ -0,0 +1,72 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.extraction import extract_pages_parallel, extract_pages_serial, get_extraction_workers
+
+
+class Command(BaseCommand):
+    help = "Compare serial and page-parallel PDF text extraction throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help="PDF files or directories to benchmark (default: MEDIA_ROOT/documents).",
+        )
+        parser.add_argument('--workers', type=int, default=None, help="Process pool size for the parallel run.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per mode; the best time is reported.")
+
+    def handle(self, *args, **options):
+        pdfs = self._collect_pdfs(options['paths'] or [Path(settings.MEDIA_ROOT) / 'documents'])
+        if not pdfs:
+            raise CommandError("No PDF files found to benchmark.")
+
+        workers = options['workers'] or get_extraction_workers()
+        repeat = max(1, options['repeat'])
+
+        # Warm the pool so worker start-up isn't billed to the first document
+        extract_pages_parallel(str(pdfs[0]), workers=workers)
+
+        self.stdout.write(f"{'file':<50} {'pages':>5} {'serial s':>9} {'parallel s':>10} {'speedup':>8}")
+        total_pages = total_serial = total_parallel = 0
+        for pdf in pdfs:
+            serial_time, pages = self._best_of(repeat, lambda: extract_pages_serial(str(pdf)))
+            parallel_time, parallel_pages = self._best_of(
+                repeat, lambda: extract_pages_parallel(str(pdf), workers=workers)
+            )
+            if parallel_pages != pages:
+                self.stderr.write(self.style.WARNING(f"{pdf.name}: parallel output differs from serial"))
+
+            total_pages += len(pages)
+            total_serial += serial_time
+            total_parallel += parallel_time
+            self.stdout.write(
+                f"{pdf.name[:50]:<50} {len(pages):>5} {serial_time:>9.3f} {parallel_time:>10.3f} "
+                f"{serial_time / parallel_time if parallel_time else 0:>7.2f}x"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{len(pdfs)} file(s), {total_pages} page(s), {workers} worker(s): "
+            f"serial {total_pages / total_serial:.1f} pages/s, "
+            f"parallel {total_pages / total_parallel:.1f} pages/s"
+        ))
+
+    def _collect_pdfs(self, paths):
+        pdfs = []
+        for path in map(Path, paths):
+            if path.is_dir():
+                pdfs.extend(sorted(path.glob('*.pdf')))
+            elif path.suffix.lower() == '.pdf':
+                pdfs.append(path)
+        return pdfs
+
+    def _best_of(self, repeat, func):
+        best, result = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
@@ -0,0 +1,59 @@
+import re
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Document, QASession
+from core.templatetags.markdown_extras import markdown_format, render_markdown
+
+
+def regex_passes(text):
+    """The markdown filter before it was rewritten: ten regex passes over the whole text."""
+    text = re.sub(r'^### (.*?)$', r'<h3 class="text-xl font-bold text-gray-900 mt-6 mb-3">\1</h3>', text, flags=re.MULTILINE)
+    text = re.sub(r'^## (.*?)$', r'<h2 class="text-2xl font-bold text-gray-900 mt-8 mb-4">\1</h2>', text, flags=re.MULTILINE)
+    text = re.sub(r'^# (.*?)$', r'<h1 class="text-3xl font-bold text-gray-900 mt-8 mb-4">\1</h1>', text, flags=re.MULTILINE)
+    text = re.sub(r'\*\*(.*?)\*\*', r'<strong class="font-semibold text-gray-900">\1</strong>', text)
+    text = re.sub(r'\*(.*?)\*', r'<em class="italic">\1</em>', text)
+    text = re.sub(r'^\* (.*?)$', r'<li class="ml-6 mb-2 list-disc">\1</li>', text, flags=re.MULTILINE)
+    text = re.sub(r'(<li class="ml-6 mb-2 list-disc">.*?</li>\n?)+', lambda m: f'<ul class="my-3">{m.group(0)}</ul>', text, flags=re.DOTALL)
+    text = re.sub(r'\n\n', '<br><br>', text)
+    text = re.sub(r'\n', '<br>', text)
+    text = re.sub(r'^---$', r'<hr class="my-6 border-gray-300">', text, flags=re.MULTILINE)
+    return text
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the markdown template filter over the stored summaries and Q&A answers "
+        "(real model output): the old regex passes, the single-pass renderer, and a cache hit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200, help="Renders of each text per measurement.")
+
+    def handle(self, *args, **options):
+        texts = [text for text in Document.objects.exclude(summary='').values_list('summary', flat=True)]
+        texts += [text for text in QASession.objects.values_list('answer', flat=True) if text]
+        if not texts:
+            raise CommandError("No summaries or answers to render.")
+        total_kb = sum(len(text) for text in texts) / 1024
+        self.stdout.write(f"{len(texts)} texts, {total_kb:.1f} KB, median {statistics.median(map(len, texts)):.0f} chars")
+
+        render_markdown.cache_clear()
+        markdown_format(texts[0])  # Import-time work out of the way
+        for label, render in [
+            ('regex passes (old)', regex_passes),
+            ('single pass', render_markdown.__wrapped__),
+            ('cache hit', markdown_format),
+        ]:
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                for text in texts:
+                    render(text)
+            elapsed = time.perf_counter() - started
+            renders = options['repeat'] * len(texts)
+            self.stdout.write(
+                f"  {label:<20} {elapsed / renders * 1e6:9.1f} us per render, "
+                f"{elapsed / (options['repeat'] * total_kb) * 1e6:8.1f} us per KB"
+            )
@@ -0,0 +1,112 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.search import FTS_TABLE, SCHEMA_SQL, SEARCH_SQL, build_match_query
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'po', 'da', 'fu', 'gi', 'he', 'ju', 'ba']
+
+
+def _vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words, key=lambda word: rng.random())
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Build a synthetic corpus in a temporary SQLite database with the same FTS5 "
+        "schema and query as core.search, and report indexing time and query latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--words', type=int, default=300, help="Words per document.")
+        parser.add_argument('--vocabulary', type=int, default=20_000)
+        parser.add_argument('--queries', type=int, default=200, help="Queries timed per query type.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        vocabulary = _vocabulary(options['vocabulary'], rng)
+        # Zipf-like word frequencies, as in natural text
+        cum_weights = []
+        total = 0.0
+        for rank in range(1, len(vocabulary) + 1):
+            total += 1.0 / rank
+            cum_weights.append(total)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'search.sqlite3')
+            db = sqlite3.connect(path)
+            db.execute(
+                "CREATE TABLE core_searchentry (id INTEGER PRIMARY KEY, kind TEXT, object_id TEXT, "
+                "user_id INTEGER, document_id TEXT)"
+            )
+            for statement in SCHEMA_SQL:
+                db.execute(statement)
+
+            started = time.perf_counter()
+            self._build(db, rng, vocabulary, cum_weights, options)
+            build_time = time.perf_counter() - started
+            self.stdout.write(
+                f"Indexed {options['documents']} documents of {options['words']} words for "
+                f"{options['users']} users in {build_time:.1f} s; database {os.path.getsize(path) / 1024 / 1024:.1f} MB"
+            )
+
+            sql = SEARCH_SQL.replace('%s', '?')
+            query_types = {
+                'common word': lambda: vocabulary[rng.randint(0, 20)],
+                'mid-frequency word': lambda: vocabulary[rng.randint(200, 2000)],
+                'rare word': lambda: vocabulary[rng.randint(10_000, len(vocabulary) - 1)],
+                'two words': lambda: f"{vocabulary[rng.randint(0, 500)]} {vocabulary[rng.randint(0, 500)]}",
+                'prefix': lambda: vocabulary[rng.randint(0, 2000)][:3],
+            }
+            for label, make_query in query_types.items():
+                timings = []
+                for _ in range(options['queries']):
+                    match = build_match_query(make_query(), user_id=rng.randint(1, options['users']))
+                    started = time.perf_counter()
+                    db.execute(sql, [match, 21, 0]).fetchall()
+                    timings.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f"  {label:<20} p50 {statistics.median(timings):7.2f} ms   "
+                    f"p95 {_percentile(timings, 0.95):7.2f} ms   max {max(timings):7.2f} ms"
+                )
+            db.close()
+
+    def _build(self, db, rng, vocabulary, cum_weights, options):
+        batch = []
+        for document_id in range(1, options['documents'] + 1):
+            user_id = rng.randint(1, options['users'])
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=options['words'])
+            batch.append((document_id, user_id, ' '.join(words[:5]), ' '.join(words)))
+            if len(batch) >= 1000:
+                self._insert(db, batch)
+                batch = []
+        self._insert(db, batch)
+        db.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        db.commit()
+
+    def _insert(self, db, batch):
+        db.executemany(
+            "INSERT INTO core_searchentry (id, kind, object_id, user_id, document_id) "
+            "VALUES (?, 'document', printf('%032x', ?), ?, printf('%032x', ?))",
+            [(document_id, document_id, user_id, document_id) for document_id, user_id, _, _ in batch],
+        )
+        db.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, body, owner) VALUES (?, ?, ?, 'u' || ?)",
+            [(document_id, title, body, user_id) for document_id, user_id, title, body in batch],
+        )
@@ -0,0 +1,346 @@
+import hashlib
+import json
+import statistics
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core import ratelimit, utils
+from core.management.commands.stub_model_server import StubModelServer, fake_questions, fake_text, make_handler
+from core.metrics import request_db_queries
+from core.models import Document, ExtractionCache, ProcessingJob, QASession, Test, TestAttempt
+from core.ratelimit import get_rate_limit_settings
+from core.retrieval import build_document_index
+from core.stats import refresh_user_stats
+
+SCENARIOS = ['upload_document', 'qa_session', 'generate_test', 'submit_test', 'dashboard', 'progress_tracking']
+
+USER_PREFIX = 'benchmark-'
+QUESTION_COUNT = 5
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main views under concurrency against a stub AI model: seeds a synthetic "
+        "corpus, drives each view from several threads and reports throughput and p50/p95/p99 "
+        "latency. Everything it creates is deleted afterwards. Use --output to save the results "
+        "as JSON and --compare to check them against an earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200, help="Requests per scenario.")
+        parser.add_argument('--users', type=int, default=8)
+        parser.add_argument('--documents', type=int, default=3, help="Documents per user.")
+        parser.add_argument('--attempts', type=int, default=250, help="Past test attempts per user.")
+        parser.add_argument('--qa-sessions', type=int, default=25, help="Past questions per user.")
+        parser.add_argument('--corpus-dir', default=None, help="PDFs to seed from (default MEDIA_ROOT/documents).")
+        parser.add_argument('--latency', type=float, default=0.2, help="Stub model seconds per call.")
+        parser.add_argument('--words', type=int, default=150, help="Length of stub text responses.")
+        parser.add_argument(
+            '--ai-requests-per-minute', type=int, default=100000,
+            help="Rate limit for calls to the stub; AI_RATE_LIMIT's quota is the real API's.",
+        )
+        parser.add_argument('--output', help="Write the results as JSON to this file ('-' for stdout).")
+        parser.add_argument('--compare', help="JSON results of an earlier run to compare against.")
+        parser.add_argument(
+            '--max-regression', type=float, default=None,
+            help="Fail if any scenario's p95 latency grew by more than this fraction over --compare.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and str(connection.settings_dict['NAME']) == ':memory:':
+            raise CommandError("Needs a database file shared between threads.")
+        baseline = self._load_baseline(options['compare']) if options['compare'] else None
+        pdfs = self._corpus(options['corpus_dir'])
+
+        server = self._start_stub(options)
+        stub_url = f'http://127.0.0.1:{server.server_address[1]}'
+        run_id = uuid.uuid4().hex[:8]
+        uploaded = set()
+        try:
+            rate_limit = {**get_rate_limit_settings(), 'REQUESTS_PER_MINUTE': options['ai_requests_per_minute']}
+            with override_settings(AI_PROVIDER='stub', AI_STUB_SERVER_URL=stub_url, AI_RATE_LIMIT=rate_limit):
+                self._reset_models()
+                self._log(options, f"Seeding {options['users']} users from {len(pdfs)} PDFs...")
+                started = time.perf_counter()
+                users = self._seed(run_id, pdfs, options)
+                seed_seconds = time.perf_counter() - started
+
+                results = {}
+                for scenario in options['scenarios']:
+                    results[scenario] = self._run(scenario, users, pdfs, uploaded, options)
+                    self._log(options, self._format_result(scenario, results[scenario]))
+                    # Background work a scenario started (processing uploads, refilling
+                    # question banks) shouldn't slow down the next one
+                    self._wait_for_jobs(users)
+        finally:
+            server.shutdown()
+            server.server_close()
+            self._cleanup(run_id, uploaded)
+            self._reset_models()
+
+        report = {
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'config': {
+                key: options[key]
+                for key in (
+                    'threads', 'requests', 'users', 'documents', 'attempts', 'qa_sessions', 'latency', 'words',
+                    'ai_requests_per_minute',
+                )
+            },
+            'seed_seconds': round(seed_seconds, 2),
+            'results': results,
+        }
+        if options['output'] == '-':
+            self.stdout.write(json.dumps(report, indent=2))
+        elif options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2) + '\n')
+            self._log(options, f"Results written to {options['output']}")
+
+        if baseline:
+            self._compare(baseline, results, options)
+
+    def _log(self, options, message):
+        # Keep stdout clean for --output -
+        (self.stderr if options['output'] == '-' else self.stdout).write(message)
+
+    def _corpus(self, corpus_dir):
+        directory = Path(corpus_dir or Path(settings.MEDIA_ROOT) / 'documents')
+        pdfs = {}
+        for path in sorted(directory.glob('*.pdf')):
+            data = path.read_bytes()
+            # Copies of the same file add nothing
+            pdfs.setdefault(hashlib.sha256(data).hexdigest(), (path, data))
+        if not pdfs:
+            raise CommandError(f"No PDFs found in {directory}.")
+        return list(pdfs.values())
+
+    def _start_stub(self, options):
+        handler = make_handler(options['latency'], 0, options['words'])
+        server = StubModelServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def _reset_models(self):
+        # Model handles and the rate limiter are set up on first use, from the settings in force then
+        utils.model = None
+        ratelimit._gate = None
+
+    def _seed(self, run_id, pdfs, options):
+        """Create users with processed documents, tests, past attempts and questions."""
+        extracted = []
+        for path, _ in pdfs:
+            content, page_offsets, _ = utils.extract_pdf_content(str(path))
+            if content and not content.startswith("Error"):
+                extracted.append((path, content, page_offsets))
+        if not extracted:
+            raise CommandError("None of the PDFs has extractable text.")
+
+        media_root = Path(settings.MEDIA_ROOT)
+        users = []
+        for number in range(options['users']):
+            user = User.objects.create_user(f'{USER_PREFIX}{run_id}-{number}')
+            tests = []
+            for index in range(options['documents']):
+                path, content, page_offsets = extracted[(number + index) % len(extracted)]
+                document = Document.objects.create(
+                    user=user,
+                    title=f"Benchmark {path.stem}",
+                    # Points at the corpus file; nothing is copied
+                    file=str(path.relative_to(media_root)) if path.is_relative_to(media_root) else str(path),
+                    summary=fake_text(content[:1000], options['words']),
+                    is_processed=True,
+                )
+                document.set_content(content, page_offsets)
+                build_document_index(document)
+                tests.append(Test.objects.create(
+                    user=user, document=document, title=f"Test for {document.title}",
+                    questions=fake_questions(f"{run_id}{number}{index}", QUESTION_COUNT),
+                ))
+
+            TestAttempt.objects.bulk_create([
+                TestAttempt(
+                    user=user, test=tests[i % len(tests)], answers=self._answers(i),
+                    score=i % (QUESTION_COUNT + 1), total_questions=QUESTION_COUNT,
+                )
+                for i in range(options['attempts'])
+            ], batch_size=500)
+            QASession.objects.bulk_create([
+                QASession(
+                    user=user, document=tests[i % len(tests)].document,
+                    question=f"Seeded question {i}?", answer=fake_text(f"{run_id}{number}{i}", options['words']),
+                )
+                for i in range(options['qa_sessions'])
+            ], batch_size=500)
+            # bulk_create skips the receivers that keep the stats current
+            refresh_user_stats(user.id)
+            users.append((user, tests))
+        return users
+
+    def _answers(self, seed):
+        return {f'question_{i}': 'ABCD'[(seed + i) % 4] for i in range(QUESTION_COUNT)}
+
+    def _request(self, scenario, client, tests, pdfs, uploaded, number):
+        """Make one request; returns an error message, or None if the view did its job."""
+        test = tests[number % len(tests)]
+        document_id = test.document_id
+        if scenario == 'upload_document':
+            path, data = pdfs[number % len(pdfs)]
+            # A comment after %%EOF makes each upload new bytes, so none is answered by deduplication
+            data += f"\n% benchmark {uuid.uuid4().hex}\n".encode('ascii')
+            uploaded.add(hashlib.sha256(data).hexdigest())
+            response = client.post(reverse('upload_document'), {
+                'title': f"Benchmark upload {number}",
+                'file': SimpleUploadedFile(path.name, data, content_type='application/pdf'),
+            })
+            expected = '/document/'
+        elif scenario == 'qa_session':
+            # A new question each time, so the response cache doesn't answer it
+            url = reverse('qa_session', args=[document_id])
+            response = client.post(url, {'question': f"What does part {number} ({uuid.uuid4().hex[:6]}) cover?"})
+            expected = url
+        elif scenario == 'generate_test':
+            response = client.post(reverse('generate_test', args=[document_id]))
+            expected = '/test/'
+        elif scenario == 'submit_test':
+            response = client.post(reverse('submit_test', args=[test.id]), self._answers(number))
+            expected = '/test-result/'
+        else:
+            response = client.get(reverse(scenario))
+            return None if response.status_code == 200 else f"HTTP {response.status_code}"
+
+        location = response.get('Location', '')
+        if response.status_code != 302 or not location.startswith(expected):
+            return f"HTTP {response.status_code} to {location}"
+        return None
+
+    def _run(self, scenario, users, pdfs, uploaded, options):
+        threads = options['threads']
+        latencies = []
+        failures = []
+        counter = iter(range(options['requests']))
+        lock = threading.Lock()
+        # Database queries per request, as counted by the metrics middleware
+        count_before, queries_before = request_db_queries.totals(scenario)
+
+        def worker(index):
+            user, tests = users[index % len(users)]
+            client = Client()
+            client.force_login(user)
+            try:
+                while True:
+                    with lock:
+                        number = next(counter, None)
+                    if number is None:
+                        break
+                    started = time.perf_counter()
+                    try:
+                        error = self._request(scenario, client, tests, pdfs, uploaded, number)
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        if error:
+                            failures.append(error)
+                        else:
+                            latencies.append(elapsed * 1000)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        count_after, queries_after = request_db_queries.totals(scenario)
+        result = {
+            'requests': len(latencies) + len(failures),
+            'errors': len(failures),
+            'seconds': round(elapsed, 3),
+            'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            'db_queries_per_request': (
+                round((queries_after - queries_before) / (count_after - count_before), 1)
+                if count_after > count_before else None
+            ),
+            'error_samples': sorted(set(failures))[:5],
+        }
+        if latencies:
+            result['latency_ms'] = {
+                'mean': round(statistics.fmean(latencies), 1),
+                'p50': round(_percentile(latencies, 0.50), 1),
+                'p95': round(_percentile(latencies, 0.95), 1),
+                'p99': round(_percentile(latencies, 0.99), 1),
+                'max': round(max(latencies), 1),
+            }
+        return result
+
+    def _format_result(self, scenario, result):
+        latency = result.get('latency_ms')
+        line = f"{scenario:18} {result['throughput_rps']:8.1f} req/s"
+        if latency:
+            line += f"  p50 {latency['p50']:8.1f} ms  p95 {latency['p95']:8.1f} ms  p99 {latency['p99']:8.1f} ms"
+        if result['db_queries_per_request'] is not None:
+            line += f"  {result['db_queries_per_request']:5.1f} queries"
+        if result['errors']:
+            line += f"  {result['errors']} errors ({result['error_samples'][0]})"
+        return line
+
+    def _wait_for_jobs(self, users, timeout=300):
+        """Let the background processing the run started finish before its data is deleted."""
+        user_ids = [user.id for user, _ in users]
+        deadline = time.monotonic() + timeout
+        active = ProcessingJob.objects.filter(
+            document__user_id__in=user_ids,
+            status__in=[ProcessingJob.STATUS_PENDING, ProcessingJob.STATUS_RUNNING],
+        )
+        while active.exists() and time.monotonic() < deadline:
+            time.sleep(0.5)
+
+    def _cleanup(self, run_id, uploaded):
+        User.objects.filter(username__startswith=f'{USER_PREFIX}{run_id}-').delete()
+        # Uploaded files are stored once per content hash, outside the users' rows
+        for entry in ExtractionCache.objects.filter(sha256__in=uploaded):
+            entry.file.delete(save=False)
+            entry.delete()
+
+    def _load_baseline(self, path):
+        try:
+            return json.loads(Path(path).read_text())
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Can't read {path}: {e}")
+
+    def _compare(self, baseline, results, options):
+        regressions = []
+        self._log(options, f"\nChange against {options['compare']} (started {baseline.get('started_at', '?')}):")
+        for scenario, result in results.items():
+            before = baseline.get('results', {}).get(scenario, {}).get('latency_ms')
+            after = result.get('latency_ms')
+            if not before or not after:
+                continue
+            change = (after['p95'] - before['p95']) / before['p95'] if before['p95'] else 0.0
+            self._log(options, f"{scenario:18} p95 {before['p95']:8.1f} -> {after['p95']:8.1f} ms ({change:+.0%})")
+            if options['max_regression'] is not None and change > options['max_regression']:
+                regressions.append(scenario)
+        if regressions:
+            raise CommandError(f"p95 latency regressed by more than {options['max_regression']:.0%}: {', '.join(regressions)}")
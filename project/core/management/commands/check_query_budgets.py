@@ -0,0 +1,137 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from core.compression import get_dictionary
+from core.models import CompressionDictionary, Document, QASession, Test, TestAttempt
+from core.pagination import keyset_page
+from core.views import ATTEMPTS_PER_PAGE
+
+# Maximum queries per page, independent of how many rows the user has.
+# Session and user lookups are included, and pages with cached fragments
+# are measured on a cache miss.
+BUDGETS = {
+    'dashboard': 6,
+    'progress_tracking': 5,
+    'progress_tracking (page 2)': 5,
+    'document_detail': 6,
+    'document_text': 5,
+    'generate_test': 5,
+    'qa_session': 4,
+    'take_test': 5,
+    'test_result': 4,
+    'admin: documents': 6,
+    'admin: Q&A sessions': 6,
+    'admin: tests': 6,
+    'admin: test attempts': 6,
+}
+
+# Pages whose queries must be served from indexes. The admin changelists list
+# every user's rows, so scanning is expected there.
+PLAN_CHECKED_PAGES = [name for name in BUDGETS if not name.startswith('admin:')]
+
+
+def plan_problems(sql):
+    """Steps of the SQLite query plan that scan a whole table or sort in a temporary B-tree."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        steps = [row[-1] for row in cursor.fetchall()]
+    return [
+        step for step in steps
+        if 'TEMP B-TREE' in step
+        or (step.startswith('SCAN ') and 'USING' not in step and 'CONSTANT ROW' not in step)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the main pages against generated data and fail if any of them "
+        "runs more queries than its budget (catches N+1 regressions), or, on SQLite, "
+        "if a user-facing page's query plan scans a table or sorts without an index. "
+        "All data is created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=40, help="Documents, tests, attempts and Q&As to create.")
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+            results = self._measure(options['rows'])
+            transaction.set_rollback(True)
+
+        failures = 0
+        for name, count, problems in results:
+            budget = BUDGETS[name]
+            if count > budget or problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"{name:28} {count:3} queries (budget {budget})"))
+            else:
+                self.stdout.write(f"{name:28} {count:3} queries (budget {budget})")
+            for sql, steps in problems:
+                self.stdout.write(self.style.ERROR(f"    {'; '.join(steps)}: {sql[:160]}"))
+
+        if failures:
+            raise CommandError(f"{failures} page(s) over their query budget or not using indexes.")
+        self.stdout.write(self.style.SUCCESS("All pages within their query budgets and using indexes."))
+
+    def _measure(self, rows):
+        user = User.objects.create_superuser(username='query-budget-check', password='query-budget-check')
+        documents = [
+            Document.objects.create(user=user, title=f"Document {i}", file=f"documents/budget-{i}.pdf",
+                                    summary="Summary", is_processed=True)
+            for i in range(rows)
+        ]
+        tests = [
+            Test.objects.create(user=user, document=documents[i % rows], title=f"Test {i}", questions=[])
+            for i in range(rows)
+        ]
+        attempts = [
+            TestAttempt.objects.create(user=user, test=tests[i % rows], answers={}, score=i % 6, total_questions=5)
+            for i in range(rows)
+        ]
+        documents[0].set_content("Page text\n" * 20 * rows, [i * 200 for i in range(rows)])
+        for i in range(rows):
+            QASession.objects.create(user=user, document=documents[i % rows], question=f"Q{i}", answer="A")
+
+        client = Client()
+        client.force_login(user)
+        client.get(reverse('home'))  # The first request also resumes pending jobs; keep that out of the counts
+        # Compression dictionaries are loaded once per process; don't count that either
+        for dictionary_id in CompressionDictionary.objects.values_list('id', flat=True):
+            get_dictionary(dictionary_id)
+        _, page_two = keyset_page(TestAttempt.objects.filter(user=user), 'completed_at', per_page=ATTEMPTS_PER_PAGE)
+
+        pages = [
+            ('dashboard', reverse('dashboard')),
+            ('progress_tracking', reverse('progress_tracking')),
+            ('progress_tracking (page 2)', f"{reverse('progress_tracking')}?before={page_two or ''}"),
+            ('document_detail', reverse('document_detail', args=[documents[0].id])),
+            ('document_text', f"{reverse('document_text', args=[documents[0].id])}?page=2"),
+            ('generate_test', reverse('generate_test', args=[documents[0].id])),
+            ('qa_session', reverse('qa_session', args=[documents[0].id])),
+            ('take_test', reverse('take_test', args=[tests[0].id])),
+            ('test_result', reverse('test_result', args=[attempts[0].id])),
+            ('admin: documents', reverse('admin:core_document_changelist')),
+            ('admin: Q&A sessions', reverse('admin:core_qasession_changelist')),
+            ('admin: tests', reverse('admin:core_test_changelist')),
+            ('admin: test attempts', reverse('admin:core_testattempt_changelist')),
+        ]
+
+        results = []
+        for name, url in pages:
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f"{name} returned HTTP {response.status_code}")
+            problems = []
+            if connection.vendor == 'sqlite' and name in PLAN_CHECKED_PAGES:
+                for query in queries.captured_queries:
+                    if query['sql'].lstrip().upper().startswith('SELECT'):
+                        steps = plan_problems(query['sql'])
+                        if steps:
+                            problems.append((query['sql'], steps))
+            results.append((name, len(queries), problems))
+        return results
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.ai_cache import get_response_cache
+
+
+class Command(BaseCommand):
+    help = "Clear the persistent tier of the Gemini response cache."
+
+    def handle(self, *args, **options):
+        get_response_cache().clear()
+        self.stdout.write(self.style.SUCCESS("AI response cache cleared."))
@@ -0,0 +1,68 @@
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.content_cache import get_cache_entry, sha256_of_file
+from core.models import Document, ExtractionCache
+from core.utils import summary_failed
+
+
+class Command(BaseCommand):
+    help = (
+        "Hash existing uploads, point identical files at a single stored copy, "
+        "seed the extraction cache and delete the redundant copies."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing.")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        by_hash = defaultdict(list)
+
+        for document in Document.objects.exclude(file='').order_by('uploaded_at'):
+            if not default_storage.exists(document.file.name):
+                self.stderr.write(self.style.WARNING(f"Missing file for '{document}': {document.file.name}"))
+                continue
+            with document.file.open('rb') as f:
+                by_hash[sha256_of_file(f)].append(document)
+
+        redundant_files = set()
+        for sha256, documents in by_hash.items():
+            entry = get_cache_entry(sha256)
+            canonical = entry.file.name if entry else documents[0].file.name
+
+            # Seed the cache from the first document that processed cleanly
+            source = next(
+                (d for d in documents if d.is_processed and d.content and not summary_failed(d.summary)),
+                None,
+            )
+            if not dry_run:
+                entry, _ = ExtractionCache.objects.get_or_create(sha256=sha256, defaults={'file': canonical})
+                if source and not entry.summary:
+                    entry.content = source.content
+                    entry.page_offsets = source.page_offsets
+                    entry.summary = source.summary
+                    entry.save(update_fields=['content', 'page_offsets', 'summary', 'updated_at'])
+
+            for document in documents:
+                if document.file.name != canonical:
+                    redundant_files.add(document.file.name)
+                if not dry_run and (document.file.name != canonical or document.content_hash != sha256):
+                    Document.objects.filter(pk=document.pk).update(file=canonical, content_hash=sha256)
+
+        # Only delete files nothing refers to any more
+        still_referenced = set(Document.objects.values_list('file', flat=True))
+        still_referenced |= set(ExtractionCache.objects.values_list('file', flat=True))
+        for name in sorted(redundant_files - still_referenced if not dry_run else redundant_files):
+            if dry_run:
+                self.stdout.write(f"Would delete {name}")
+            else:
+                default_storage.delete(name)
+                self.stdout.write(f"Deleted {name}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(len(d) for d in by_hash.values())} document(s), {len(by_hash)} unique file(s), "
+            f"{len(redundant_files)} redundant cop{'y' if len(redundant_files) == 1 else 'ies'}"
+        ))
@@ -0,0 +1,131 @@
+import statistics
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.models import Document, Test
+
+QUESTIONS = [
+    {
+        'question': f"Load test question {i}",
+        'options': {'A': 'First', 'B': 'Second', 'C': 'Third', 'D': 'Fourth'},
+        'correct_answer': 'A',
+    }
+    for i in range(5)
+]
+ANSWERS = {f'question_{i}': 'AB'[i % 2] for i in range(len(QUESTIONS))}
+
+# Stock Django SQLite settings: rollback journal, fsync on every commit,
+# Python's default 5 second busy timeout and deferred transactions
+BASELINE_SQLITE_SETTINGS = {
+    'SQLITE_PRAGMAS': {
+        'journal_mode': 'delete',
+        'synchronous': 'full',
+        'busy_timeout': 5000,
+        'mmap_size': 0,
+    },
+    'SQLITE_TRANSACTION_MODE': '',
+}
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Submit tests concurrently through the submit_test view and report throughput, "
+        "latency and failures. On SQLite, runs once with Django's stock SQLite settings "
+        "and once with SQLITE_PRAGMAS and SQLITE_TRANSACTION_MODE for comparison."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--submissions', type=int, default=400, help="Submissions per run.")
+        parser.add_argument('--no-baseline', action='store_true', help="Only run with the configured settings.")
+
+    def handle(self, *args, **options):
+        runs = [('configured', None)]
+        if connection.vendor == 'sqlite' and not options['no_baseline']:
+            # Baseline first, so the database is left in the configured journal mode
+            runs.insert(0, ('baseline', BASELINE_SQLITE_SETTINGS))
+
+        user = User.objects.create_user(f'loadtest-{uuid.uuid4().hex[:12]}')
+        try:
+            document = Document.objects.create(user=user, title="Load test document", is_processed=True)
+            test = Test.objects.create(user=user, document=document, title="Load test", questions=QUESTIONS)
+            for label, overrides in runs:
+                with override_settings(**(overrides or {})):
+                    self._run(label, user, test, options)
+        finally:
+            connection.close()
+            user.delete()
+
+    def _run(self, label, user, test, options):
+        # New connections (this one included) pick up the settings for this run
+        connections.close_all()
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                journal_mode = cursor.fetchone()[0]
+            self.stdout.write(f"\n{label}: journal_mode={journal_mode}")
+        else:
+            self.stdout.write(f"\n{label}: {connection.vendor}")
+
+        url = reverse('submit_test', args=[test.id])
+        # submit_test redirects back to the test when saving the attempt fails
+        failure_url = reverse('take_test', args=[test.id])
+        per_thread = options['submissions'] // options['threads']
+        latencies = []
+        failures = []
+        lock = threading.Lock()
+
+        def worker():
+            client = Client()
+            client.force_login(user)
+            try:
+                for _ in range(per_thread):
+                    started = time.perf_counter()
+                    try:
+                        response = client.post(url, ANSWERS)
+                        ok = response.status_code == 302 and response['Location'] != failure_url
+                        error = None if ok else f"HTTP {response.status_code} to {response.get('Location', '')}"
+                    except Exception as e:
+                        error = str(e)
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        if error:
+                            failures.append(error)
+                        else:
+                            latencies.append(elapsed * 1000)
+            finally:
+                client.logout()
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total = per_thread * options['threads']
+        self.stdout.write(
+            f"  {total} submissions on {options['threads']} threads in {elapsed:.2f} s: "
+            f"{len(latencies) / elapsed:.1f} successful/s, {len(failures)} failed"
+        )
+        if latencies:
+            self.stdout.write(
+                f"  latency p50 {statistics.median(latencies):.1f} ms, p95 {_percentile(latencies, 0.95):.1f} ms, "
+                f"max {max(latencies):.1f} ms"
+            )
+        for error in sorted(set(failures))[:5]:
+            self.stdout.write(f"  failure: {error}")
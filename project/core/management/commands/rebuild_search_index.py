@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.search import is_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the full-text search index from the documents, summaries and "
+        "Q&A sessions tables (after upgrading, or if the index is out of step)."
+    )
+
+    def handle(self, *args, **options):
+        if not is_available():
+            raise CommandError("Full-text search needs SQLite's FTS5; this database doesn't have the index.")
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} item(s)."))
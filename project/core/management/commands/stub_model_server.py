@@ -0,0 +1,112 @@
+import hashlib
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+WORDS = (
+    "concept definition example principle method result analysis structure process function "
+    "variable condition statement loop value system model theory practice summary"
+).split()
+
+
+def fake_text(prompt, word_count):
+    """Deterministic filler text derived from the prompt."""
+    seed = hashlib.sha256(prompt.encode('utf-8')).digest()
+    return " ".join(WORDS[seed[i % len(seed)] % len(WORDS)] for i in range(word_count)).capitalize() + "."
+
+
+def fake_questions(prompt, count):
+    return [
+        {
+            'question': f"Question {number}: {fake_text(prompt + str(number), 8)}",
+            'options': {letter: fake_text(prompt + str(number) + letter, 4) for letter in 'ABCD'},
+            'correct_answer': 'ABCD'[number % 4],
+        }
+        for number in range(1, count + 1)
+    ]
+
+
+def make_handler(latency, tokens_per_second, words):
+    class StubModelHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive, so clients can reuse connections
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if self.path != '/v1/generate':
+                self.send_error(404)
+                return
+
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            prompt = payload.get('prompt', '')
+            time.sleep(latency)
+
+            match = re.search(r"generate (\d+) multiple choice questions", prompt)
+            if match:
+                text = json.dumps(fake_questions(prompt, int(match.group(1))), indent=2)
+            else:
+                text = fake_text(prompt, words)
+
+            if payload.get('stream'):
+                self._stream(text)
+            else:
+                self._send(json.dumps({'text': text}).encode('utf-8'))
+
+        def _send(self, body):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _stream(self, text):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for token in re.findall(r"\S+\s*", text):
+                if tokens_per_second:
+                    time.sleep(1 / tokens_per_second)
+                line = json.dumps({'text': token}).encode('utf-8') + b"\n"
+                self.wfile.write(f"{len(line):X}\r\n".encode('ascii') + line + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+    return StubModelHandler
+
+
+class StubModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # Benchmarks open many connections at once
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local stub of the AI model API with configurable latency. "
+        "Point AI_STUB_SERVER_URL at it to benchmark without the real API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.5, help="Seconds before each response starts.")
+        parser.add_argument('--tokens-per-second', type=float, default=50, help="Streaming speed (0 = no delay).")
+        parser.add_argument('--words', type=int, default=150, help="Length of generated text responses.")
+
+    def handle(self, *args, **options):
+        handler = make_handler(options['latency'], options['tokens_per_second'], options['words'])
+        server = StubModelServer((options['host'], options['port']), handler)
+        self.stdout.write(self.style.SUCCESS(
+            f"Stub model server on http://{options['host']}:{options['port']} "
+            f"(latency {options['latency']}s). Set AI_STUB_SERVER_URL to use it."
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.compression import get_compression_settings, reset_dictionary_cache, train_dictionary
+from core.models import CompressionDictionary, Document, DocumentPage, ExtractionCache, QASession
+
+# (model, compressed field) pairs that share the dictionary
+COLUMNS = [
+    (DocumentPage, 'text'),
+    (Document, 'summary'),
+    (QASession, 'answer'),
+    (ExtractionCache, 'content'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Train a shared compression dictionary on existing text and make it the "
+        "one new writes use. With --recompress, rewrite existing rows with it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=32 * 1024, help="Dictionary size in bytes.")
+        parser.add_argument('--samples', type=int, default=500, help="Rows sampled per column.")
+        parser.add_argument('--sample-chars', type=int, default=20000, help="Characters taken from each sample.")
+        parser.add_argument('--recompress', action='store_true', help="Rewrite existing rows with the new dictionary.")
+
+    def handle(self, *args, **options):
+        codec = get_compression_settings()['CODEC']
+        samples = []
+        for model, field in COLUMNS:
+            for value in model.objects.order_by('?').values_list(field, flat=True)[:options['samples']]:
+                if value:
+                    samples.append(value[:options['sample_chars']])
+
+        if len(samples) < 5:
+            raise CommandError("Not enough stored text to train a dictionary yet.")
+
+        data = train_dictionary(samples, codec, options['size'])
+        dictionary = CompressionDictionary.objects.create(codec=codec, data=data, sample_count=len(samples))
+        reset_dictionary_cache()
+        self.stdout.write(self.style.SUCCESS(
+            f"Trained {codec} dictionary {dictionary.id} ({len(data)} bytes) from {len(samples)} samples."
+        ))
+
+        if options['recompress']:
+            for model, field in COLUMNS:
+                count = self._recompress(model, field)
+                self.stdout.write(f"Recompressed {count} {model._meta.verbose_name_plural} ({field})")
+
+    def _recompress(self, model, field, batch_size=200):
+        """Re-save a column in batches; values are decompressed on read and compressed with the new dictionary on write."""
+        count = 0
+        batch = []
+        for row in model.objects.only('pk', field).iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                model.objects.bulk_update(batch, [field])
+                count += len(batch)
+                batch = []
+        model.objects.bulk_update(batch, [field])
+        return count + len(batch)
@@ -0,0 +1,452 @@
+"""
+In-process timing metrics for the hot paths.
+
+Histograms and counters live in this process and are read at ``/metrics`` in
+the Prometheus text format, by staff users or a scraper sending
+``METRICS['TOKEN']`` as a bearer token. Each worker process keeps its own
+numbers, so scrape every worker (or sum across them). What is measured:
+
+- requests: duration, database queries and database time per view
+  (``MetricsMiddleware``), and template render time (the template backend in
+  ``core.backends.templates``);
+- AI calls: latency, prompt and response size and retries per calling
+  function (``instrument_model``), plus the response cache, single-flight and
+  rate limiter counters, collected when scraped;
+- PDF extraction: time per page and per document.
+
+With ``METRICS['SERVER_TIMING']`` on, responses carry a ``Server-Timing``
+header with the request's database, template and AI time, which browser dev
+tools show per request. Setting the ``core.metrics`` logger to DEBUG logs the
+same numbers for every request.
+"""
+import contextvars
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+from functools import cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SERVER_TIMING': False,
+    'TOKEN': '',
+    # Trusted only without a proxy in front: behind one, every client has the proxy's address
+    'ALLOWED_IPS': [],
+}
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # seconds
+PAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10)  # seconds
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+SIZE_BUCKETS = (100, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)  # characters
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def get_metrics_settings():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+@cache
+def is_enabled():
+    return get_metrics_settings()['ENABLED']
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Thread-safe histogram with fixed buckets, one series per combination of label values."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def totals(self, *labelvalues):
+        """``(count, sum)`` of the observations with these label values."""
+        with self._lock:
+            series = self._series.get(labelvalues)
+            return (sum(series[:-1]), series[-1]) if series else (0, 0.0)
+
+    def samples(self):
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labelvalues, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                le = bound if bound == '+Inf' else _format_value(float(bound))
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, labelvalues, [("le", le)])} {cumulative}'
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f'{self.name}_sum{labels} {_format_value(values[-1])}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Counter:
+    """Thread-safe counter, one series per combination of label values."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._series[labelvalues] = self._series.get(labelvalues, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            series = dict(self._series)
+        for labelvalues, value in sorted(series.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}'
+
+
+class Snapshot:
+    """Counters or gauges read from another component's stats when scraped."""
+
+    def __init__(self, name, documentation, kind, labelnames, values):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._values = values  # [(label values, value)]
+
+    def samples(self):
+        for labelvalues, value in self._values:
+            yield f'{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}'
+
+
+request_seconds = Histogram(
+    'smartx_request_seconds', 'Time to produce a response, by view.', LATENCY_BUCKETS, ['view', 'method'],
+)
+requests_total = Counter('smartx_requests_total', 'Responses, by view and status code.', ['view', 'method', 'status'])
+request_db_queries = Histogram(
+    'smartx_request_db_queries', 'Database queries made per request, by view.', QUERY_COUNT_BUCKETS, ['view'],
+)
+request_db_seconds = Histogram(
+    'smartx_request_db_seconds', 'Time spent in database queries per request, by view.', LATENCY_BUCKETS, ['view'],
+)
+template_render_seconds = Histogram(
+    'smartx_template_render_seconds', 'Time to render a template, by template name.', LATENCY_BUCKETS, ['template'],
+)
+ai_call_seconds = Histogram(
+    'smartx_ai_call_seconds', 'AI model call latency including rate limiting and retries, by calling function.',
+    LATENCY_BUCKETS, ['function', 'outcome'],
+)
+ai_prompt_chars = Histogram(
+    'smartx_ai_prompt_chars', 'Prompt size of AI model calls, by calling function.', SIZE_BUCKETS, ['function'],
+)
+ai_response_chars = Histogram(
+    'smartx_ai_response_chars', 'Response size of AI model calls, by calling function.', SIZE_BUCKETS, ['function'],
+)
+ai_retries_total = Counter('smartx_ai_retries_total', 'AI model calls retried, by calling function.', ['function'])
+ai_queue_wait_seconds = Histogram(
+    'smartx_ai_queue_wait_seconds', 'Time AI calls waited for a rate limit slot.', LATENCY_BUCKETS,
+)
+pdf_page_seconds = Histogram('smartx_pdf_page_extract_seconds', 'Time to extract the text of one PDF page.', PAGE_BUCKETS)
+pdf_document_seconds = Histogram(
+    'smartx_pdf_extract_seconds', 'Time to extract the text of a whole PDF, by mode.', LATENCY_BUCKETS, ['mode'],
+)
+
+METRICS = [
+    request_seconds, requests_total, request_db_queries, request_db_seconds, template_render_seconds,
+    ai_call_seconds, ai_prompt_chars, ai_response_chars, ai_retries_total, ai_queue_wait_seconds,
+    pdf_page_seconds, pdf_document_seconds,
+]
+
+
+def collect_component_stats():
+    """Snapshots of the response cache, single-flight and rate limiter counters."""
+    from .ai_cache import get_response_cache
+    from .ratelimit import get_gate
+    from .singleflight import get_single_flight
+
+    cache_stats = get_response_cache().stats()
+    flight_stats = get_single_flight().stats()
+    gate_stats = get_gate().stats()
+    return [
+        Snapshot(
+            'smartx_ai_cache_lookups_total', 'AI response cache lookups, by calling function and result.', 'counter',
+            ['function', 'result'],
+            [((function, result), count)
+             for function, counts in sorted(cache_stats['functions'].items())
+             for result, count in sorted(counts.items())],
+        ),
+        Snapshot(
+            'smartx_ai_cache_entries', 'Responses held in the in-memory cache tier.', 'gauge', [],
+            [((), cache_stats['entries'])],
+        ),
+        Snapshot(
+            'smartx_ai_single_flight_total', 'AI calls made or shared by single-flight, by calling function.',
+            'counter', ['function', 'outcome'],
+            [((function, outcome), count)
+             for function, counts in sorted(flight_stats['functions'].items())
+             for outcome, count in sorted(counts.items())],
+        ),
+        Snapshot(
+            'smartx_ai_single_flight_in_flight', 'AI calls in flight that identical calls can join.', 'gauge', [],
+            [((), flight_stats['in_flight'])],
+        ),
+        Snapshot(
+            'smartx_ai_gate_calls_total', 'AI calls let through the rate limiter.', 'counter', [],
+            [((), gate_stats['calls'])],
+        ),
+        Snapshot(
+            'smartx_ai_gate_in_flight', 'AI calls holding a concurrency slot.', 'gauge', [],
+            [((), gate_stats['in_flight'])],
+        ),
+        Snapshot(
+            'smartx_ai_gate_waiting', 'AI calls waiting for a concurrency slot.', 'gauge', [],
+            [((), gate_stats['waiting'])],
+        ),
+    ]
+
+
+def can_read_metrics(request):
+    """Staff, a request bearing ``METRICS['TOKEN']``, or one from ``METRICS['ALLOWED_IPS']``."""
+    options = get_metrics_settings()
+    if request.user.is_staff:
+        return True
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if options['TOKEN'] and scheme.lower() == 'bearer' and hmac.compare_digest(token.strip(), options['TOKEN']):
+        return True
+    return request.META.get('REMOTE_ADDR') in options['ALLOWED_IPS']
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS + collect_component_stats():
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+class RequestTimings:
+    """Time spent per component while handling one request."""
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.ai_calls = 0
+        self.ai_seconds = 0.0
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_queries} queries"',
+            f'tpl;dur={self.template_seconds * 1000:.1f}',
+            f'ai;dur={self.ai_seconds * 1000:.1f};desc="{self.ai_calls} calls"',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+# Timings of the request being handled; copied into sync_to_async threads with the rest of the context
+current_timings = contextvars.ContextVar('current_request_timings', default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_queries += 1
+        timings.db_seconds += time.perf_counter() - started
+
+
+@receiver(connection_created, dispatch_uid='core.metrics.time_queries')
+def time_queries(sender, connection, **kwargs):
+    if is_enabled() and _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def observe_template(name, seconds):
+    template_render_seconds.observe(seconds, name or '<string>')
+    timings = current_timings.get()
+    if timings is not None:
+        timings.template_seconds += seconds
+
+
+def observe_ai_call(function, seconds, prompt, text, outcome='ok'):
+    """Record one AI call; streaming callers that assemble the text themselves call this directly."""
+    ai_call_seconds.observe(seconds, function, outcome)
+    if isinstance(prompt, str):
+        ai_prompt_chars.observe(len(prompt), function)
+    if text:
+        ai_response_chars.observe(len(text), function)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.ai_calls += 1
+        timings.ai_seconds += seconds
+
+
+def observe_pages(seconds_per_page):
+    for seconds in seconds_per_page:
+        pdf_page_seconds.observe(seconds)
+
+
+# The function an AI call is made for, so retries deeper in the stack are attributed to it
+current_ai_function = contextvars.ContextVar('current_ai_function', default='default')
+
+
+def record_ai_retry():
+    ai_retries_total.inc(current_ai_function.get())
+
+
+class MetricsMiddleware:
+    """Time each request and its database work, and add the Server-Timing header."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.server_timing = get_metrics_settings()['SERVER_TIMING']
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self._finish(request, response, timings, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self._finish(request, response, timings, time.perf_counter() - started)
+
+    def _finish(self, request, response, timings, total):
+        # Streaming responses are timed until their first byte is ready
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        request_seconds.observe(total, view, request.method)
+        requests_total.inc(view, request.method, response.status_code)
+        request_db_queries.observe(timings.db_queries, view)
+        request_db_seconds.observe(timings.db_seconds, view)
+        if self.server_timing:
+            response['Server-Timing'] = timings.server_timing(total)
+        logger.debug(
+            f"{request.method} {view} {response.status_code} {total * 1000:.1f}ms "
+            f"db={timings.db_queries}/{timings.db_seconds * 1000:.1f}ms "
+            f"tpl={timings.template_seconds * 1000:.1f}ms ai={timings.ai_calls}/{timings.ai_seconds * 1000:.1f}ms"
+        )
+        return response
+
+
+def _response_text(response):
+    try:
+        return response.text if response else None
+    except ValueError:
+        return None
+
+
+class InstrumentedModel:
+    """
+    Wrap a generative model to time each call by calling function.
+
+    Takes ``cache_namespace`` like the layers above it and doesn't pass it on.
+    Streamed responses are passed through; their callers report the whole
+    stream with ``observe_ai_call``.
+    """
+
+    def __init__(self, model):
+        self._model = model
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def generate_content(self, prompt, *args, cache_namespace='default', **kwargs):
+        if args or kwargs:
+            return self._model.generate_content(prompt, *args, **kwargs)
+        if not is_enabled():
+            return self._model.generate_content(prompt)
+        token = current_ai_function.set(cache_namespace)
+        started = time.perf_counter()
+        try:
+            response = self._model.generate_content(prompt)
+        except Exception:
+            observe_ai_call(cache_namespace, time.perf_counter() - started, prompt, None, outcome='error')
+            raise
+        finally:
+            current_ai_function.reset(token)
+        observe_ai_call(cache_namespace, time.perf_counter() - started, prompt, _response_text(response))
+        return response
+
+    async def generate_content_async(self, prompt, *args, cache_namespace='default', **kwargs):
+        if args or kwargs:
+            return await self._model.generate_content_async(prompt, *args, **kwargs)
+        if not is_enabled():
+            return await self._model.generate_content_async(prompt)
+        token = current_ai_function.set(cache_namespace)
+        started = time.perf_counter()
+        try:
+            response = await self._model.generate_content_async(prompt)
+        except Exception:
+            observe_ai_call(cache_namespace, time.perf_counter() - started, prompt, None, outcome='error')
+            raise
+        finally:
+            current_ai_function.reset(token)
+        observe_ai_call(cache_namespace, time.perf_counter() - started, prompt, _response_text(response))
+        return response
+
+
+def instrument_model(model):
+    """Wrap a model handle to time its calls (only dropping ``cache_namespace`` when metrics are off)."""
+    if model is None:
+        return None
+    return InstrumentedModel(model)
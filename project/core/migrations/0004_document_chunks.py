@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-16 20:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_extractioncache'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='processingjob',
+            name='stage',
+            field=models.CharField(choices=[('queued', 'Queued'), ('extracting', 'Extracting text'), ('indexing', 'Indexing for Q&A'), ('summarizing', 'Generating summary'), ('done', 'Done')], default='queued', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='DocumentIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chunk_count', models.PositiveIntegerField(default=0)),
+                ('avg_chunk_length', models.FloatField(default=0)),
+                ('chunk_lengths', models.JSONField(default=list)),
+                ('postings', models.JSONField(default=dict)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_index', to='core.document')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DocumentChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('start_offset', models.PositiveIntegerField()),
+                ('end_offset', models.PositiveIntegerField()),
+                ('text', models.TextField()),
+                ('length', models.PositiveIntegerField()),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='core.document')),
+            ],
+            options={
+                'ordering': ['document', 'index'],
+                'unique_together': {('document', 'index')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-16 20:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_processingjob_run_after'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='kind',
+            field=models.CharField(choices=[('process', 'Document processing'), ('question_bank', 'Question bank')], db_index=True, default='process', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='processingjob',
+            name='stage',
+            field=models.CharField(choices=[('queued', 'Queued'), ('extracting', 'Extracting text'), ('indexing', 'Indexing for Q&A'), ('summarizing', 'Generating summary'), ('generating_questions', 'Generating questions'), ('done', 'Done')], default='queued', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='BankQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.TextField()),
+                ('options', models.JSONField()),
+                ('correct_answer', models.CharField(max_length=1)),
+                ('source_chunk', models.PositiveIntegerField(blank=True, null=True)),
+                ('question_hash', models.CharField(max_length=64)),
+                ('times_served', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_bank', to='core.document')),
+            ],
+            options={
+                'ordering': ['document', 'times_served'],
+                'indexes': [models.Index(fields=['document', 'times_served'], name='core_bankqu_documen_0fd78b_idx')],
+                'unique_together': {('document', 'question_hash')},
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-16 20:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0007_question_bank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentStats',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.document')),
+                ('test_count', models.PositiveIntegerField(default=0)),
+                ('attempt_count', models.PositiveIntegerField(default=0)),
+                ('qa_count', models.PositiveIntegerField(default=0)),
+                ('percentage_total', models.FloatField(default=0)),
+                ('best_percentage', models.FloatField(default=0)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Document stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='study_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('document_count', models.PositiveIntegerField(default=0)),
+                ('attempt_count', models.PositiveIntegerField(default=0)),
+                ('qa_count', models.PositiveIntegerField(default=0)),
+                ('percentage_total', models.FloatField(default=0)),
+                ('best_percentage', models.FloatField(default=0)),
+                ('recent_percentages', models.JSONField(default=list)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('is_stale', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'User stats',
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-16 20:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_content(apps, schema_editor):
+    Document = apps.get_model('core', 'Document')
+    DocumentContent = apps.get_model('core', 'DocumentContent')
+    rows = []
+    for document_id, content in Document.objects.exclude(content='').values_list('id', 'content').iterator():
+        rows.append(DocumentContent(document_id=document_id, text=content))
+        if len(rows) >= 100:
+            DocumentContent.objects.bulk_create(rows)
+            rows = []
+    DocumentContent.objects.bulk_create(rows)
+
+
+def restore_content(apps, schema_editor):
+    Document = apps.get_model('core', 'Document')
+    DocumentContent = apps.get_model('core', 'DocumentContent')
+    for row in DocumentContent.objects.iterator():
+        Document.objects.filter(id=row.document_id).update(content=row.text)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentContent',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='full_text', serialize=False, to='core.document')),
+                ('text', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.RunPython(copy_content, restore_content),
+        migrations.RemoveField(
+            model_name='document',
+            name='content',
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.7 on 2026-10-16 20:59
+
+import core.fields
+from core.compression import dictionaries_disabled
+from django.db import migrations, models
+
+# (model, field, options of the compressed field)
+COLUMNS = [
+    ('document', 'summary', {'blank': True, 'default': ''}),
+    ('documentcontent', 'text', {'blank': True, 'default': ''}),
+    ('extractioncache', 'content', {'blank': True, 'default': ''}),
+    ('qasession', 'answer', {}),
+]
+
+BATCH_SIZE = 200
+
+
+def copy_column(model_name, source, target):
+    """
+    Copy ``source`` into ``target`` in batches; the field classes do the
+    (de)compression, without a dictionary, which would come from the live model.
+    """
+    def copy(apps, schema_editor):
+        Model = apps.get_model('core', model_name)
+        with dictionaries_disabled():
+            batch = []
+            for pk, value in Model.objects.values_list('pk', source).iterator(chunk_size=BATCH_SIZE):
+                row = Model(pk=pk)
+                setattr(row, target, value or '')
+                batch.append(row)
+                if len(batch) >= BATCH_SIZE:
+                    Model.objects.bulk_update(batch, [target])
+                    batch = []
+            Model.objects.bulk_update(batch, [target])
+    return copy
+
+
+def convert(model_name, name, options):
+    """Operations replacing a text column with a compressed one of the same name."""
+    compressed = f'{name}_compressed'
+    return [
+        migrations.AddField(
+            model_name=model_name,
+            name=compressed,
+            field=core.fields.CompressedTextField(blank=True, default=''),
+        ),
+        migrations.RunPython(
+            copy_column(model_name, name, compressed),
+            copy_column(model_name, compressed, name),
+        ),
+        # blank=True gives the column an empty default if this is ever reversed (no schema change)
+        migrations.AlterField(model_name=model_name, name=name, field=models.TextField(blank=True)),
+        migrations.RemoveField(model_name=model_name, name=name),
+        migrations.RenameField(model_name=model_name, old_name=compressed, new_name=name),
+        migrations.AlterField(
+            model_name=model_name,
+            name=name,
+            field=core.fields.CompressedTextField(**options),
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_document_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompressionDictionary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codec', models.CharField(max_length=10)),
+                ('data', models.BinaryField()),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Compression dictionaries',
+                'ordering': ['-id'],
+            },
+        ),
+    ] + [operation for model_name, name, options in COLUMNS for operation in convert(model_name, name, options)]
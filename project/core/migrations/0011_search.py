@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+SCHEMA_SQL = [
+    "CREATE VIRTUAL TABLE core_search_fts USING fts5("
+    "title, body, owner, tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3')",
+    "CREATE TRIGGER core_searchentry_delete AFTER DELETE ON core_searchentry "
+    "BEGIN DELETE FROM core_search_fts WHERE rowid = old.id; END",
+]
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS core_searchentry_delete",
+    "DROP TABLE IF EXISTS core_search_fts",
+]
+
+
+def run_on_sqlite(statements):
+    """The FTS5 index only exists on SQLite; other databases get just the SearchEntry table."""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0010_compressed_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('document', 'Document text'), ('summary', 'Summary'), ('qa', 'Q&A')], max_length=10)),
+                ('object_id', models.UUIDField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.document')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Search entries',
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        # Existing rows are indexed by `manage.py rebuild_search_index`
+        migrations.RunPython(run_on_sqlite(SCHEMA_SQL), run_on_sqlite(DROP_SQL)),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['user', '-uploaded_at'], name='core_docume_user_id_2e0d0b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='processingjob',
+            index=models.Index(fields=['document', 'kind', '-created_at'], name='core_proces_documen_861018_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qasession',
+            index=models.Index(fields=['user', '-created_at'], name='core_qasess_user_id_20d1f3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qasession',
+            index=models.Index(fields=['document', 'user', '-created_at'], name='core_qasess_documen_3a9fe5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='test',
+            index=models.Index(fields=['document', 'user', '-created_at'], name='core_test_documen_e86517_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testattempt',
+            index=models.Index(fields=['user', '-completed_at', '-id'], name='core_testat_user_id_14bd8f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testattempt',
+            index=models.Index(fields=['test', '-completed_at'], name='core_testat_test_id_0c6e44_idx'),
+        ),
+    ]
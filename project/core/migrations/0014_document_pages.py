@@ -0,0 +1,87 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:39
+
+import core.fields
+from django.db import migrations, models
+import django.db.models.deletion
+from bisect import bisect_right
+
+
+def _pages(document_id, text, page_offsets, DocumentPage):
+    starts = list(page_offsets or [0])
+    starts[0] = 0
+    ends = starts[1:] + [len(text)]
+    return [
+        DocumentPage(document_id=document_id, number=number, start_offset=start, end_offset=max(start, end),
+                     text=text[start:end])
+        for number, (start, end) in enumerate(zip(starts, ends), start=1)
+    ]
+
+
+def split_content(apps, schema_editor):
+    Document = apps.get_model('core', 'Document')
+    DocumentChunk = apps.get_model('core', 'DocumentChunk')
+    DocumentContent = apps.get_model('core', 'DocumentContent')
+    DocumentPage = apps.get_model('core', 'DocumentPage')
+    ExtractionCache = apps.get_model('core', 'ExtractionCache')
+
+    for row in DocumentContent.objects.iterator(chunk_size=100):
+        content_hash = Document.objects.filter(id=row.document_id).values_list('content_hash', flat=True).first()
+        entry = ExtractionCache.objects.filter(sha256=content_hash).first() if content_hash else None
+        # Page offsets were only kept with the extraction cache, for text as extracted
+        page_offsets = entry.page_offsets if entry and entry.content == row.text else None
+        pages = _pages(row.document_id, row.text, page_offsets, DocumentPage)
+        DocumentPage.objects.bulk_create(pages, batch_size=200)
+
+        page_starts = [page.start_offset for page in pages if page.end_offset > page.start_offset]
+        page_numbers = [page.number for page in pages if page.end_offset > page.start_offset]
+        chunks = list(DocumentChunk.objects.filter(document_id=row.document_id).only('id', 'start_offset'))
+        if page_starts and chunks:
+            for chunk in chunks:
+                chunk.page = page_numbers[max(bisect_right(page_starts, chunk.start_offset) - 1, 0)]
+            DocumentChunk.objects.bulk_update(chunks, ['page'], batch_size=500)
+
+
+def join_pages(apps, schema_editor):
+    DocumentContent = apps.get_model('core', 'DocumentContent')
+    DocumentPage = apps.get_model('core', 'DocumentPage')
+    texts = {}
+    for page in DocumentPage.objects.order_by('document', 'number').iterator(chunk_size=500):
+        texts.setdefault(page.document_id, []).append(page.text)
+    DocumentContent.objects.bulk_create(
+        [DocumentContent(document_id=document_id, text="".join(parts)) for document_id, parts in texts.items()],
+        batch_size=100,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_chunked_upload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('start_offset', models.PositiveIntegerField()),
+                ('end_offset', models.PositiveIntegerField()),
+                ('text', core.fields.CompressedTextField(blank=True, default='')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='core.document')),
+            ],
+            options={
+                'ordering': ['number'],
+                'unique_together': {('document', 'number')},
+            },
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='page',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(split_content, join_pages),
+        migrations.DeleteModel(
+            name='DocumentContent',
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def split_postings(apps, schema_editor):
+    DocumentIndex = apps.get_model('core', 'DocumentIndex')
+    DocumentTerm = apps.get_model('core', 'DocumentTerm')
+    for index in DocumentIndex.objects.iterator(chunk_size=20):
+        DocumentTerm.objects.bulk_create(
+            [
+                DocumentTerm(document_id=index.document_id, term=term, postings=postings)
+                for term, postings in (index.postings or {}).items()
+                if len(term) <= 64
+            ],
+            batch_size=500,
+        )
+
+
+def join_postings(apps, schema_editor):
+    DocumentIndex = apps.get_model('core', 'DocumentIndex')
+    DocumentTerm = apps.get_model('core', 'DocumentTerm')
+    postings = {}
+    for row in DocumentTerm.objects.order_by('document').iterator(chunk_size=2000):
+        postings.setdefault(row.document_id, {})[row.term] = row.postings
+    for index in DocumentIndex.objects.all():
+        index.postings = postings.get(index.document_id, {})
+        index.save(update_fields=['postings'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_inflightcall'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('postings', models.JSONField(default=list)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='index_terms', to='core.document')),
+            ],
+            options={
+                'unique_together': {('document', 'term')},
+            },
+        ),
+        migrations.RunPython(split_postings, join_postings),
+        migrations.RemoveField(
+            model_name='documentindex',
+            name='postings',
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:40
+
+import core.fields
+from core.compression import dictionaries_disabled
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def copy_column(source, target):
+    """
+    Copy ``source`` into ``target`` in batches; the field classes do the
+    (de)compression, without a dictionary, which would come from the live model.
+    """
+    def copy(apps, schema_editor):
+        DocumentChunk = apps.get_model('core', 'DocumentChunk')
+        with dictionaries_disabled():
+            batch = []
+            for pk, value in DocumentChunk.objects.values_list('pk', source).iterator(chunk_size=BATCH_SIZE):
+                row = DocumentChunk(pk=pk)
+                setattr(row, target, value or '')
+                batch.append(row)
+                if len(batch) >= BATCH_SIZE:
+                    DocumentChunk.objects.bulk_update(batch, [target])
+                    batch = []
+            DocumentChunk.objects.bulk_update(batch, [target])
+    return copy
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_document_terms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='text_compressed',
+            field=core.fields.CompressedTextField(blank=True, default=''),
+        ),
+        migrations.RunPython(copy_column('text', 'text_compressed'), copy_column('text_compressed', 'text')),
+        # blank=True gives the column an empty default if this is ever reversed (no schema change)
+        migrations.AlterField(model_name='documentchunk', name='text', field=models.TextField(blank=True)),
+        migrations.RemoveField(model_name='documentchunk', name='text'),
+        migrations.RenameField(model_name='documentchunk', old_name='text_compressed', new_name='text'),
+        migrations.AlterField(
+            model_name='documentchunk',
+            name='text',
+            field=core.fields.CompressedTextField(),
+        ),
+    ]
@@ -1,41 +1,316 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.dispatch import Signal
+from django.utils.functional import cached_property
 import uuid
 
+from .fields import CompressedTextField
+
+# Sent by Document.set_content() with ``document`` and ``text`` once the pages are stored
+content_changed = Signal()
+
+
+class DocumentQuerySet(models.QuerySet):
+    def listing(self):
+        """For pages that list or act on documents: skip the summary, which only the detail page shows."""
+        return self.defer('summary')
+
+    def with_content(self):
+        """Load the full text up front (needed before using it from async code)."""
+        return self.prefetch_related('pages')
+
 
 class Document(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='documents')
     title = models.CharField(max_length=255)
     file = models.FileField(upload_to='documents/')
-    content = models.TextField(blank=True)
-    summary = models.TextField(blank=True)
+    summary = CompressedTextField(blank=True, default='')
     uploaded_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_processed = models.BooleanField(default=False)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # SHA-256 of the uploaded file
+
+    objects = DocumentQuerySet.as_manager()
 
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [models.Index(fields=['user', '-uploaded_at'])]
 
     def __str__(self):
         return self.title
 
+    @cached_property
+    def content(self):
+        """
+        The whole extracted text, joined from its pages on first access. Use
+        ``read_pages`` or ``read_text`` where part of a long document will do.
+        """
+        return "".join(page.text for page in self.pages.all())
+
+    def set_content(self, text, page_offsets=None):
+        """
+        Store the extracted text, split into pages at ``page_offsets`` (the
+        start offset of each page); without offsets it's stored as one page.
+        """
+        starts = list(page_offsets or [0])
+        starts[0] = 0
+        ends = starts[1:] + [len(text)]
+        pages = [
+            DocumentPage(document=self, number=number, start_offset=start, end_offset=max(start, end),
+                         text=text[start:end])
+            for number, (start, end) in enumerate(zip(starts, ends), start=1)
+        ]
+        with transaction.atomic():
+            DocumentPage.objects.filter(document=self).delete()
+            DocumentPage.objects.bulk_create(pages, batch_size=200)
+        self.content = text
+        getattr(self, '_prefetched_objects_cache', {}).pop('pages', None)
+        content_changed.send(sender=Document, document=self, text=text)
+
+    @property
+    def page_count(self):
+        return self.pages.count()
+
+    @property
+    def page_offsets(self):
+        """Start offset of each page in ``content``."""
+        return list(self.pages.values_list('start_offset', flat=True))
+
+    def read_pages(self, first, last=None):
+        """Pages ``first`` to ``last`` (numbered from 1, inclusive), loading only those."""
+        last = first if last is None else last
+        return list(self.pages.filter(number__gte=first, number__lte=last))
+
+    def read_text(self, start, end):
+        """Characters ``start`` to ``end`` of the content, read from only the pages they fall on."""
+        if 'content' in self.__dict__:
+            return self.content[start:end]
+        pages = list(self.pages.filter(start_offset__lt=end, end_offset__gt=start))
+        if not pages:
+            return ""
+        base = pages[0].start_offset
+        return "".join(page.text for page in pages)[max(start - base, 0):end - base]
+
+
+class DocumentPage(models.Model):
+    """
+    Extracted text of one page of a document. Kept out of the Document table
+    so that listing documents never reads megabytes of text, and split by page
+    so that part of a long document can be read without the rest.
+    """
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='pages')
+    number = models.PositiveIntegerField()  # From 1
+    start_offset = models.PositiveIntegerField()  # Character offsets into Document.content
+    end_offset = models.PositiveIntegerField()
+    text = CompressedTextField(blank=True, default='')
+
+    class Meta:
+        # Pages are read per document; ordering by document would join its table for its own ordering
+        ordering = ['number']
+        unique_together = [('document', 'number')]
+
+    def __str__(self):
+        return f"Page {self.number} of {self.document_id}"
+
+
+class DocumentChunk(models.Model):
+    """A passage of a document's text, the unit retrieved for Q&A."""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    start_offset = models.PositiveIntegerField()  # Character offsets into Document.content
+    end_offset = models.PositiveIntegerField()
+    page = models.PositiveIntegerField(default=1)  # Number of the page the chunk starts on
+    text = CompressedTextField()
+    length = models.PositiveIntegerField()  # Number of index terms
+
+    class Meta:
+        ordering = ['document', 'index']
+        unique_together = [('document', 'index')]
+
+    def __str__(self):
+        return f"Chunk {self.index} of {self.document_id}"
+
+
+class DocumentIndex(models.Model):
+    """BM25 inverted index over a document's chunks."""
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='search_index')
+    chunk_count = models.PositiveIntegerField(default=0)
+    avg_chunk_length = models.FloatField(default=0)
+    chunk_lengths = models.JSONField(default=list)  # Number of index terms in each chunk
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Index for {self.document_id} ({self.chunk_count} chunks)"
+
+
+class DocumentTerm(models.Model):
+    """Postings of one term in a document's index, so a query reads only its own terms."""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='index_terms')
+    term = models.CharField(max_length=64)
+    postings = models.JSONField(default=list)  # [[chunk index, term frequency], ...]
+
+    class Meta:
+        unique_together = [('document', 'term')]
+
+    def __str__(self):
+        return f"{self.term!r} in {self.document_id}"
+
+
+class SectionSummary(models.Model):
+    """Summary of one section of a long document, kept so summarization can resume."""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='section_summaries')
+    index = models.PositiveIntegerField()
+    section_hash = models.CharField(max_length=64)  # SHA-256 of the section text it summarizes
+    summary = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['document', 'index']
+        unique_together = [('document', 'index')]
+
+    def __str__(self):
+        return f"Section {self.index} summary of {self.document_id}"
+
+
+class ExtractionCache(models.Model):
+    """Extraction and summary results shared by every upload of the same file."""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    file = models.FileField(upload_to='documents/')  # The single stored copy of this file
+    content = CompressedTextField(blank=True, default='')
+    page_offsets = models.JSONField(default=list, blank=True)  # Start offset of each page in content
+    summary = models.TextField(blank=True)
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.file.name})"
+
+
+class ChunkedUpload(models.Model):
+    """A resumable upload in progress; its bytes so far are in a partial file (see core/uploads.py)."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads')
+    title = models.CharField(max_length=255)
+    file_name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()  # Declared total size in bytes
+    received = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.file_name} ({self.received}/{self.size} bytes)"
+
+    @property
+    def is_complete(self):
+        return self.received >= self.size
+
+
+class InFlightCall(models.Model):
+    """An AI call one process is making on behalf of identical calls elsewhere (see core/singleflight.py)."""
+    key = models.CharField(max_length=64, primary_key=True)  # Hash of model, function and prompt
+    namespace = models.CharField(max_length=50)
+    result = models.TextField(blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.namespace} {self.key[:12]}"
+
+
+class CompressionDictionary(models.Model):
+    """Shared dictionary for compressed text columns; rows keep the id of the one they used."""
+    codec = models.CharField(max_length=10)
+    data = models.BinaryField()
+    sample_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name_plural = 'Compression dictionaries'
+
+    def __str__(self):
+        return f"{self.codec} dictionary {self.id} ({len(self.data)} bytes)"
+
 
 class QASession(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='qa_sessions')
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='qa_sessions')
     question = models.TextField()
-    answer = models.TextField()
+    answer = CompressedTextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['document', 'user', '-created_at']),
+        ]
 
     def __str__(self):
         return f"Q&A for {self.document.title}"
 
 
+class SearchEntry(models.Model):
+    """One indexed item of a user's full-text search (see ``core.search``); its id is the FTS5 rowid."""
+    KIND_DOCUMENT = 'document'
+    KIND_SUMMARY = 'summary'
+    KIND_QA = 'qa'
+    KIND_CHOICES = [
+        (KIND_DOCUMENT, 'Document text'),
+        (KIND_SUMMARY, 'Summary'),
+        (KIND_QA, 'Q&A'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.UUIDField()  # The Document or QASession it was built from
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='+')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [('kind', 'object_id')]
+        verbose_name_plural = 'Search entries'
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.object_id}"
+
+
+class BankQuestion(models.Model):
+    """A generated quiz question in a document's question bank; tests are sampled from the bank."""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='question_bank')
+    question = models.TextField()
+    options = models.JSONField()  # {"A": ..., "B": ..., "C": ..., "D": ...}
+    correct_answer = models.CharField(max_length=1)
+    source_chunk = models.PositiveIntegerField(null=True, blank=True)  # First chunk of the passage it came from
+    question_hash = models.CharField(max_length=64)
+    times_served = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['document', 'times_served']
+        unique_together = [('document', 'question_hash')]
+        indexes = [models.Index(fields=['document', 'times_served'])]
+
+    def __str__(self):
+        return self.question[:80]
+
+    def as_test_question(self):
+        """The question in the format stored in ``Test.questions``."""
+        return {'question': self.question, 'options': self.options, 'correct_answer': self.correct_answer}
+
+
 class Test(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tests')
@@ -46,6 +321,7 @@ class Test(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['document', 'user', '-created_at'])]
 
     def __str__(self):
         return self.title
@@ -62,10 +338,125 @@ class TestAttempt(models.Model):
 
     class Meta:
         ordering = ['-completed_at']
+        indexes = [
+            # Keyset pagination orders by (completed_at, pk)
+            models.Index(fields=['user', '-completed_at', '-id']),
+            models.Index(fields=['test', '-completed_at']),
+        ]
 
     def __str__(self):
         return f"Attempt for {self.test.title} - Score: {self.score}/{self.total_questions}"
 
     @property
     def percentage(self):
-        return round((self.score / self.total_questions) * 100, 2) if self.total_questions > 0 else 0
\ No newline at end of file
+        return round((self.score / self.total_questions) * 100, 2) if self.total_questions > 0 else 0
+
+
+class UserStats(models.Model):
+    """Running totals for a user's dashboard and progress pages, maintained by ``core.stats``."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='study_stats')
+    document_count = models.PositiveIntegerField(default=0)
+    attempt_count = models.PositiveIntegerField(default=0)
+    qa_count = models.PositiveIntegerField(default=0)
+    percentage_total = models.FloatField(default=0)  # Sum of attempt percentages, for the average
+    best_percentage = models.FloatField(default=0)
+    recent_percentages = models.JSONField(default=list)  # Latest attempts first
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+    is_stale = models.BooleanField(default=False)  # Set on deletes; recomputed on next read
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'User stats'
+
+    def __str__(self):
+        return f"Stats for {self.user}"
+
+    @property
+    def average_percentage(self):
+        return round(self.percentage_total / self.attempt_count, 1) if self.attempt_count else 0
+
+
+class DocumentStats(models.Model):
+    """Running totals for one document, maintained by ``core.stats``."""
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    test_count = models.PositiveIntegerField(default=0)
+    attempt_count = models.PositiveIntegerField(default=0)
+    qa_count = models.PositiveIntegerField(default=0)
+    percentage_total = models.FloatField(default=0)
+    best_percentage = models.FloatField(default=0)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Document stats'
+
+    def __str__(self):
+        return f"Stats for {self.document}"
+
+    @property
+    def average_percentage(self):
+        return round(self.percentage_total / self.attempt_count, 1) if self.attempt_count else 0
+
+
+class ProcessingJob(models.Model):
+    KIND_PROCESS = 'process'
+    KIND_QUESTION_BANK = 'question_bank'
+    KIND_CHOICES = [
+        (KIND_PROCESS, 'Document processing'),
+        (KIND_QUESTION_BANK, 'Question bank'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    STAGE_QUEUED = 'queued'
+    STAGE_EXTRACTING = 'extracting'
+    STAGE_INDEXING = 'indexing'
+    STAGE_SUMMARIZING = 'summarizing'
+    STAGE_GENERATING_QUESTIONS = 'generating_questions'
+    STAGE_DONE = 'done'
+    STAGE_CHOICES = [
+        (STAGE_QUEUED, 'Queued'),
+        (STAGE_EXTRACTING, 'Extracting text'),
+        (STAGE_INDEXING, 'Indexing for Q&A'),
+        (STAGE_SUMMARIZING, 'Generating summary'),
+        (STAGE_GENERATING_QUESTIONS, 'Generating questions'),
+        (STAGE_DONE, 'Done'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='processing_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=KIND_PROCESS, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES, default=STAGE_QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)  # 0-100
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(null=True, blank=True)  # retry backoff after a transient failure
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['document', 'kind', '-created_at'])]
+
+    def __str__(self):
+        return f"Processing job for {self.document_id} ({self.status})"
+
+    @property
+    def is_active(self):
+        return self.status in (self.STATUS_PENDING, self.STATUS_RUNNING)
+
+    @property
+    def is_waiting_to_retry(self):
+        return self.status == self.STATUS_PENDING and self.run_after is not None
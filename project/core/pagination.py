@@ -0,0 +1,52 @@
+"""
+Keyset ("seek") pagination.
+
+Pages are selected with ``WHERE (timestamp, id) < (cursor)`` instead of
+``OFFSET``, so every page costs the same however deep the user scrolls,
+and rows inserted meanwhile don't shift the pages. Cursors carry the UUID
+primary key of the last row shown.
+"""
+import uuid
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+def encode_cursor(timestamp, pk):
+    return urlsafe_base64_encode(f"{timestamp.isoformat()}|{pk}".encode('utf-8'))
+
+
+def decode_cursor(cursor):
+    """Return ``(timestamp, pk)`` from a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        timestamp, pk = force_str(urlsafe_base64_decode(cursor)).split('|', 1)
+        # Cursors come from the query string; anything that doesn't parse is ignored
+        timestamp = parse_datetime(timestamp)
+        pk = uuid.UUID(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return (timestamp, pk) if timestamp else None
+
+
+def keyset_page(queryset, field, cursor=None, per_page=20):
+    """
+    Return ``(rows, next_cursor)`` for the page of ``queryset`` after ``cursor``,
+    newest first by ``field`` (ties broken by primary key). ``next_cursor`` is
+    None on the last page.
+    """
+    queryset = queryset.order_by(f'-{field}', '-pk')
+    position = decode_cursor(cursor)
+    if position:
+        timestamp, pk = position
+        queryset = queryset.filter(Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'pk__lt': pk}))
+
+    rows = list(queryset[:per_page + 1])
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, field), last.pk)
@@ -0,0 +1,120 @@
+"""
+Backends that generate text for ``core.utils``.
+
+``AI_PROVIDER`` names the backend:
+
+- ``gemini``: Google's Gemini API (``GEMINI_API_KEY``, ``GEMINI_MODEL``);
+- ``stub``: the server started by ``manage.py stub_model_server``
+  (``AI_STUB_SERVER_URL``), for benchmarks;
+- ``http``: a local model server with an OpenAI-compatible API, such as
+  llama.cpp, vLLM or Ollama (``AI_HTTP_SERVER``).
+
+Left empty, it's ``stub`` when AI_STUB_SERVER_URL is set and ``gemini``
+otherwise. A dotted path to a provider class also works.
+
+A provider's ``create_model()`` returns a model with Gemini's interface as
+far as ``core.utils`` uses it: ``generate_content(prompt, stream=False)``
+and ``generate_content_async(...)``, returning a response with ``.text`` or,
+when streaming, an iterator of them. Client libraries are imported there, on
+first use, so management commands that never call the model don't load them.
+"""
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GEMINI_MODEL = 'gemini-2.5-flash'
+
+HTTP_DEFAULTS = {
+    'URL': 'http://127.0.0.1:8080/v1',
+    'MODEL': '',
+    'API_KEY': '',
+    'TIMEOUT': 120,
+}
+
+_providers = {}
+
+
+def register_provider(provider_class):
+    """Class decorator making a provider selectable by its ``name`` in AI_PROVIDER."""
+    _providers[provider_class.name] = provider_class
+    return provider_class
+
+
+@register_provider
+class GeminiProvider:
+    """Google's Gemini API."""
+    name = 'gemini'
+
+    def model_name(self):
+        return getattr(settings, 'GEMINI_MODEL', '') or DEFAULT_GEMINI_MODEL
+
+    def create_model(self):
+        api_key = getattr(settings, 'GEMINI_API_KEY', None)
+        if not api_key or not api_key.strip():
+            logger.warning("GEMINI_API_KEY not found or empty in settings")
+            return None
+        # The SDK takes most of a second to import
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        return genai.GenerativeModel(self.model_name())
+
+
+@register_provider
+class StubProvider:
+    """The local stub model server, for benchmarking without the real API."""
+    name = 'stub'
+
+    def model_name(self):
+        return 'stub'
+
+    def create_model(self):
+        url = getattr(settings, 'AI_STUB_SERVER_URL', '')
+        if not url:
+            logger.warning("AI_STUB_SERVER_URL not set in settings")
+            return None
+        from .stub_model import StubModel
+
+        return StubModel(url)
+
+
+@register_provider
+class HTTPProvider:
+    """A local model server with an OpenAI-compatible chat completions API."""
+    name = 'http'
+
+    def options(self):
+        return {**HTTP_DEFAULTS, **getattr(settings, 'AI_HTTP_SERVER', {})}
+
+    def model_name(self):
+        return f"http:{self.options()['MODEL'] or 'default'}"
+
+    def create_model(self):
+        options = self.options()
+        from .http_model import HTTPModel
+
+        return HTTPModel(options['URL'], model=options['MODEL'], api_key=options['API_KEY'], timeout=options['TIMEOUT'])
+
+
+def get_provider_name():
+    name = getattr(settings, 'AI_PROVIDER', '')
+    if name:
+        return name
+    return 'stub' if getattr(settings, 'AI_STUB_SERVER_URL', '') else 'gemini'
+
+
+def get_provider():
+    """Return the provider selected in settings."""
+    name = get_provider_name()
+    if '.' in name:
+        return import_string(name)()
+    try:
+        return _providers[name]()
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Unknown AI_PROVIDER {name!r}; expected one of {', '.join(sorted(_providers))} or a dotted path."
+        )
@@ -0,0 +1,144 @@
+"""
+Per-document question bank.
+
+Instead of asking the model for a fresh quiz on every request, a pool of
+questions is generated in the background from passages spread across the
+whole document, and tests are assembled by sampling from it. The least-served
+questions are drawn first, and the bank is topped up in the background when
+the supply of unseen questions runs low.
+"""
+import hashlib
+import logging
+import math
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import BankQuestion, DocumentChunk
+from .retrieval import get_document_index
+from .summarization import get_section_chars
+from .utils import generate_bank_questions
+
+logger = logging.getLogger(__name__)
+
+# Existing questions shown to the model so a refill doesn't repeat them
+MAX_AVOID_QUESTIONS = 30
+
+
+def get_bank_size():
+    return getattr(settings, 'QUESTION_BANK_SIZE', 50)
+
+
+def question_hash(text):
+    """Hash of a question's normalized text, used to drop duplicates."""
+    normalized = re.sub(r"\s+", " ", text).strip().lower()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def unseen_count(document):
+    return BankQuestion.objects.filter(document=document, times_served=0).count()
+
+
+def needs_refill(document):
+    """True if the bank is running out of questions that haven't been served yet."""
+    return unseen_count(document) < getattr(settings, 'QUESTION_BANK_REFILL_BELOW', 15)
+
+
+def document_passages(document):
+    """
+    Split the document into prompt-sized passages of consecutive chunks.
+
+    Returns ``(first_chunk_index, text)`` pairs covering the whole document.
+    """
+    get_document_index(document)
+    budget = get_section_chars()
+    passages = []
+    first, parts, size = None, [], 0
+    for chunk in DocumentChunk.objects.filter(document=document).only('index', 'text'):
+        if parts and size + len(chunk.text) > budget:
+            passages.append((first, "\n\n".join(parts)))
+            first, parts, size = None, [], 0
+        if first is None:
+            first = chunk.index
+        parts.append(chunk.text.strip())
+        size += len(chunk.text)
+    if parts:
+        passages.append((first, "\n\n".join(parts)))
+    return passages
+
+
+def fill_question_bank(document, progress=None):
+    """
+    Generate questions until the bank holds ``QUESTION_BANK_SIZE`` unseen ones.
+
+    Each model call asks for a batch of questions about one passage; passages
+    are picked evenly across the document, starting further along on each
+    refill so the whole document gets covered over time. Returns the number
+    of questions added. ``progress`` is called with the fraction done.
+    """
+    before = unseen_count(document)
+    needed = get_bank_size() - before
+    if needed <= 0:
+        return 0
+
+    passages = document_passages(document)
+    if not passages:
+        return 0
+
+    per_batch = getattr(settings, 'QUESTION_BANK_BATCH_QUESTIONS', 10)
+    batches = math.ceil(needed / per_batch)
+    offset = BankQuestion.objects.filter(document=document).count() // per_batch
+    step = max(1, len(passages) // batches)
+
+    added = 0
+    for batch in range(batches):
+        if added >= needed:
+            break
+        first_chunk, passage = passages[(offset + batch * step) % len(passages)]
+        avoid = list(
+            BankQuestion.objects.filter(document=document)
+            .order_by('-created_at')
+            .values_list('question', flat=True)[:MAX_AVOID_QUESTIONS]
+        )
+        questions = generate_bank_questions(passage, min(per_batch, needed - added), avoid=avoid)
+
+        seen = set()
+        rows = []
+        for q in questions:
+            digest = question_hash(q['question'])
+            if digest in seen:
+                continue
+            seen.add(digest)
+            rows.append(BankQuestion(
+                document=document,
+                question=q['question'],
+                options=q['options'],
+                correct_answer=q['correct_answer'],
+                source_chunk=first_chunk,
+                question_hash=digest,
+            ))
+        # Questions already in the bank are skipped by the unique constraint
+        BankQuestion.objects.bulk_create(rows, ignore_conflicts=True)
+        added = unseen_count(document) - before
+        if progress:
+            progress((batch + 1) / batches)
+
+    logger.info(f"Question bank for document {document.id}: added {added} question(s)")
+    return added
+
+
+def draw_test_questions(document, count):
+    """
+    Take ``count`` questions from the bank for a new test, least-served first
+    and random within that. Returns None if the bank doesn't have enough.
+    """
+    with transaction.atomic():
+        picked = list(
+            BankQuestion.objects.filter(document=document).order_by('times_served', '?')[:count]
+        )
+        if len(picked) < count:
+            return None
+        BankQuestion.objects.filter(id__in=[q.id for q in picked]).update(times_served=F('times_served') + 1)
+    return [q.as_test_question() for q in picked]
@@ -0,0 +1,407 @@
+"""
+Rate limiting, concurrency control and retries for calls to the AI service.
+
+Every model call made through ``core.utils`` passes through one process-wide
+``AIGate``: a token bucket that paces requests to the quota, a concurrency cap
+that is shared fairly between users, and jittered exponential backoff on
+retryable errors (quota, overload, timeouts). The gate records how long calls
+waited for a slot so the limits can be tuned.
+"""
+import asyncio
+import contextvars
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+from .metrics import ai_queue_wait_seconds, record_ai_retry
+
+logger = logging.getLogger(__name__)
+
+# The user on whose behalf AI calls are made, for per-user fairness
+current_ai_user = contextvars.ContextVar('current_ai_user', default=None)
+
+DEFAULTS = {
+    'REQUESTS_PER_MINUTE': 60,
+    'BURST': 10,
+    'MAX_CONCURRENT': 8,
+    'MAX_CONCURRENT_PER_USER': 3,
+    'MAX_RETRIES': 4,
+    'BACKOFF_BASE': 1.0,
+    'BACKOFF_MAX': 30.0,
+}
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_MESSAGES = ('quota', 'rate limit', 'resource exhausted', 'overloaded', 'unavailable', 'deadline', 'timeout')
+
+
+def get_rate_limit_settings():
+    return {**DEFAULTS, **getattr(settings, 'AI_RATE_LIMIT', {})}
+
+
+@contextmanager
+def ai_user_context(user_id):
+    """Attribute AI calls made inside the block to a user."""
+    token = current_ai_user.set(user_id)
+    try:
+        yield
+    finally:
+        current_ai_user.reset(token)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: ``rate`` tokens are added per second up to
+    ``capacity``, and each call consumes one.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take a token if one is available; otherwise return the seconds until one will be."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is available, then take it. Returns the time waited."""
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return time.monotonic() - started
+            time.sleep(wait)
+
+    async def aacquire(self):
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return time.monotonic() - started
+            await asyncio.sleep(wait)
+
+
+class FairConcurrencyLimiter:
+    """
+    Cap on concurrent calls, granted fairly between users.
+
+    When a slot frees up it goes to the waiting caller whose user has the
+    fewest calls in flight, then to the user served least recently, so users
+    take turns instead of queueing behind one user's backlog. No user may
+    hold more than ``max_per_user`` slots.
+
+    Slots are handed over by whoever frees them: the waiter is started under
+    the lock and then woken, by the condition for threads and through its
+    event loop for coroutines, so neither polls.
+    """
+
+    def __init__(self, max_concurrent, max_per_user):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._per_user = Counter()
+        self._waiting = {}  # ticket -> user
+        self._async_waiters = {}  # ticket -> (event loop, future to resolve when started)
+        self._started = set()  # Tickets of threads started but not yet woken
+        self._tickets = itertools.count()
+        self._last_served = {}  # user -> turn number of their latest start
+        self._turns = itertools.count()
+
+    def _enqueue(self, user, waiter=None):
+        """Queue a call and start whatever can start. Caller holds the lock."""
+        ticket = next(self._tickets)
+        self._waiting[ticket] = user
+        if waiter:
+            self._async_waiters[ticket] = waiter
+        self._grant()
+        return ticket
+
+    def _next_ticket(self):
+        if self._in_flight >= self.max_concurrent:
+            return None
+        eligible = [
+            (self._per_user[user], self._last_served.get(user, -1), ticket)
+            for ticket, user in self._waiting.items()
+            if self._per_user[user] < self.max_per_user
+        ]
+        return min(eligible)[2] if eligible else None
+
+    def _grant(self):
+        """Start waiting calls while slots allow, in turn, and wake them. Caller holds the lock."""
+        woke_threads = False
+        while (ticket := self._next_ticket()) is not None:
+            user = self._waiting.pop(ticket)
+            self._in_flight += 1
+            self._per_user[user] += 1
+            self._last_served[user] = next(self._turns)
+            waiter = self._async_waiters.pop(ticket, None)
+            if waiter is None:
+                self._started.add(ticket)
+                woke_threads = True
+                continue
+            loop, future = waiter
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # The waiter's event loop is closed, so nobody will use the slot
+                self._finish(user)
+        if woke_threads:
+            self._condition.notify_all()
+
+    def _finish(self, user):
+        self._in_flight -= 1
+        self._per_user[user] -= 1
+        if self._per_user[user] <= 0:
+            del self._per_user[user]
+
+    def acquire(self, user):
+        with self._condition:
+            ticket = self._enqueue(user)
+            self._condition.wait_for(lambda: ticket in self._started)
+            self._started.discard(ticket)
+
+    async def aacquire(self, user):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._condition:
+            ticket = self._enqueue(user, (loop, future))
+        try:
+            await future
+        except BaseException:
+            # Cancelled while waiting (e.g. client went away): give up our place,
+            # or the slot if it was granted in the meantime
+            with self._condition:
+                if self._waiting.pop(ticket, None) is not None:
+                    self._async_waiters.pop(ticket, None)
+                else:
+                    self._finish(user)
+                self._grant()
+            raise
+
+    def release(self, user):
+        with self._condition:
+            self._finish(user)
+            if len(self._last_served) > 1024:
+                # Forget idle users so the table stays bounded
+                active = set(self._waiting.values()) | set(self._per_user)
+                self._last_served = {u: turn for u, turn in self._last_served.items() if u in active}
+            self._grant()
+
+    def snapshot(self):
+        with self._condition:
+            return {'in_flight': self._in_flight, 'waiting': len(self._waiting)}
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AIGate:
+    """Token bucket plus fair concurrency cap, with queue wait metrics."""
+
+    def __init__(self, bucket, limiter):
+        self.bucket = bucket
+        self.limiter = limiter
+        self._stats_lock = threading.Lock()
+        self._calls = 0
+        self._retries = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _record_wait(self, waited):
+        with self._stats_lock:
+            self._calls += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        ai_queue_wait_seconds.observe(waited)
+        if waited > 5:
+            logger.warning(f"AI call waited {waited:.1f}s for a rate limit slot")
+
+    def record_retry(self):
+        with self._stats_lock:
+            self._retries += 1
+        record_ai_retry()
+
+    @contextmanager
+    def slot(self):
+        user = current_ai_user.get()
+        started = time.monotonic()
+        self.limiter.acquire(user)
+        try:
+            self.bucket.acquire()
+            self._record_wait(time.monotonic() - started)
+            yield
+        finally:
+            self.limiter.release(user)
+
+    @asynccontextmanager
+    async def aslot(self):
+        user = current_ai_user.get()
+        started = time.monotonic()
+        await self.limiter.aacquire(user)
+        try:
+            await self.bucket.aacquire()
+            self._record_wait(time.monotonic() - started)
+            yield
+        finally:
+            self.limiter.release(user)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = {
+                'calls': self._calls,
+                'retries': self._retries,
+                'wait_seconds_total': self._wait_total,
+                'wait_seconds_max': self._wait_max,
+                'wait_seconds_avg': self._wait_total / self._calls if self._calls else 0.0,
+            }
+        stats.update(self.limiter.snapshot())
+        return stats
+
+
+_gate = None
+_gate_lock = threading.Lock()
+
+
+def get_gate():
+    """Return the process-wide AI call gate."""
+    global _gate
+    with _gate_lock:
+        if _gate is None:
+            options = get_rate_limit_settings()
+            _gate = AIGate(
+                TokenBucket(rate=options['REQUESTS_PER_MINUTE'] / 60, capacity=options['BURST']),
+                FairConcurrencyLimiter(options['MAX_CONCURRENT'], options['MAX_CONCURRENT_PER_USER']),
+            )
+    return _gate
+
+
+def is_retryable(error):
+    """True for errors worth retrying: quota/rate limits, overload and timeouts."""
+    status = getattr(error, 'code', None)
+    response = getattr(error, 'response', None)
+    if response is not None:
+        status = getattr(response, 'status_code', status)
+    if isinstance(status, int) and status in RETRYABLE_STATUS_CODES:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in RETRYABLE_MESSAGES) or '429' in message
+
+
+def backoff_delay(attempt, base, cap):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RateLimitedModel:
+    """Wrap a model so every call goes through the gate and retryable errors are retried."""
+
+    def __init__(self, model, gate, max_retries, backoff_base, backoff_max):
+        self._model = model
+        self._gate = gate
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def _retry_delay(self, error, attempt):
+        """Seconds to wait before retrying, or None if the error should propagate."""
+        if attempt >= self._max_retries or not is_retryable(error):
+            return None
+        self._gate.record_retry()
+        delay = backoff_delay(attempt, self._backoff_base, self._backoff_max)
+        logger.warning(f"Retrying AI call in {delay:.1f}s after error: {str(error)}")
+        return delay
+
+    def generate_content(self, *args, **kwargs):
+        if kwargs.get('stream'):
+            return self._stream(args, kwargs)
+        for attempt in itertools.count():
+            try:
+                with self._gate.slot():
+                    return self._model.generate_content(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+    async def generate_content_async(self, *args, **kwargs):
+        if kwargs.get('stream'):
+            return self._astream(args, kwargs)
+        for attempt in itertools.count():
+            try:
+                async with self._gate.aslot():
+                    return await self._model.generate_content_async(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+    # A streamed call holds its slot until the stream is used up. Errors before
+    # the first chunk are retried like any other call; after it the caller has
+    # already passed text on, so they propagate.
+
+    def _stream(self, args, kwargs):
+        for attempt in itertools.count():
+            started = False
+            try:
+                with self._gate.slot():
+                    for chunk in self._model.generate_content(*args, **kwargs):
+                        started = True
+                        yield chunk
+                    return
+            except Exception as e:
+                delay = None if started else self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+    async def _astream(self, args, kwargs):
+        for attempt in itertools.count():
+            started = False
+            try:
+                async with self._gate.aslot():
+                    async for chunk in await self._model.generate_content_async(*args, **kwargs):
+                        started = True
+                        yield chunk
+                    return
+            except Exception as e:
+                delay = None if started else self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+
+def limit_model(model):
+    """Wrap a model handle with the shared gate and retry policy."""
+    if model is None:
+        return None
+    options = get_rate_limit_settings()
+    return RateLimitedModel(
+        model,
+        get_gate(),
+        max_retries=options['MAX_RETRIES'],
+        backoff_base=options['BACKOFF_BASE'],
+        backoff_max=options['BACKOFF_MAX'],
+    )
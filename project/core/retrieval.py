@@ -0,0 +1,172 @@
+"""
+Chunk index and BM25 retrieval over document text.
+
+At processing time a document's content is split into overlapping chunks and
+an inverted index (term -> postings, one row per term) is stored alongside
+it. Q&A then sends only the chunks most relevant to the question instead of
+the first few pages.
+"""
+import math
+import re
+from bisect import bisect_right
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import DocumentChunk, DocumentIndex, DocumentTerm
+from .utils import PROMPT_MAX_CHARS
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her
+here hers him his how i if in into is it its itself just me more most my no nor not now of off on once
+only or other our out over own same she should so some such than that the their them then there these
+they this those through to too under until up very was we were what when where which while who whom
+why will with would you your
+""".split())
+
+# Longer tokens are things like hashes and URLs run together; they aren't indexed
+MAX_TERM_LENGTH = 64
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords and single characters removed."""
+    return [
+        token for token in TOKEN_RE.findall(text.lower())
+        if 1 < len(token) <= MAX_TERM_LENGTH and token not in STOPWORDS
+    ]
+
+
+def chunk_text(text, chunk_size=None, overlap=None):
+    """
+    Split text into overlapping chunks of roughly ``chunk_size`` characters.
+
+    Chunks end at a paragraph, sentence or word boundary where possible.
+    Returns a list of ``(start_offset, end_offset)`` pairs.
+    """
+    chunk_size = chunk_size or getattr(settings, 'QA_CHUNK_SIZE', 1200)
+    overlap = overlap if overlap is not None else getattr(settings, 'QA_CHUNK_OVERLAP', 200)
+    length = len(text)
+    spans = []
+    start = 0
+
+    while start < length:
+        end = min(start + chunk_size, length)
+        if end < length:
+            window = text[start + chunk_size // 2:end]
+            for separator in ("\n\n", ". ", "\n", " "):
+                cut = window.rfind(separator)
+                if cut != -1:
+                    end = start + chunk_size // 2 + cut + len(separator)
+                    break
+        spans.append((start, end))
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+
+    return spans
+
+
+@transaction.atomic
+def build_document_index(document):
+    """(Re)build the chunk table and inverted index for a document."""
+    text = document.content or ""
+    DocumentChunk.objects.filter(document=document).delete()
+    DocumentTerm.objects.filter(document=document).delete()
+    # Start offset and number of each page with text, to tell which page a chunk starts on
+    pages = [(start, number) for number, start, end in
+             document.pages.values_list('number', 'start_offset', 'end_offset') if end > start]
+    page_starts = [start for start, _ in pages]
+
+    chunks = []
+    postings = {}
+    lengths = []
+    for index, (start, end) in enumerate(chunk_text(text)):
+        chunk_body = text[start:end]
+        terms = Counter(tokenize(chunk_body))
+        length = sum(terms.values())
+        lengths.append(length)
+        for term, frequency in terms.items():
+            postings.setdefault(term, []).append([index, frequency])
+        chunks.append(DocumentChunk(
+            document=document,
+            index=index,
+            start_offset=start,
+            end_offset=end,
+            page=pages[bisect_right(page_starts, start) - 1][1] if pages else 1,
+            text=chunk_body,
+            length=length,
+        ))
+
+    DocumentChunk.objects.bulk_create(chunks, batch_size=500)
+    DocumentTerm.objects.bulk_create(
+        [DocumentTerm(document=document, term=term, postings=term_postings) for term, term_postings in postings.items()],
+        batch_size=500,
+    )
+    search_index, _ = DocumentIndex.objects.update_or_create(
+        document=document,
+        defaults={
+            'chunk_count': len(chunks),
+            'avg_chunk_length': sum(lengths) / len(lengths) if lengths else 0,
+            'chunk_lengths': lengths,
+        },
+    )
+    return search_index
+
+
+def get_document_index(document):
+    """Return the document's index, building it on first use."""
+    try:
+        return document.search_index
+    except DocumentIndex.DoesNotExist:
+        return build_document_index(document)
+
+
+def score_chunks(search_index, query):
+    """BM25 score of each chunk (by index) that shares a term with the query."""
+    chunk_count = search_index.chunk_count
+    avg_length = search_index.avg_chunk_length or 1
+    lengths = search_index.chunk_lengths
+    scores = Counter()
+
+    terms = set(tokenize(query))
+    if not terms:
+        return scores
+    matches = DocumentTerm.objects.filter(document_id=search_index.document_id, term__in=terms)
+    for term_postings in matches.values_list('postings', flat=True):
+        idf = math.log((chunk_count - len(term_postings) + 0.5) / (len(term_postings) + 0.5) + 1)
+        for chunk_index, frequency in term_postings:
+            norm = K1 * (1 - B + B * lengths[chunk_index] / avg_length)
+            scores[chunk_index] += idf * frequency * (K1 + 1) / (frequency + norm)
+
+    return scores
+
+
+def retrieve_chunks(document, query, top_k=None):
+    """Return the ``top_k`` most relevant chunks for a query, in document order."""
+    top_k = top_k or getattr(settings, 'QA_RETRIEVAL_TOP_K', 6)
+    search_index = get_document_index(document)
+    scores = score_chunks(search_index, query)
+
+    if scores:
+        indexes = [chunk_index for chunk_index, _ in scores.most_common(top_k)]
+    else:
+        # Nothing matched; fall back to the start of the document.
+        indexes = list(range(min(top_k, search_index.chunk_count)))
+
+    return list(DocumentChunk.objects.filter(document=document, index__in=indexes).order_by('index'))
+
+
+def build_qa_context(document, question):
+    """Context for answering a question: the relevant excerpts of the document, labelled with their page."""
+    chunks = retrieve_chunks(document, question)
+    if not chunks:
+        return document.read_text(0, PROMPT_MAX_CHARS)
+    return "\n\n[...]\n\n".join(f"[Page {chunk.page}]\n{chunk.text.strip()}" for chunk in chunks)
@@ -0,0 +1,219 @@
+"""
+Full-text search over a user's documents, summaries and Q&A history.
+
+The text lives in an SQLite FTS5 table, one row per ``SearchEntry`` (the
+entry's id is the FTS rowid). The indexed columns are stored compressed in
+their own tables, so the index keeps its own copy of the text and is kept
+up to date from Python as rows are saved, rather than by SQL triggers.
+Deleting an entry (directly or by cascade from its document) removes its
+FTS row with a trigger. ``manage.py rebuild_search_index`` rebuilds
+everything from the source tables.
+
+Each row also carries an ``owner`` token, so that a user's search is an
+intersection of posting lists inside FTS5 instead of ranking every user's
+matches and filtering afterwards.
+"""
+import re
+import uuid
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Document, DocumentPage, QASession, SearchEntry, content_changed
+
+FTS_TABLE = 'core_search_fts'
+
+# The same statements are in migration 0011; a schema change needs a new migration
+SCHEMA_SQL = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"title, body, owner, tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3')",
+    f"CREATE TRIGGER core_searchentry_delete AFTER DELETE ON core_searchentry "
+    f"BEGIN DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END",
+]
+
+# bm25() column weights: a match in a title or question counts for more than one in the text
+TITLE_WEIGHT = 5.0
+BODY_WEIGHT = 1.0
+
+# Words of context on each side of the best match in a snippet
+SNIPPET_TOKENS = 24
+
+# Placeholders for the highlight markup, replaced once the snippet is escaped
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+SEARCH_SQL = (
+    f"SELECT e.id, e.kind, e.object_id, e.document_id, "
+    f"highlight({FTS_TABLE}, 0, '{_MARK_START}', '{_MARK_END}'), "
+    f"snippet({FTS_TABLE}, 1, '{_MARK_START}', '{_MARK_END}', '…', {SNIPPET_TOKENS}) "
+    f"FROM {FTS_TABLE} JOIN core_searchentry e ON e.id = {FTS_TABLE}.rowid "
+    f"WHERE {FTS_TABLE} MATCH %s "
+    f"ORDER BY bm25({FTS_TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}, 0) "
+    f"LIMIT %s OFFSET %s"
+)
+
+WORD_RE = re.compile(r'\w+')
+
+SearchResult = namedtuple('SearchResult', 'entry_id kind object_id document_id title snippet')
+
+
+def is_available():
+    """Whether the database has the FTS5 index (SQLite only)."""
+    return connection.vendor == 'sqlite'
+
+
+def owner_token(user_id):
+    return f"u{user_id}"
+
+
+def build_match_query(text, user_id=None):
+    """
+    FTS5 query matching every word of ``text`` (the last one as a prefix, for
+    search-as-you-type), or None if it has no words. Words are quoted, so
+    FTS5 operators typed by the user are searched for literally.
+    """
+    words = WORD_RE.findall(text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*']
+    query = ' AND '.join(terms)
+    if user_id is not None:
+        query = f'owner:"{owner_token(user_id)}" AND ({query})'
+    return query
+
+
+def _render_highlight(text):
+    """Escape FTS5 output and turn the match placeholders into <mark> tags."""
+    html = escape(text or '').replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+    return mark_safe(html)
+
+
+def search(user, text, page=1, per_page=20):
+    """
+    Return ``(results, has_next)`` for one page of the user's search results,
+    best match first. Titles and snippets are safe HTML with matches in <mark>.
+    """
+    match = build_match_query(text, user_id=user.id)
+    if match is None or not is_available():
+        return [], False
+
+    with connection.cursor() as cursor:
+        cursor.execute(SEARCH_SQL, [match, per_page + 1, (page - 1) * per_page])
+        rows = cursor.fetchall()
+
+    results = [
+        SearchResult(
+            entry_id, kind, uuid.UUID(object_id), uuid.UUID(document_id),
+            _render_highlight(title), _render_highlight(snippet),
+        )
+        for entry_id, kind, object_id, document_id, title, snippet in rows[:per_page]
+    ]
+    return results, len(rows) > per_page
+
+
+def matching_object_ids(text, kinds, limit=500):
+    """Ids of the best-matching objects of the given kinds, across all users (for the admin)."""
+    match = build_match_query(text)
+    if match is None or not is_available():
+        return []
+    sql = (
+        f"SELECT e.object_id FROM {FTS_TABLE} JOIN core_searchentry e ON e.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s AND e.kind IN ({', '.join(['%s'] * len(kinds))}) "
+        f"ORDER BY bm25({FTS_TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}, 0) LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, *kinds, limit])
+        return [uuid.UUID(row[0]) for row in cursor.fetchall()]
+
+
+def _index(kind, object_id, user_id, document_id, title, body):
+    """Insert or replace the search row for one object; empty text removes it."""
+    if not body.strip():
+        SearchEntry.objects.filter(kind=kind, object_id=object_id).delete()
+        return
+    with transaction.atomic():
+        entry, _ = SearchEntry.objects.update_or_create(
+            kind=kind, object_id=object_id, defaults={'user_id': user_id, 'document_id': document_id},
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [entry.id])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, body, owner) VALUES (%s, %s, %s, %s)",
+                [entry.id, title, body, owner_token(user_id)],
+            )
+
+
+def index_document_text(document, text):
+    _index(SearchEntry.KIND_DOCUMENT, document.id, document.user_id, document.id, document.title, text)
+
+
+def index_document_summary(document):
+    _index(SearchEntry.KIND_SUMMARY, document.id, document.user_id, document.id, document.title, document.summary)
+
+
+def index_qa_session(qa):
+    _index(SearchEntry.KIND_QA, qa.id, qa.user_id, qa.document_id, qa.question, qa.answer)
+
+
+def _retitle_document(document):
+    """Update the title column of a document's text and summary rows."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {FTS_TABLE} SET title = %s WHERE rowid IN "
+            f"(SELECT id FROM core_searchentry WHERE object_id = %s AND kind IN (%s, %s))",
+            [document.title, document.id.hex, SearchEntry.KIND_DOCUMENT, SearchEntry.KIND_SUMMARY],
+        )
+
+
+def rebuild_index(batch_size=200):
+    """Drop and rebuild the whole index from the source tables; returns the number of entries."""
+    SearchEntry.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    has_pages = Exists(DocumentPage.objects.filter(document=OuterRef('pk')))
+    for document in Document.objects.listing().filter(has_pages).iterator(chunk_size=batch_size):
+        index_document_text(document, document.content)
+    for document in Document.objects.exclude(summary='').iterator(chunk_size=batch_size):
+        index_document_summary(document)
+    for qa in QASession.objects.iterator(chunk_size=batch_size):
+        index_qa_session(qa)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return SearchEntry.objects.count()
+
+
+@receiver(content_changed, sender=Document, dispatch_uid='core.search.content_changed')
+def document_content_changed(sender, document, text, **kwargs):
+    if is_available():
+        index_document_text(document, text)
+
+
+@receiver(post_save, sender=Document, dispatch_uid='core.search.document_saved')
+def document_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not is_available():
+        return
+    if update_fields is None or 'title' in update_fields:
+        _retitle_document(instance)
+    # A save from a listing() queryset hasn't loaded (or changed) the summary
+    if (update_fields is None and 'summary' not in instance.get_deferred_fields()) or \
+            (update_fields is not None and 'summary' in update_fields):
+        index_document_summary(instance)
+
+
+@receiver(post_save, sender=QASession, dispatch_uid='core.search.qa_session_saved')
+def qa_session_saved(sender, instance, raw=False, **kwargs):
+    if raw or not is_available():
+        return
+    index_qa_session(instance)
+
+
+@receiver(post_delete, sender=QASession, dispatch_uid='core.search.qa_session_deleted')
+def qa_session_deleted(sender, instance, **kwargs):
+    SearchEntry.objects.filter(kind=SearchEntry.KIND_QA, object_id=instance.id).delete()
@@ -0,0 +1,378 @@
+"""
+Single-flight coalescing of identical AI calls.
+
+A double-clicked "Generate Test", a re-submitted question, or several students
+asking the same thing about a shared document all make the same model call at
+the same time. Only one of them (the leader) calls the model; the rest wait for
+its response instead of spending a round trip of their own.
+
+Calls are identified by the model, the calling function and the exact prompt
+(which embeds the document text and the user's input). Within a process,
+waiting calls share the leader's in-flight future. Across worker processes,
+the leader claims an ``InFlightCall`` row; identical calls elsewhere poll it
+and pick up the response text once it's there. A finished row only answers
+calls that were already waiting when it finished: this is not a cache, and
+an identical call made afterwards takes the row over and calls the model,
+so functions the response cache (``core.ai_cache``) skips still get fresh
+responses. Finished rows nobody took over are deleted after
+``RESULT_GRACE`` seconds.
+
+Waiters give up after ``WAIT_TIMEOUT`` seconds and make the call themselves,
+as they do if the leader is cancelled, so a stuck or abandoned call never
+blocks the identical calls behind it.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import InFlightCall
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CROSS_PROCESS': True,
+    'WAIT_TIMEOUT': 120,
+    'RESULT_GRACE': 15,
+    'POLL_INTERVAL': 0.1,
+}
+
+
+def get_single_flight_settings():
+    return {**DEFAULTS, **getattr(settings, 'AI_SINGLE_FLIGHT', {})}
+
+
+# Result handed to waiters when the leader was cancelled before it had a response
+ABANDONED = object()
+
+
+class SharedResponse:
+    """Stand-in for a model response made by an identical call in another process."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+def _response_text(response):
+    try:
+        return response.text if response else None
+    except ValueError:
+        # Blocked responses raise on .text; those aren't handed to other processes
+        return None
+
+
+class SingleFlight:
+    """Registry of AI calls in flight in this process, with counters of calls made and shared."""
+
+    def __init__(self, cross_process, wait_timeout, result_grace, poll_interval):
+        self.cross_process = cross_process
+        self.wait_timeout = wait_timeout
+        self.result_grace = result_grace
+        self.poll_interval = poll_interval
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._swept_at = 0.0  # monotonic time old rows were last deleted
+        self._stats = defaultdict(lambda: {'calls': 0, 'coalesced': 0, 'coalesced_across_processes': 0})
+
+    def record(self, namespace, counter):
+        with self._lock:
+            self._stats[namespace][counter] += 1
+
+    def join(self, key):
+        """Return ``(future, is_leader)``; the leader must call ``finish`` when done."""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                return future, False
+            future = self._futures[key] = Future()
+            # Running futures can't be cancelled, so a waiter giving up can't cancel it for the others
+            future.set_running_or_notify_cancel()
+            return future, True
+
+    def finish(self, key, future, response=None, error=None):
+        """Hand the leader's response or error (or ``ABANDONED``) to the waiters and forget the call."""
+        with self._lock:
+            self._futures.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(response)
+
+    def claim(self, key, namespace, since):
+        """
+        Claim the call for this process, which has been waiting for it since
+        ``since``. Returns ``(True, None)`` if claimed, or ``(False, text)``
+        if another process has it: ``text`` is its response once finished,
+        else None.
+        """
+        self._sweep()
+        if self._insert(key, namespace):
+            return True, None
+        # Taken: retry once if the row is only a stale one (finished before we
+        # asked, so not an answer to this call, or abandoned)
+        stale = InFlightCall.objects.filter(
+            Q(finished_at__lt=since)
+            | Q(finished_at__isnull=True, started_at__lt=timezone.now() - timedelta(seconds=self.wait_timeout)),
+            key=key,
+        ).delete()[0]
+        if stale and self._insert(key, namespace):
+            return True, None
+        return False, self.peek(key, since)[1]
+
+    def _insert(self, key, namespace):
+        """Insert the claim row; False if the key is already claimed."""
+        try:
+            with transaction.atomic():
+                InFlightCall.objects.create(key=key, namespace=namespace)
+        except IntegrityError:
+            return False
+        return True
+
+    def _sweep(self):
+        """Delete finished and abandoned rows of any key, at most once per ``RESULT_GRACE`` per process."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept_at < self.result_grace:
+                return
+            self._swept_at = now
+        cutoff = timezone.now() - timedelta(seconds=self.result_grace)
+        InFlightCall.objects.filter(
+            Q(finished_at__lt=cutoff) | Q(started_at__lt=cutoff - timedelta(seconds=self.wait_timeout)),
+        ).delete()
+
+    def peek(self, key, since):
+        """
+        ``(claimed, text)`` for ``key``: whether a process has claimed it, and
+        its response if it finished after ``since``. A row that finished
+        earlier doesn't count as a claim, so the caller takes it over.
+        """
+        row = InFlightCall.objects.filter(key=key).values_list('finished_at', 'result').first()
+        if row is None:
+            return False, None
+        finished_at, result = row
+        if finished_at is None:
+            return True, None
+        if finished_at < since:
+            return False, None
+        return True, result
+
+    def release(self, key, text):
+        """Hand the response text to waiting processes, or drop the claim if there's nothing to share."""
+        if text:
+            InFlightCall.objects.filter(key=key).update(result=text, finished_at=timezone.now())
+        else:
+            InFlightCall.objects.filter(key=key).delete()
+
+    def lead(self, key, namespace, call):
+        """Make the call, unless another process is already making it; then wait for its response."""
+        if self.cross_process:
+            deadline = time.monotonic() + self.wait_timeout
+            since = timezone.now()
+            claimed, text = self.claim(key, namespace, since)
+            while not claimed:
+                if text is not None:
+                    self.record(namespace, 'coalesced_across_processes')
+                    return SharedResponse(text)
+                if time.monotonic() > deadline:
+                    # Don't wait forever on a stuck process; make the call unclaimed
+                    return self._call(namespace, call)
+                time.sleep(self.poll_interval)
+                # Poll with reads; claim again only if the other process gave up
+                other_claim, text = self.peek(key, since)
+                if not other_claim:
+                    claimed, text = self.claim(key, namespace, since)
+
+        try:
+            response = self._call(namespace, call)
+        except BaseException:
+            if self.cross_process:
+                self.release(key, None)
+            raise
+        if self.cross_process:
+            self.release(key, _response_text(response))
+        return response
+
+    async def alead(self, key, namespace, call):
+        """Async counterpart of ``lead``; ``call`` returns an awaitable."""
+        if self.cross_process:
+            deadline = time.monotonic() + self.wait_timeout
+            since = timezone.now()
+            claimed, text = await sync_to_async(self.claim)(key, namespace, since)
+            while not claimed:
+                if text is not None:
+                    self.record(namespace, 'coalesced_across_processes')
+                    return SharedResponse(text)
+                if time.monotonic() > deadline:
+                    return await self._acall(namespace, call)
+                await asyncio.sleep(self.poll_interval)
+                other_claim, text = await sync_to_async(self.peek)(key, since)
+                if not other_claim:
+                    claimed, text = await sync_to_async(self.claim)(key, namespace, since)
+
+        try:
+            response = await self._acall(namespace, call)
+        except BaseException:
+            # Including cancellation: other processes shouldn't wait out a claim nobody holds
+            if self.cross_process:
+                await sync_to_async(self.release)(key, None)
+            raise
+        if self.cross_process:
+            await sync_to_async(self.release)(key, _response_text(response))
+        return response
+
+    def _call(self, namespace, call):
+        self.record(namespace, 'calls')
+        return call()
+
+    async def _acall(self, namespace, call):
+        self.record(namespace, 'calls')
+        return await call()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._futures),
+                'functions': {name: dict(counts) for name, counts in self._stats.items()},
+            }
+
+
+class CoalescingModel:
+    """
+    Wrap a generative model so identical concurrent calls share one request.
+
+    ``generate_content(prompt, cache_namespace=...)`` names the calling
+    function, as for ``core.ai_cache.CachedModel``, and is passed on to the
+    wrapped model. Any other attribute is delegated to the wrapped model.
+    """
+
+    def __init__(self, model, flight, model_name=''):
+        self._model = model
+        self._flight = flight
+        self._model_name = model_name
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def flight_key(self, prompt, cache_namespace):
+        return hashlib.sha256(f"{self._model_name}\0{cache_namespace}\0{prompt}".encode('utf-8')).hexdigest()
+
+    def _coalesces(self, prompt, args, kwargs):
+        # Streaming or customised calls aren't shareable responses; pass them through.
+        return self._flight is not None and not args and not kwargs and isinstance(prompt, str)
+
+    def _wait(self, future, cache_namespace):
+        """The leader's response, or ``ABANDONED`` if there is none to wait for."""
+        logger.debug(f"Waiting on an identical in-flight call for {cache_namespace}")
+        try:
+            response = future.result(timeout=self._flight.wait_timeout)
+        except FutureTimeoutError:
+            logger.warning(f"Gave up waiting on an identical call for {cache_namespace}; calling the model")
+            return ABANDONED
+        if response is not ABANDONED:
+            self._flight.record(cache_namespace, 'coalesced')
+        return response
+
+    async def _await(self, future, cache_namespace):
+        logger.debug(f"Waiting on an identical in-flight call for {cache_namespace}")
+        try:
+            response = await asyncio.wait_for(asyncio.wrap_future(future), self._flight.wait_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Gave up waiting on an identical call for {cache_namespace}; calling the model")
+            return ABANDONED
+        if response is not ABANDONED:
+            self._flight.record(cache_namespace, 'coalesced')
+        return response
+
+    def generate_content(self, prompt, *args, cache_namespace='default', **kwargs):
+        if not self._coalesces(prompt, args, kwargs):
+            return self._model.generate_content(prompt, *args, **kwargs)
+
+        key = self.flight_key(prompt, cache_namespace)
+
+        def call():
+            return self._model.generate_content(prompt, cache_namespace=cache_namespace)
+
+        future, is_leader = self._flight.join(key)
+        if not is_leader:
+            response = self._wait(future, cache_namespace)
+            if response is not ABANDONED:
+                return response
+            # Nobody is making the call (any more); make it, without coordinating
+            return self._flight._call(cache_namespace, call)
+
+        response, error = ABANDONED, None
+        try:
+            response = self._flight.lead(key, cache_namespace, call)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # Also when cancelled, so waiters are never left on a call nobody is making
+            self._flight.finish(key, future, response, error)
+
+    async def generate_content_async(self, prompt, *args, cache_namespace='default', **kwargs):
+        """Async counterpart of generate_content; sync and async callers share in-flight calls."""
+        if not self._coalesces(prompt, args, kwargs):
+            return await self._model.generate_content_async(prompt, *args, **kwargs)
+
+        key = self.flight_key(prompt, cache_namespace)
+
+        def call():
+            return self._model.generate_content_async(prompt, cache_namespace=cache_namespace)
+
+        future, is_leader = self._flight.join(key)
+        if not is_leader:
+            response = await self._await(future, cache_namespace)
+            if response is not ABANDONED:
+                return response
+            return await self._flight._acall(cache_namespace, call)
+
+        response, error = ABANDONED, None
+        try:
+            response = await self._flight.alead(key, cache_namespace, call)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._flight.finish(key, future, response, error)
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """Return the process-wide single-flight registry."""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            options = get_single_flight_settings()
+            _single_flight = SingleFlight(
+                cross_process=options['CROSS_PROCESS'],
+                wait_timeout=options['WAIT_TIMEOUT'],
+                result_grace=options['RESULT_GRACE'],
+                poll_interval=options['POLL_INTERVAL'],
+            )
+    return _single_flight
+
+
+def coalesce_model(model, model_name=''):
+    """Wrap a model handle so identical concurrent calls share one request (a pass-through when disabled)."""
+    if model is None:
+        return None
+    options = get_single_flight_settings()
+    return CoalescingModel(model, get_single_flight() if options['ENABLED'] else None, model_name=model_name)
@@ -0,0 +1,187 @@
+"""
+Incrementally maintained study statistics.
+
+Creating a document, test, Q&A session or test attempt updates the owner's
+``UserStats`` row and the document's ``DocumentStats`` row, so the dashboard
+and progress pages read one row instead of aggregating every attempt.
+Deletes only mark the user's stats stale; they are recomputed from the
+source tables on the next read, or by ``manage.py backfill_stats``.
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Max, Sum, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Document, DocumentStats, QASession, Test, TestAttempt, UserStats
+
+# Number of latest attempt percentages kept for the progress chart
+RECENT_SCORES = 10
+
+
+def _attempt_percentage():
+    """SQL expression for ``TestAttempt.percentage``."""
+    return Case(
+        When(total_questions__gt=0, then=F('score') * 100.0 / F('total_questions')),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def _latest(*timestamps):
+    present = [timestamp for timestamp in timestamps if timestamp]
+    return max(present) if present else None
+
+
+def refresh_document_stats(documents):
+    """Recompute ``DocumentStats`` for the given documents from the source tables."""
+    documents = list(documents)
+    ids = [document.id for document in documents]
+    tests = dict(
+        Test.objects.filter(document_id__in=ids).values('document_id')
+        .annotate(count=Count('id')).values_list('document_id', 'count')
+    )
+    qa = {
+        row['document_id']: row
+        for row in QASession.objects.filter(document_id__in=ids).values('document_id')
+        .annotate(count=Count('id'), last=Max('created_at'))
+    }
+    attempts = {
+        row['test__document_id']: row
+        for row in TestAttempt.objects.filter(test__document_id__in=ids).values('test__document_id')
+        .annotate(count=Count('id'), total=Sum(_attempt_percentage()), best=Max(_attempt_percentage()),
+                  last=Max('completed_at'))
+    }
+
+    for document in documents:
+        qa_row = qa.get(document.id, {})
+        attempt_row = attempts.get(document.id, {})
+        DocumentStats.objects.update_or_create(
+            document=document,
+            defaults={
+                'test_count': tests.get(document.id, 0),
+                'attempt_count': attempt_row.get('count', 0),
+                'qa_count': qa_row.get('count', 0),
+                'percentage_total': attempt_row.get('total') or 0,
+                'best_percentage': attempt_row.get('best') or 0,
+                'last_activity_at': _latest(document.uploaded_at, qa_row.get('last'), attempt_row.get('last')),
+            },
+        )
+
+
+def refresh_user_stats(user_id):
+    """Recompute a user's stats, and those of their documents, from the source tables."""
+    documents = Document.objects.filter(user_id=user_id)
+    document_totals = documents.aggregate(count=Count('id'), last=Max('uploaded_at'))
+    qa_totals = QASession.objects.filter(user_id=user_id).aggregate(count=Count('id'), last=Max('created_at'))
+    attempts = TestAttempt.objects.filter(user_id=user_id)
+    attempt_totals = attempts.aggregate(
+        count=Count('id'),
+        total=Sum(_attempt_percentage()),
+        best=Max(_attempt_percentage()),
+        last=Max('completed_at'),
+    )
+    recent = [
+        attempt.percentage
+        for attempt in attempts.order_by('-completed_at').only('score', 'total_questions')[:RECENT_SCORES]
+    ]
+
+    with transaction.atomic():
+        stats, _ = UserStats.objects.update_or_create(
+            user_id=user_id,
+            defaults={
+                'document_count': document_totals['count'],
+                'attempt_count': attempt_totals['count'],
+                'qa_count': qa_totals['count'],
+                'percentage_total': attempt_totals['total'] or 0,
+                'best_percentage': attempt_totals['best'] or 0,
+                'recent_percentages': recent,
+                'last_activity_at': _latest(document_totals['last'], qa_totals['last'], attempt_totals['last']),
+                'is_stale': False,
+            },
+        )
+        refresh_document_stats(documents)
+    return stats
+
+
+def get_user_stats(user):
+    """The user's stats row, recomputed first if missing or stale."""
+    stats = UserStats.objects.filter(user=user).first()
+    if stats is None or stats.is_stale:
+        stats = refresh_user_stats(user.id)
+    return stats
+
+
+def _update_stats(user_id, document_id, when, **increments):
+    """
+    Apply increments to the user's and document's stats rows.
+
+    Rows that don't exist yet (e.g. before a backfill) are computed from
+    scratch instead, which already includes the new row.
+    """
+    with transaction.atomic():
+        user_stats = UserStats.objects.select_for_update().filter(user_id=user_id).first()
+        if user_stats is None or user_stats.is_stale:
+            refresh_user_stats(user_id)
+            return
+
+        percentage = increments.pop('percentage', None)
+        for stats in (user_stats, DocumentStats.objects.select_for_update().filter(document_id=document_id).first()):
+            if stats is None:
+                refresh_document_stats(Document.objects.filter(id=document_id))
+                continue
+            for field, amount in increments.items():
+                # Counters only one of the models has (e.g. test_count) are skipped on the other
+                if hasattr(stats, field):
+                    setattr(stats, field, getattr(stats, field) + amount)
+            if percentage is not None:
+                stats.percentage_total += percentage
+                stats.best_percentage = max(stats.best_percentage, percentage)
+                if isinstance(stats, UserStats):
+                    stats.recent_percentages = ([percentage] + stats.recent_percentages)[:RECENT_SCORES]
+            stats.last_activity_at = _latest(stats.last_activity_at, when)
+            stats.save()
+
+
+@receiver(post_save, sender=Document, dispatch_uid='core.stats.document_saved')
+def document_saved(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    with transaction.atomic():
+        DocumentStats.objects.get_or_create(document=instance, defaults={'last_activity_at': instance.uploaded_at})
+        _update_stats(instance.user_id, instance.id, instance.uploaded_at, document_count=1)
+
+
+@receiver(post_save, sender=Test, dispatch_uid='core.stats.test_saved')
+def test_saved(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    _update_stats(instance.user_id, instance.document_id, instance.created_at, test_count=1)
+
+
+@receiver(post_save, sender=QASession, dispatch_uid='core.stats.qa_session_saved')
+def qa_session_saved(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    _update_stats(instance.user_id, instance.document_id, instance.created_at, qa_count=1)
+
+
+@receiver(post_save, sender=TestAttempt, dispatch_uid='core.stats.attempt_saved')
+def attempt_saved(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    _update_stats(
+        instance.user_id,
+        instance.test.document_id,
+        instance.completed_at,
+        attempt_count=1,
+        percentage=instance.percentage,
+    )
+
+
+@receiver(post_delete, sender=Document, dispatch_uid='core.stats.document_deleted')
+@receiver(post_delete, sender=Test, dispatch_uid='core.stats.test_deleted')
+@receiver(post_delete, sender=QASession, dispatch_uid='core.stats.qa_session_deleted')
+@receiver(post_delete, sender=TestAttempt, dispatch_uid='core.stats.attempt_deleted')
+def source_deleted(sender, instance, **kwargs):
+    # Cascades can delete many rows at once; recompute once, on the next read
+    UserStats.objects.filter(user_id=instance.user_id, is_stale=False).update(is_stale=True)
@@ -0,0 +1,74 @@
+"""
+Local stand-in for the Gemini model, for benchmarking without the real API.
+
+``StubModel`` talks to the server started by ``manage.py stub_model_server``
+and exposes the subset of ``GenerativeModel`` that ``core.utils`` uses:
+``generate_content`` and ``generate_content_async``, both with ``stream``.
+"""
+import json
+
+import httpx
+
+from .http_model import LoopClients
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class AsyncStubStream:
+    """Async iterator over streamed chunks, mirroring the SDK's streaming response."""
+
+    def __init__(self, client, payload):
+        self._client = client
+        self._payload = payload
+
+    async def __aiter__(self):
+        async with self._client.stream('POST', '/v1/generate', json=self._payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line:
+                    yield StubResponse(json.loads(line)['text'])
+
+
+class StubModel:
+    """
+    HTTP client for the stub model server.
+
+    Connections are pooled and kept alive: one sync client per model, and an
+    async client per event loop that uses it (see ``LoopClients``).
+    """
+
+    def __init__(self, base_url, timeout=120):
+        self.model_name = 'stub'
+        self._base_url = base_url.rstrip('/')
+        self._client = httpx.Client(base_url=self._base_url, timeout=timeout)
+        self._async_clients = LoopClients(base_url=self._base_url, timeout=timeout)
+
+    def _payload(self, prompt, stream):
+        return {'prompt': prompt, 'stream': stream}
+
+    def _stream(self, payload):
+        with self._client.stream('POST', '/v1/generate', json=payload) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield StubResponse(json.loads(line)['text'])
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        payload = self._payload(prompt, stream)
+        if stream:
+            return self._stream(payload)
+        response = self._client.post('/v1/generate', json=payload)
+        response.raise_for_status()
+        return StubResponse(response.json()['text'])
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        client = await self._async_clients.get()
+        payload = self._payload(prompt, stream)
+        if stream:
+            return AsyncStubStream(client, payload)
+        response = await client.post('/v1/generate', json=payload)
+        response.raise_for_status()
+        return StubResponse(response.json()['text'])
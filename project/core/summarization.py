@@ -0,0 +1,134 @@
+"""
+Map-reduce summarization for long documents.
+
+Documents that fit in one prompt are summarized directly. Longer ones are
+split into token-budgeted sections that are summarized concurrently (map),
+then the section summaries are merged into the final summary (reduce).
+Each section summary is saved as soon as it is produced, so a failure part
+way through resumes from the sections still missing.
+"""
+import contextvars
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connections
+
+from .models import SectionSummary
+from .retrieval import chunk_text
+from .utils import combine_summaries, generate_section_summary, generate_summary, summary_failed
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for English prose
+CHARS_PER_TOKEN = 4
+
+
+def get_section_chars():
+    return getattr(settings, 'SUMMARY_SECTION_TOKENS', 2000) * CHARS_PER_TOKEN
+
+
+def split_sections(text):
+    """Split text into sections that each fit the per-prompt token budget."""
+    return [text[start:end] for start, end in chunk_text(text, chunk_size=get_section_chars(), overlap=0)]
+
+
+def _section_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _summarize_section(section, index, total):
+    # Pacing and retries happen in the shared AI gate (see core.ratelimit)
+    try:
+        return generate_section_summary(section, index + 1, total)
+    finally:
+        # The AI layers use the database (single-flight claims); pool threads
+        # get their own connections, so don't leak them
+        connections.close_all()
+
+
+def _reduce(summaries, progress=None):
+    """Merge summaries, in groups if together they exceed the prompt budget."""
+    budget = get_section_chars()
+    while len(summaries) > 1 and sum(len(s) for s in summaries) > budget:
+        groups, group, size = [], [], 0
+        for summary in summaries:
+            if group and size + len(summary) > budget:
+                groups.append(group)
+                group, size = [], 0
+            group.append(summary)
+            size += len(summary)
+        groups.append(group)
+        if len(groups) == len(summaries):
+            break  # Every summary is over budget on its own; merge what we have
+
+        summaries = []
+        for group in groups:
+            merged = combine_summaries(group) if len(group) > 1 else group[0]
+            if summary_failed(merged):
+                return merged
+            summaries.append(merged)
+            if progress:
+                progress()
+
+    return combine_summaries(summaries) if len(summaries) > 1 else summaries[0]
+
+
+def summarize_document(document, progress=None):
+    """
+    Summarize a document's full content, map-reducing over sections if needed.
+
+    Returns the summary, or an error message (see ``summary_failed``).
+    ``progress`` is called with the fraction of sections summarized as each
+    one finishes, and again as merged groups finish.
+    """
+    content = document.content or ""
+    sections = split_sections(content)
+    if len(sections) <= 1:
+        return generate_summary(content)
+
+    done = {
+        section.index: section
+        for section in SectionSummary.objects.filter(document=document, index__lt=len(sections))
+    }
+    summaries = [None] * len(sections)
+    pending = []
+    for index, section in enumerate(sections):
+        saved = done.get(index)
+        if saved and saved.section_hash == _section_hash(section):
+            summaries[index] = saved.summary
+        else:
+            pending.append(index)
+
+    if pending:
+        logger.info(
+            f"Summarizing {len(pending)} of {len(sections)} section(s) of document {document.id}"
+        )
+        workers = min(getattr(settings, 'SUMMARY_MAX_WORKERS', 4), len(pending))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='summarize') as executor:
+            futures = {
+                # Run in a copy of our context so calls are attributed to the document's owner
+                executor.submit(
+                    contextvars.copy_context().run, _summarize_section, sections[index], index, len(sections)
+                ): index
+                for index in pending
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                summary = summaries[index] = future.result()
+                if not summary_failed(summary):
+                    # Persist as each section finishes so a later failure doesn't lose it
+                    SectionSummary.objects.update_or_create(
+                        document=document,
+                        index=index,
+                        defaults={'section_hash': _section_hash(sections[index]), 'summary': summary},
+                    )
+                if progress:
+                    progress(sum(s is not None for s in summaries) / len(sections))
+
+    failed = next((summary for summary in summaries if summary_failed(summary)), None)
+    if failed:
+        return failed
+
+    return _reduce(summaries, progress=(lambda: progress(1)) if progress else None)
@@ -0,0 +1,310 @@
+"""
+In-process background job queue for document processing.
+
+Jobs are persisted in the ``ProcessingJob`` table and executed on a thread
+pool, so uploads return immediately and unfinished work is picked up again
+after a worker restart. Besides processing uploads, jobs fill each
+document's question bank (see ``core.question_bank``).
+"""
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .content_cache import get_cache_entry, record_hit, store_extraction, store_summary
+from .models import ProcessingJob
+from .question_bank import fill_question_bank, needs_refill
+from .ratelimit import ai_user_context
+from .retrieval import build_document_index
+from .summarization import summarize_document
+from .utils import extract_pdf_content, summary_failed, summary_retryable
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_resumed = False
+
+
+def get_executor():
+    """Return the process-wide worker pool, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'DOCUMENT_PROCESSING_WORKERS', 2),
+                thread_name_prefix='document-processing',
+            )
+    return _executor
+
+
+def enqueue_document_processing(document):
+    """Create a processing job for a document and schedule it once committed."""
+    job = ProcessingJob.objects.create(document=document)
+    transaction.on_commit(lambda: submit_job(job.id))
+    return job
+
+
+def enqueue_question_bank(document):
+    """Schedule filling a document's question bank, unless a fill is already queued or running."""
+    active = ProcessingJob.objects.filter(
+        document=document,
+        kind=ProcessingJob.KIND_QUESTION_BANK,
+        status__in=[ProcessingJob.STATUS_PENDING, ProcessingJob.STATUS_RUNNING],
+    )
+    if active.exists():
+        return None
+    job = ProcessingJob.objects.create(document=document, kind=ProcessingJob.KIND_QUESTION_BANK)
+    transaction.on_commit(lambda: submit_job(job.id))
+    return job
+
+
+def request_question_bank_refill(document):
+    """Top up the question bank in the background if it is running low."""
+    if needs_refill(document):
+        return enqueue_question_bank(document)
+    return None
+
+
+def submit_job(job_id):
+    """Hand a persisted job over to the worker pool."""
+    get_executor().submit(run_job, job_id)
+
+
+def schedule_job(job_id, delay):
+    """Submit a job after ``delay`` seconds (used for retry backoff)."""
+    timer = threading.Timer(delay, submit_job, args=[job_id])
+    timer.daemon = True
+    timer.start()
+
+
+def run_job(job_id):
+    """Worker entry point: claim the job, run its stages, release DB connections."""
+    try:
+        if not _claim_job(job_id):
+            return
+        job = ProcessingJob.objects.select_related('document').get(id=job_id)
+        if job.kind == ProcessingJob.KIND_QUESTION_BANK:
+            _fill_question_bank_job(job)
+        else:
+            _process_job(job)
+    except Exception as e:
+        logger.error(f"Unexpected error running processing job {job_id}: {str(e)}")
+    finally:
+        # Worker threads get their own connections; don't leak them.
+        connections.close_all()
+
+
+def _claim_job(job_id):
+    """Atomically move a job from pending to running so only one worker runs it."""
+    now = timezone.now()
+    claimed = ProcessingJob.objects.filter(
+        Q(run_after__isnull=True) | Q(run_after__lte=now),
+        id=job_id,
+        status=ProcessingJob.STATUS_PENDING,
+    ).update(
+        status=ProcessingJob.STATUS_RUNNING,
+        attempts=F('attempts') + 1,
+        started_at=now,
+        updated_at=now,
+    )
+    return claimed == 1
+
+
+def _update_job(job, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=list(fields) + ['updated_at'])
+
+
+def _fail_job(job, error):
+    _update_job(
+        job,
+        status=ProcessingJob.STATUS_FAILED,
+        error=error,
+        finished_at=timezone.now(),
+    )
+
+
+def _retry_job_later(job, error):
+    """
+    Put a job back in the queue after a transient failure (e.g. API quota),
+    with jittered exponential backoff, or fail it once attempts run out.
+    """
+    max_attempts = getattr(settings, 'DOCUMENT_PROCESSING_MAX_ATTEMPTS', 3)
+    if job.attempts >= max_attempts:
+        _fail_job(job, error)
+        return
+
+    base = getattr(settings, 'DOCUMENT_PROCESSING_RETRY_DELAY', 60)
+    delay = random.uniform(base, 2 * base) * 2 ** (job.attempts - 1)
+    _update_job(
+        job,
+        status=ProcessingJob.STATUS_PENDING,
+        error=error,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+    logger.warning(f"Processing job {job.id} will retry in {delay:.0f}s: {error}")
+    schedule_job(job.id, delay)
+
+
+def _process_job(job):
+    """Run the extraction, indexing and summarization stages for a claimed job."""
+    document = job.document
+    cache_entry = get_cache_entry(document.content_hash)
+
+    try:
+        # A job resumed after a restart keeps the stages it already finished.
+        if job.stage in (ProcessingJob.STAGE_QUEUED, ProcessingJob.STAGE_EXTRACTING) or \
+                not document.pages.exists():
+            _update_job(job, stage=ProcessingJob.STAGE_EXTRACTING, progress=10)
+            if cache_entry and cache_entry.content:
+                pdf_content, page_offsets = cache_entry.content, cache_entry.page_offsets
+                record_hit(cache_entry)
+            else:
+                pdf_content, page_offsets, complete = extract_pdf_content(document.file)
+                # Pages that failed may well extract next time; don't cache their absence
+                if complete and pdf_content and not pdf_content.startswith("Error"):
+                    store_extraction(document.content_hash, pdf_content, page_offsets)
+            document.set_content(pdf_content, page_offsets)
+
+            if not pdf_content or pdf_content.startswith("Error"):
+                document.summary = "Unable to process this PDF. Please ensure it contains readable text."
+                document.is_processed = False
+                document.save(update_fields=['summary', 'is_processed', 'updated_at'])
+                _fail_job(job, pdf_content or "No text extracted")
+                return
+
+            document.save(update_fields=['updated_at'])
+
+        if job.stage != ProcessingJob.STAGE_SUMMARIZING:
+            _update_job(job, stage=ProcessingJob.STAGE_INDEXING, progress=35)
+            build_document_index(document)
+
+        _update_job(job, stage=ProcessingJob.STAGE_SUMMARIZING, progress=50)
+        if cache_entry and cache_entry.summary:
+            document.summary = cache_entry.summary
+        else:
+            def progress(fraction):
+                # Also keeps updated_at fresh so resume_pending_jobs doesn't take
+                # a long summarization for an orphaned job
+                _update_job(job, progress=50 + int(fraction * 45))
+
+            with ai_user_context(document.user_id):
+                summary = summarize_document(document, progress=progress)
+            if summary_retryable(summary):
+                # Don't save "quota exceeded" as the summary; try again later.
+                # Section summaries already produced are kept, so the retry resumes.
+                _retry_job_later(job, summary)
+                return
+            document.summary = summary
+            if not summary_failed(summary):
+                store_summary(document.content_hash, summary)
+        document.is_processed = True
+        document.save(update_fields=['summary', 'is_processed', 'updated_at'])
+
+        _update_job(
+            job,
+            status=ProcessingJob.STATUS_COMPLETED,
+            stage=ProcessingJob.STAGE_DONE,
+            progress=100,
+            finished_at=timezone.now(),
+        )
+
+    except Exception as e:
+        logger.error(f"Error processing document {document.id}: {str(e)}")
+        document.set_content(f"Processing error: {str(e)}")
+        document.summary = "An error occurred while processing this document."
+        document.is_processed = False
+        document.save(update_fields=['summary', 'is_processed', 'updated_at'])
+        _fail_job(job, str(e))
+        return
+
+    # Prepare questions so the first test doesn't wait on the model
+    enqueue_question_bank(document)
+
+
+def _fill_question_bank_job(job):
+    """Generate questions for a document's question bank."""
+    document = job.document
+    _update_job(job, stage=ProcessingJob.STAGE_GENERATING_QUESTIONS, progress=5)
+
+    def progress(fraction):
+        _update_job(job, progress=5 + int(fraction * 90))
+
+    try:
+        with ai_user_context(document.user_id):
+            added = fill_question_bank(document, progress=progress)
+    except Exception as e:
+        logger.error(f"Error filling question bank for document {document.id}: {str(e)}")
+        _fail_job(job, str(e))
+        return
+
+    if not added and needs_refill(document):
+        # Nothing came back (API errors are logged, not raised); try again later
+        _retry_job_later(job, "No questions were generated.")
+        return
+
+    _update_job(
+        job,
+        status=ProcessingJob.STATUS_COMPLETED,
+        stage=ProcessingJob.STAGE_DONE,
+        progress=100,
+        finished_at=timezone.now(),
+    )
+
+
+def resume_pending_jobs():
+    """
+    Re-queue jobs left unfinished by a previous worker process.
+
+    Running jobs that have not been touched for ``DOCUMENT_PROCESSING_STALE_AFTER``
+    seconds are assumed orphaned and reset to pending, unless they have
+    already used up their attempts.
+    """
+    stale_after = getattr(settings, 'DOCUMENT_PROCESSING_STALE_AFTER', 600)
+    max_attempts = getattr(settings, 'DOCUMENT_PROCESSING_MAX_ATTEMPTS', 3)
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+
+    stale = ProcessingJob.objects.filter(status=ProcessingJob.STATUS_RUNNING, updated_at__lt=cutoff)
+    stale.filter(attempts__gte=max_attempts).update(
+        status=ProcessingJob.STATUS_FAILED,
+        error="Gave up after repeated interruptions.",
+        finished_at=timezone.now(),
+    )
+    stale.update(status=ProcessingJob.STATUS_PENDING)
+
+    now = timezone.now()
+    pending = ProcessingJob.objects.filter(status=ProcessingJob.STATUS_PENDING).values_list('id', 'run_after')
+    job_ids = []
+    for job_id, run_after in pending:
+        job_ids.append(job_id)
+        if run_after and run_after > now:
+            schedule_job(job_id, (run_after - now).total_seconds())
+        else:
+            submit_job(job_id)
+
+    if job_ids:
+        logger.info(f"Resumed {len(job_ids)} unfinished processing job(s)")
+    return len(job_ids)
+
+
+def resume_on_first_request(sender, **kwargs):
+    """``request_started`` receiver that resumes pending jobs once per process."""
+    global _resumed
+    with _executor_lock:
+        if _resumed:
+            return
+        _resumed = True
+
+    try:
+        resume_pending_jobs()
+    except DatabaseError as e:
+        # Tables may not exist yet (e.g. before the first migrate).
+        logger.warning(f"Could not resume processing jobs: {str(e)}")
@@ -1,39 +1,78 @@
 from django import template
+from django.conf import settings
+from django.utils.html import escape
 from django.utils.safestring import mark_safe
+from functools import lru_cache
 import re
 
 register = template.Library()
 
-@register.filter(name='markdown')
-def markdown_format(text):
-    """
-    Convert markdown-style text to HTML
-    """
-    if not text:
-        return ''
+HEADINGS = [
+    ('### ', '<h3 class="text-xl font-bold text-gray-900 mt-6 mb-3">{}</h3>'),
+    ('## ', '<h2 class="text-2xl font-bold text-gray-900 mt-8 mb-4">{}</h2>'),
+    ('# ', '<h1 class="text-3xl font-bold text-gray-900 mt-8 mb-4">{}</h1>'),
+]
+LIST_ITEM = '<li class="ml-6 mb-2 list-disc">{}</li>'
+LIST_START = '<ul class="my-3">'
+RULE = '<hr class="my-6 border-gray-300">'
 
-    # Convert headers
-    text = re.sub(r'^### (.*?)$', r'<h3 class="text-xl font-bold text-gray-900 mt-6 mb-3">\1</h3>', text, flags=re.MULTILINE)
-    text = re.sub(r'^## (.*?)$', r'<h2 class="text-2xl font-bold text-gray-900 mt-8 mb-4">\1</h2>', text, flags=re.MULTILINE)
-    text = re.sub(r'^# (.*?)$', r'<h1 class="text-3xl font-bold text-gray-900 mt-8 mb-4">\1</h1>', text, flags=re.MULTILINE)
+BOLD_RE = re.compile(r'\*\*(.*?)\*\*')
+# Emphasis needs text right inside the stars, so "*   **Term:**" bullets aren't paired up
+ITALIC_RE = re.compile(r'\*(?=\S)(.+?)(?<=\S)\*')
 
-    # Convert bold text
-    text = re.sub(r'\*\*(.*?)\*\*', r'<strong class="font-semibold text-gray-900">\1</strong>', text)
 
-    # Convert italic text
-    text = re.sub(r'\*(.*?)\*', r'<em class="italic">\1</em>', text)
+def _inline(text):
+    text = escape(text)
+    if '*' in text:
+        text = BOLD_RE.sub(r'<strong class="font-semibold text-gray-900">\1</strong>', text)
+        text = ITALIC_RE.sub(r'<em class="italic">\1</em>', text)
+    return text
 
-    # Convert unordered lists
-    text = re.sub(r'^\* (.*?)$', r'<li class="ml-6 mb-2 list-disc">\1</li>', text, flags=re.MULTILINE)
 
-    # Wrap consecutive list items in <ul>
-    text = re.sub(r'(<li class="ml-6 mb-2 list-disc">.*?</li>\n?)+', lambda m: f'<ul class="my-3">{m.group(0)}</ul>', text, flags=re.DOTALL)
+@lru_cache(maxsize=getattr(settings, 'MARKDOWN_CACHE_SIZE', 256))
+def render_markdown(text):
+    """
+    Convert markdown-style text to HTML in one pass over its lines.
 
-    # Convert line breaks to <br> but preserve spacing
-    text = re.sub(r'\n\n', '<br><br>', text)
-    text = re.sub(r'\n', '<br>', text)
+    Summaries never change once written, so rendered HTML is kept in an LRU
+    cache keyed by the text.
+    """
+    lines = text.split('\n')
+    last = len(lines) - 1
+    parts = []
+    in_list = False
+    for i, line in enumerate(lines):
+        is_item = line.startswith('* ')
+        if is_item and not in_list:
+            parts.append(LIST_START)
+        elif in_list and not is_item:
+            parts.append('</ul>')
+        in_list = is_item
 
-    # Convert horizontal rules
-    text = re.sub(r'^---$', r'<hr class="my-6 border-gray-300">', text, flags=re.MULTILINE)
+        if is_item:
+            parts.append(LIST_ITEM.format(_inline(line[2:])))
+        elif line == '---':
+            parts.append(RULE)
+        else:
+            for prefix, heading in HEADINGS:
+                if line.startswith(prefix):
+                    parts.append(heading.format(_inline(line[len(prefix):])))
+                    break
+            else:
+                parts.append(_inline(line))
+        # Line breaks are kept as <br>, inside lists too
+        if i < last:
+            parts.append('<br>')
+    if in_list:
+        parts.append('</ul>')
+    return ''.join(parts)
 
-    return mark_safe(text)
+
+@register.filter(name='markdown')
+def markdown_format(text):
+    """
+    Convert markdown-style text to HTML
+    """
+    if not text:
+        return ''
+    return mark_safe(render_markdown(text))
@@ -0,0 +1,243 @@
+"""
+Streaming and resumable uploads of PDF documents.
+
+``PDFUploadHandler`` (the only entry in FILE_UPLOAD_HANDLERS) writes each
+uploaded file straight to a temporary file on disk a chunk at a time,
+hashing it and checking that it looks like a PDF as the bytes arrive. A file
+that is too large or doesn't start like a PDF stops the upload there, without
+reading the rest of the request body, and the reason is left on the request
+as ``upload_error`` for the upload form to show.
+
+Large files can also be sent in pieces, so that a dropped connection only
+costs the current piece: a ``ChunkedUpload`` records how many bytes have
+arrived, and the bytes themselves go to a partial file under
+CHUNKED_UPLOAD_DIR until the last piece is in.
+"""
+import hashlib
+import logging
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import ChunkedUpload
+
+logger = logging.getLogger(__name__)
+
+# A PDF starts with "%PDF-" within its first kilobyte and ends with "%%EOF"
+# within its last; readers tolerate a little junk on either side.
+PDF_MAGIC = b'%PDF-'
+EOF_MARKER = b'%%EOF'
+MARKER_WINDOW = 1024
+
+# Bytes copied at a time from a request body or partial file
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class UploadRejected(Exception):
+    """An upload that won't be accepted; the message is shown to the user."""
+
+
+class ChunkOffsetMismatch(Exception):
+    """A piece of a resumable upload that doesn't start where the last one ended."""
+
+
+def get_max_size():
+    return settings.DOCUMENT_UPLOAD_MAX_SIZE
+
+
+def too_large_message():
+    return f"File size cannot exceed {filesizeformat(get_max_size())}."
+
+
+class PDFStream:
+    """Hash a file's bytes as they arrive and check that they look like a PDF."""
+
+    def __init__(self, max_size=None):
+        self.max_size = get_max_size() if max_size is None else max_size
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._head = b''
+        self._tail = b''
+        self._header_checked = False
+
+    def update(self, data):
+        """Add the next bytes; raises UploadRejected as soon as the file can't be accepted."""
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadRejected(too_large_message())
+        if not self._header_checked:
+            self._head += data[:MARKER_WINDOW - len(self._head)]
+            if len(self._head) >= MARKER_WINDOW:
+                self._check_header()
+        self._digest.update(data)
+        self._tail = (self._tail + data[-MARKER_WINDOW:])[-MARKER_WINDOW:]
+
+    def _check_header(self):
+        self._header_checked = True
+        if PDF_MAGIC not in self._head:
+            raise UploadRejected("Please upload a PDF file only.")
+
+    def finish(self):
+        """Check the end of the file once every byte is in; returns the SHA-256 hex digest."""
+        if not self._header_checked:
+            self._check_header()
+        if EOF_MARKER not in self._tail:
+            raise UploadRejected("The PDF file is incomplete or damaged.")
+        return self._digest.hexdigest()
+
+
+class PDFUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stream uploaded files to disk, rejecting anything but a PDF of an allowed
+    size early. Accepted files carry their SHA-256 as ``sha256``.
+    """
+    # Room for the form's other fields and the multipart framing around the file
+    REQUEST_OVERHEAD = 64 * 1024
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Fields before the file (the CSRF token among them) are still parsed
+        self.request_too_large = content_length > get_max_size() + self.REQUEST_OVERHEAD
+
+    def new_file(self, *args, **kwargs):
+        if self.request_too_large:
+            self._reject(too_large_message())
+        super().new_file(*args, **kwargs)
+        self.stream = PDFStream()
+
+    def receive_data_chunk(self, raw_data, start):
+        try:
+            self.stream.update(raw_data)
+        except UploadRejected as e:
+            self._reject(str(e))
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        try:
+            sha256 = self.stream.finish()
+        except UploadRejected as e:
+            self._set_error(str(e))
+            self.upload_interrupted()
+            return None
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.sha256 = sha256
+        return uploaded_file
+
+    def _set_error(self, message):
+        if self.request is not None:
+            self.request.upload_error = message
+
+    def _reject(self, message):
+        self._set_error(message)
+        # The parser closes (and so deletes) the temporary file
+        raise StopUpload(connection_reset=True)
+
+
+def partial_path(upload):
+    return Path(settings.CHUNKED_UPLOAD_DIR) / f'{upload.id.hex}.part'
+
+
+def clean_file_name(file_name):
+    """
+    The client's file name reduced to a safe base name, so it can't point
+    into other directories when the file is stored; '' if nothing is left.
+    """
+    try:
+        return get_valid_filename(os.path.basename(file_name.replace('\\', '/')))[-255:]
+    except SuspiciousFileOperation:
+        return ''
+
+
+def start_chunked_upload(user, title, file_name, size):
+    """Start a resumable upload; raises UploadRejected if the file can't be accepted."""
+    if not title:
+        raise UploadRejected("Please give the document a title.")
+    file_name = clean_file_name(file_name)
+    if not file_name.lower().endswith('.pdf'):
+        raise UploadRejected("Please upload a PDF file only.")
+    if size <= 0:
+        raise UploadRejected("The file is empty.")
+    if size > get_max_size():
+        raise UploadRejected(too_large_message())
+
+    delete_expired_uploads()
+    Path(settings.CHUNKED_UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
+    upload = ChunkedUpload.objects.create(user=user, title=title[:255], file_name=file_name, size=size)
+    partial_path(upload).touch()
+    return upload
+
+
+def append_chunk(upload, offset, body, length):
+    """
+    Write the next piece of ``upload`` from the file-like ``body`` and return
+    the number of bytes now received. A piece cut short (the client went
+    away) isn't counted, so the client resumes from the same offset.
+    """
+    if offset != upload.received:
+        raise ChunkOffsetMismatch()
+    if length > settings.CHUNKED_UPLOAD_CHUNK_SIZE or offset + length > upload.size:
+        raise UploadRejected("The upload sent more data than expected.")
+
+    # Only the first piece is checked on the way in; finish_chunked_upload() checks the whole file
+    stream = PDFStream(max_size=upload.size) if offset == 0 else None
+    copied = 0
+    with open(partial_path(upload), 'r+b') as partial:
+        partial.seek(offset)
+        while copied < length:
+            data = body.read(min(COPY_CHUNK_SIZE, length - copied))
+            if not data:
+                break
+            if stream is not None:
+                stream.update(data)
+            partial.write(data)
+            copied += len(data)
+
+    if copied == length:
+        # Two requests for the same piece (a client retry) can't both count it
+        updated = ChunkedUpload.objects.filter(id=upload.id, received=offset).update(
+            received=offset + length, updated_at=timezone.now(),
+        )
+        if not updated:
+            raise ChunkOffsetMismatch()
+        upload.received = offset + length
+    return upload.received
+
+
+def finish_chunked_upload(upload):
+    """
+    Check a fully received upload and return ``(path, sha256)`` of its file,
+    reading it back from disk a chunk at a time.
+    """
+    path = partial_path(upload)
+    stream = PDFStream(max_size=upload.size)
+    with open(path, 'r+b') as partial:
+        # Drop anything past the declared size left by an interrupted retry
+        partial.truncate(upload.size)
+        while data := partial.read(COPY_CHUNK_SIZE):
+            stream.update(data)
+    return path, stream.finish()
+
+
+def delete_expired_uploads():
+    """Delete resumable uploads that haven't received anything for CHUNKED_UPLOAD_EXPIRY seconds."""
+    cutoff = timezone.now() - timedelta(seconds=settings.CHUNKED_UPLOAD_EXPIRY)
+    for upload in ChunkedUpload.objects.filter(updated_at__lt=cutoff):
+        upload.delete()
+
+
+@receiver(post_delete, sender=ChunkedUpload, dispatch_uid='core.uploads.chunked_upload_deleted')
+def chunked_upload_deleted(sender, instance, **kwargs):
+    try:
+        os.remove(partial_path(instance))
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.warning("Could not remove partial upload %s", instance.id, exc_info=True)
@@ -15,11 +15,20 @@ urlpatterns = [
     # Dashboard and main features
     path('dashboard/', views.dashboard, name='dashboard'),
     path('upload/', views.upload_document, name='upload_document'),
+    path('upload/resumable/', views.start_chunked_upload, name='start_chunked_upload'),
+    path('upload/resumable/<uuid:upload_id>/', views.chunked_upload, name='chunked_upload'),
     path('document/<uuid:document_id>/', views.document_detail, name='document_detail'),
+    path('document/<uuid:document_id>/status/', views.document_status, name='document_status'),
+    path('document/<uuid:document_id>/text/', views.document_text, name='document_text'),
     path('document/<uuid:document_id>/qa/', views.qa_session, name='qa_session'),
+    path('document/<uuid:document_id>/qa/stream/', views.qa_stream, name='qa_stream'),
     path('document/<uuid:document_id>/test/', views.generate_test, name='generate_test'),
     path('test/<uuid:test_id>/', views.take_test, name='take_test'),
     path('test/<uuid:test_id>/submit/', views.submit_test, name='submit_test'),
     path('test-result/<uuid:attempt_id>/', views.test_result, name='test_result'),
     path('progress/', views.progress_tracking, name='progress_tracking'),
+    path('search/', views.search, name='search'),
+
+    # Monitoring (no trailing slash, as Prometheus expects)
+    path('metrics', views.metrics, name='metrics'),
 ]
\ No newline at end of file
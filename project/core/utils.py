@@ -1,71 +1,172 @@
-import PyPDF2
-import google.generativeai as genai
-from django.conf import settings
 import json
 import logging
+import time
+
+from asgiref.sync import sync_to_async
+
+from .ai_cache import wrap_model
+from .extraction import extract_pdf_pages
+from .metrics import instrument_model, observe_ai_call
+from .providers import get_provider
+from .ratelimit import limit_model
+from .singleflight import coalesce_model
 
 logger = logging.getLogger(__name__)
 
-# Configure Gemini API
-def configure_gemini():
-    """Configure Gemini API with proper error handling"""
-    api_key = getattr(settings, 'GEMINI_API_KEY', None)
-    if api_key and api_key.strip():
-        try:
-            genai.configure(api_key=api_key)
-            return genai.GenerativeModel('gemini-2.5-flash')
-        except Exception as e:
-            logger.error(f"Error configuring Gemini API: {str(e)}")
-            return None
-    else:
-        logger.warning("GEMINI_API_KEY not found or empty in settings")
+# Characters of document text a prompt includes, at most
+PROMPT_MAX_CHARS = 8000
+
+
+def configure_model():
+    """Configure the model of the backend named by AI_PROVIDER (see core/providers.py)."""
+    provider = get_provider()
+    try:
+        base_model = provider.create_model()
+    except Exception as e:
+        logger.error(f"Error configuring the {provider.name} AI provider: {str(e)}")
+        return None
+    if base_model is None:
         return None
+    model_name = provider.model_name()
+    # Identical prompts are served from the response cache; concurrent misses share one
+    # request, which is timed and goes through the rate limiter
+    return wrap_model(
+        coalesce_model(instrument_model(limit_model(base_model)), model_name=model_name),
+        model_name=model_name,
+    )
+
+
+# Configured on first use, so processes that never call the model don't load its client
+model = None
 
-# Initialize model
-model = configure_gemini()
 
 def get_model():
-    """Get Gemini model with lazy initialization"""
+    """Get the AI model with lazy initialization"""
     global model
     if model is None:
-        model = configure_gemini()
+        model = configure_model()
     return model
 
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text content from PDF file with better error handling."""
+def get_async_model():
+    """
+    Get the model for async calls: the same process-wide model, whose
+    providers open their async clients on the event loop that uses them.
+    """
+    return get_model()
+
+
+# Messages generate_summary returns instead of a summary; these must not be cached
+SUMMARY_FAILURE_PREFIXES = (
+    "AI summarization is currently unavailable",
+    "Unable to generate summary",
+    "API authentication failed",
+    "API quota exceeded",
+    "Content was filtered",
+    "Error generating summary",
+)
+
+
+# Failures that may succeed if tried again later
+SUMMARY_RETRYABLE_PREFIXES = (
+    "API quota exceeded",
+    "Error generating summary",
+    "Unable to generate summary",
+)
+
+
+def summary_failed(summary):
+    """Return True if generate_summary produced an error message rather than a summary."""
+    return not summary or summary.startswith(SUMMARY_FAILURE_PREFIXES)
+
+
+def summary_retryable(summary):
+    """Return True if a failed summary was a transient error worth retrying later."""
+    return bool(summary) and summary.startswith(SUMMARY_RETRYABLE_PREFIXES)
+
+
+def join_pages(pages):
+    """Join page texts into one string and return it with each page's start offset."""
+    offsets = []
+    parts = []
+    position = 0
+    for page_text in pages:
+        offsets.append(position)
+        if page_text:
+            parts.append(page_text)
+            position += len(page_text) + 1
+
+    # Join once instead of growing the string page by page
+    joined = "\n".join(parts)
+    text_content = joined.strip()
+    leading = len(joined) - len(joined.lstrip())
+    offsets = [min(max(offset - leading, 0), len(text_content)) for offset in offsets]
+    return text_content, offsets
+
+
+def extract_pdf_content(pdf_file):
+    """
+    Extract text content and per-page start offsets from a PDF file.
+
+    Returns ``(text, page_offsets, complete)``; ``complete`` is False if any
+    page failed or timed out, so the text shouldn't be cached.
+    """
     try:
-        # Reset file pointer to beginning
-        pdf_file.seek(0)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text_content = ""
-        
-        for page_num, page in enumerate(pdf_reader.pages):
-            try:
-                page_text = page.extract_text()
-                if page_text:
-                    text_content += page_text + "\n"
-            except Exception as e:
-                logger.warning(f"Error extracting text from page {page_num}: {str(e)}")
-                continue
-        
-        # Clean up the text
-        text_content = text_content.strip()
+        pages, failed = extract_pdf_pages(pdf_file)
+        text_content, page_offsets = join_pages(pages)
+        if failed:
+            logger.warning(f"Could not extract {failed} of {len(pages)} PDF page(s)")
         
         if not text_content:
             logger.warning("No text content extracted from PDF")
-            return "No readable text found in the PDF. Please ensure the PDF contains text content."
+            return "No readable text found in the PDF. Please ensure the PDF contains text content.", [], not failed
         
-        return text_content
+        return text_content, page_offsets, not failed
         
     except Exception as e:
         logger.error(f"Error extracting text from PDF: {str(e)}")
-        return f"Error reading PDF file: {str(e)}"
+        return f"Error reading PDF file: {str(e)}", [], False
+
+
+def extract_text_from_pdf(pdf_file):
+    """Extract text content from PDF file with better error handling."""
+    text_content, _, _ = extract_pdf_content(pdf_file)
+    return text_content
+
+
+def build_summary_prompt(text_content):
+    """Prompt asking the model to summarize a (truncated) document."""
+    # Limit text length to avoid token limits
+    max_chars = PROMPT_MAX_CHARS
+    if len(text_content) > max_chars:
+        text_content = text_content[:max_chars] + "..."
+    
+    return f"""
+    Please provide a comprehensive summary of the following text. 
+    Focus on key concepts, main ideas, and important details that would be useful for studying.
+    Make the summary clear, well-structured, and easy to understand.
+
+    Text to summarize:
+    {text_content}
+    
+    Please provide a detailed summary:
+    """
 
 
 def generate_summary(text_content):
-    """Generate summary using Gemini API with better error handling."""
-    model = get_model()
+    """Generate summary using the AI model with better error handling."""
+    if not get_model():
+        return "AI summarization is currently unavailable. Please check your API configuration."
+    
+    if not text_content or len(text_content.strip()) < 50:
+        return "Document content is too short to generate a meaningful summary."
+    
+    return _run_summary_prompt(build_summary_prompt(text_content), 'generate_summary')
+
+
+async def agenerate_summary(text_content):
+    """Async version of generate_summary."""
+    model = get_async_model()
     
     if not model:
         return "AI summarization is currently unavailable. Please check your API configuration."
@@ -74,45 +175,107 @@ def generate_summary(text_content):
         return "Document content is too short to generate a meaningful summary."
     
     try:
-        # Limit text length to avoid token limits
-        max_chars = 8000
-        if len(text_content) > max_chars:
-            text_content = text_content[:max_chars] + "..."
-        
-        prompt = f"""
-        Please provide a comprehensive summary of the following text. 
-        Focus on key concepts, main ideas, and important details that would be useful for studying.
-        Make the summary clear, well-structured, and easy to understand.
+        response = await model.generate_content_async(
+            build_summary_prompt(text_content), cache_namespace='generate_summary'
+        )
+        return _summary_text(response)
+    except Exception as e:
+        return _summary_error_message(e)
 
-        Text to summarize:
-        {text_content}
-        
-        Please provide a detailed summary:
-        """
-        
-        response = model.generate_content(prompt)
-        
-        if response and response.text:
-            return response.text.strip()
-        else:
-            return "Unable to generate summary. The AI service returned an empty response."
-            
+
+def generate_section_summary(section_text, section_number, total_sections):
+    """Summarize one section of a long document (the map step of map-reduce summarization)."""
+    prompt = f"""
+    The following text is section {section_number} of {total_sections} of a longer study document.
+    Summarize this section, keeping its key concepts, definitions, facts and examples.
+    Be concise: the summary will be merged with the summaries of the other sections.
+
+    Section text:
+    {section_text}
+
+    Section summary:
+    """
+    return _run_summary_prompt(prompt, 'generate_section_summary')
+
+
+def combine_summaries(partial_summaries):
+    """Merge section summaries into one summary (the reduce step of map-reduce summarization)."""
+    joined = "\n\n".join(
+        f"Section {number}:\n{summary}" for number, summary in enumerate(partial_summaries, start=1)
+    )
+    prompt = f"""
+    The following are summaries of consecutive sections of one study document.
+    Combine them into a single comprehensive summary of the whole document.
+    Focus on key concepts, main ideas, and important details that would be useful for studying.
+    Make the summary clear, well-structured, and easy to understand, and avoid repeating points.
+
+    Section summaries:
+    {joined}
+
+    Please provide a detailed summary:
+    """
+    return _run_summary_prompt(prompt, 'combine_summaries')
+
+
+def _run_summary_prompt(prompt, cache_namespace):
+    """Send a summarization prompt, turning failures into user-facing messages."""
+    model = get_model()
+    
+    if not model:
+        return "AI summarization is currently unavailable. Please check your API configuration."
+    
+    try:
+        response = model.generate_content(prompt, cache_namespace=cache_namespace)
+        return _summary_text(response)
     except Exception as e:
-        logger.error(f"Error generating summary: {str(e)}")
-        error_msg = str(e).lower()
-        
-        if "api_key" in error_msg or "authentication" in error_msg:
-            return "API authentication failed. Please check your Gemini API key configuration."
-        elif "quota" in error_msg or "limit" in error_msg:
-            return "API quota exceeded. Please try again later or check your API limits."
-        elif "safety" in error_msg:
-            return "Content was filtered for safety reasons. Please try with different content."
-        else:
-            return f"Error generating summary: {str(e)}"
+        return _summary_error_message(e)
+
+
+def _summary_text(response):
+    if response and response.text:
+        return response.text.strip()
+    else:
+        return "Unable to generate summary. The AI service returned an empty response."
+
+
+def _summary_error_message(e):
+    logger.error(f"Error generating summary: {str(e)}")
+    error_msg = str(e).lower()
+    
+    if "api_key" in error_msg or "authentication" in error_msg:
+        return "API authentication failed. Please check your AI provider configuration."
+    elif "quota" in error_msg or "limit" in error_msg:
+        return "API quota exceeded. Please try again later or check your API limits."
+    elif "safety" in error_msg:
+        return "Content was filtered for safety reasons. Please try with different content."
+    else:
+        return f"Error generating summary: {str(e)}"
+
+
+def build_answer_prompt(question, context):
+    """Prompt asking the model to answer a question from document context."""
+    # Limit context length
+    max_chars = PROMPT_MAX_CHARS
+    if len(context) > max_chars:
+        context = context[:max_chars] + "..."
+    
+    return f"""
+    Based on the following document content, please answer the user's question accurately and comprehensively.
+    The content may consist of excerpts from the document separated by [...], each starting with the
+    page it comes from, like [Page 3]. Mention the page numbers you drew on.
+    If the answer is not clearly available in the document, please indicate that.
+
+    Document Content:
+    {context}
+
+    Question: {question}
+
+    Please provide a detailed answer based on the document content:
+    """
 
 
 def answer_question(question, context):
-    """Answer question based on document context using Gemini API."""
+    """Answer question based on document context using the AI model."""
     model = get_model()
     
     if not model:
@@ -122,24 +285,32 @@ def answer_question(question, context):
         return "Please provide both a question and document context."
     
     try:
-        # Limit context length
-        max_chars = 8000
-        if len(context) > max_chars:
-            context = context[:max_chars] + "..."
+        prompt = build_answer_prompt(question, context)
+        response = model.generate_content(prompt, cache_namespace='answer_question')
         
-        prompt = f"""
-        Based on the following document content, please answer the user's question accurately and comprehensively.
-        If the answer is not clearly available in the document, please indicate that.
-
-        Document Content:
-        {context}
+        if response and response.text:
+            return response.text.strip()
+        else:
+            return "Unable to generate an answer. Please try rephrasing your question."
+            
+    except Exception as e:
+        logger.error(f"Error answering question: {str(e)}")
+        return f"Sorry, I couldn't process your question: {str(e)}"
 
-        Question: {question}
 
-        Please provide a detailed answer based on the document content:
-        """
-        
-        response = model.generate_content(prompt)
+async def aanswer_question(question, context):
+    """Async version of answer_question."""
+    model = get_async_model()
+    
+    if not model:
+        return "AI Q&A is currently unavailable. Please check your API configuration."
+    
+    if not question or not context:
+        return "Please provide both a question and document context."
+    
+    try:
+        prompt = build_answer_prompt(question, context)
+        response = await model.generate_content_async(prompt, cache_namespace='answer_question')
         
         if response and response.text:
             return response.text.strip()
@@ -151,12 +322,128 @@ def answer_question(question, context):
         return f"Sorry, I couldn't process your question: {str(e)}"
 
 
+async def astream_answer(question, context):
+    """Answer a question like answer_question, yielding the text as the model generates it."""
+    model = get_async_model()
+    
+    if not model:
+        yield "AI Q&A is currently unavailable. Please check your API configuration."
+        return
+    
+    if not question or not context:
+        yield "Please provide both a question and document context."
+        return
+    
+    prompt = build_answer_prompt(question, context)
+    # The cache's persistent (file) tier blocks; keep it off the event loop
+    cached = await sync_to_async(model.cached_text, thread_sensitive=False)(prompt, cache_namespace='answer_question')
+    if cached is not None:
+        yield cached
+        return
+    
+    parts = []
+    started = time.perf_counter()
+    try:
+        response = await model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                parts.append(chunk.text)
+                yield chunk.text
+    except Exception as e:
+        observe_ai_call('answer_question_stream', time.perf_counter() - started, prompt, None, outcome='error')
+        logger.error(f"Error answering question: {str(e)}")
+        yield f"Sorry, I couldn't process your question: {str(e)}"
+        return
+    observe_ai_call('answer_question_stream', time.perf_counter() - started, prompt, "".join(parts))
+    
+    if parts:
+        await sync_to_async(model.cache_text, thread_sensitive=False)(
+            prompt, "".join(parts).strip(), cache_namespace='answer_question',
+        )
+    else:
+        yield "Unable to generate an answer. Please try rephrasing your question."
+
+
+def build_test_prompt(text_content, num_questions, avoid=()):
+    """Prompt asking the model for multiple choice questions as JSON."""
+    # Limit text length
+    max_chars = PROMPT_MAX_CHARS
+    if len(text_content) > max_chars:
+        text_content = text_content[:max_chars] + "..."
+
+    avoid_text = ""
+    if avoid:
+        listed = "\n".join(f"    - {question}" for question in avoid)
+        avoid_text = f"\n    Do not repeat or rephrase any of these existing questions:\n{listed}\n"
+
+    return f"""
+    Based on the following text content, generate {num_questions} multiple choice questions for a quiz.
+    Each question should have 4 options (A, B, C, D) with only one correct answer.
+    Focus on key concepts, important facts, and main ideas from the text.
+    {avoid_text}
+    Please format your response as a JSON array with this exact structure:
+    [
+        {{
+            "question": "Question text here",
+            "options": {{
+                "A": "Option A text",
+                "B": "Option B text", 
+                "C": "Option C text",
+                "D": "Option D text"
+            }},
+            "correct_answer": "A"
+        }}
+    ]
+
+    Text Content:
+    {text_content}
+    """
+
+
+def parse_test_questions(response):
+    """Extract and validate the JSON question list from a model response."""
+    if not response or not response.text:
+        logger.error("Empty response from the AI model")
+        return []
+    
+    response_text = response.text.strip()
+    
+    # Try to find JSON in the response
+    start_idx = response_text.find('[')
+    end_idx = response_text.rfind(']') + 1
+    
+    if start_idx >= 0 and end_idx > start_idx:
+        json_text = response_text[start_idx:end_idx]
+        try:
+            questions = json.loads(json_text)
+            
+            # Validate the structure
+            valid_questions = []
+            for q in questions:
+                if (isinstance(q, dict) and 
+                    'question' in q and 
+                    'options' in q and 
+                    'correct_answer' in q and
+                    isinstance(q['options'], dict) and
+                    len(q['options']) == 4):
+                    valid_questions.append(q)
+            
+            return valid_questions
+            
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON decode error: {str(e)}")
+            return []
+    else:
+        logger.error("No valid JSON found in response")
+        return []
+
+
 def generate_test_questions(text_content, num_questions=5):
     """Generate test questions based on document content."""
     model = get_model()
     
     if not model:
-        logger.error("Gemini model not available for test generation")
+        logger.error("AI model not available for test generation")
         return []
     
     if not text_content or len(text_content.strip()) < 100:
@@ -164,76 +451,58 @@ def generate_test_questions(text_content, num_questions=5):
         return []
     
     try:
-        # Limit text length
-        max_chars = 8000
-        if len(text_content) > max_chars:
-            text_content = text_content[:max_chars] + "..."
-        
-        prompt = f"""
-        Based on the following text content, generate {num_questions} multiple choice questions for a quiz.
-        Each question should have 4 options (A, B, C, D) with only one correct answer.
-        Focus on key concepts, important facts, and main ideas from the text.
-        
-        Please format your response as a JSON array with this exact structure:
-        [
-            {{
-                "question": "Question text here",
-                "options": {{
-                    "A": "Option A text",
-                    "B": "Option B text", 
-                    "C": "Option C text",
-                    "D": "Option D text"
-                }},
-                "correct_answer": "A"
-            }}
-        ]
-
-        Text Content:
-        {text_content}
-        """
-        
-        response = model.generate_content(prompt)
-        
-        if not response or not response.text:
-            logger.error("Empty response from Gemini API")
-            return []
-        
-        response_text = response.text.strip()
-        
-        # Try to find JSON in the response
-        start_idx = response_text.find('[')
-        end_idx = response_text.rfind(']') + 1
-        
-        if start_idx >= 0 and end_idx > start_idx:
-            json_text = response_text[start_idx:end_idx]
-            try:
-                questions = json.loads(json_text)
-                
-                # Validate the structure
-                valid_questions = []
-                for q in questions:
-                    if (isinstance(q, dict) and 
-                        'question' in q and 
-                        'options' in q and 
-                        'correct_answer' in q and
-                        isinstance(q['options'], dict) and
-                        len(q['options']) == 4):
-                        valid_questions.append(q)
-                
-                return valid_questions
-                
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON decode error: {str(e)}")
-                return []
-        else:
-            logger.error("No valid JSON found in response")
-            return []
+        prompt = build_test_prompt(text_content, num_questions)
+        response = model.generate_content(prompt, cache_namespace='generate_test_questions')
+        return parse_test_questions(response)
             
     except Exception as e:
         logger.error(f"Error generating test questions: {str(e)}")
         return []
 
 
+async def agenerate_test_questions(text_content, num_questions=5):
+    """Async version of generate_test_questions."""
+    model = get_async_model()
+    
+    if not model:
+        logger.error("AI model not available for test generation")
+        return []
+    
+    if not text_content or len(text_content.strip()) < 100:
+        logger.warning("Text content too short for test generation")
+        return []
+    
+    try:
+        prompt = build_test_prompt(text_content, num_questions)
+        response = await model.generate_content_async(prompt, cache_namespace='generate_test_questions')
+        return parse_test_questions(response)
+            
+    except Exception as e:
+        logger.error(f"Error generating test questions: {str(e)}")
+        return []
+
+
+def generate_bank_questions(text_content, num_questions, avoid=()):
+    """Generate questions for a document's question bank from one passage."""
+    model = get_model()
+
+    if not model:
+        logger.error("AI model not available for question bank generation")
+        return []
+
+    if not text_content or len(text_content.strip()) < 100:
+        return []
+
+    try:
+        prompt = build_test_prompt(text_content, num_questions, avoid=avoid)
+        response = model.generate_content(prompt, cache_namespace='generate_bank_questions')
+        return parse_test_questions(response)
+
+    except Exception as e:
+        logger.error(f"Error generating bank questions: {str(e)}")
+        return []
+
+
 def calculate_test_score(questions, user_answers):
     """Calculate test score based on user answers."""
     if not questions or not user_answers:
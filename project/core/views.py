@@ -1,15 +1,73 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.conf import settings
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.exceptions import PermissionDenied
+from django.core.files import File
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.views.decorators.http import require_http_methods
-from django.db.models import Count, Avg
+from asgiref.sync import sync_to_async
+from functools import wraps
 import json
 
+from .caching import conditional_page, latest_change
 from .forms import CustomUserCreationForm, DocumentUploadForm, QAForm
-from .models import Document, QASession, Test, TestAttempt
-from .utils import extract_text_from_pdf, generate_summary, answer_question, generate_test_questions, calculate_test_score
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, can_read_metrics, get_metrics_settings, render_metrics
+from .content_cache import record_hit, save_document_upload, sha256_of_file
+from .models import ChunkedUpload, Document, ProcessingJob, QASession, Test, TestAttempt
+from .pagination import keyset_page
+from .question_bank import draw_test_questions
+from .ratelimit import ai_user_context, current_ai_user
+from .retrieval import build_qa_context
+from .search import is_available as search_is_available, search as search_index
+from .stats import get_user_stats
+from .tasks import enqueue_document_processing, request_question_bank_refill
+from . import uploads
+from .utils import PROMPT_MAX_CHARS, aanswer_question, agenerate_test_questions, astream_answer, calculate_test_score
+
+# Questions per generated test
+TEST_QUESTION_COUNT = 5
+
+# Rows per page of the progress page's attempt history
+ATTEMPTS_PER_PAGE = 20
+
+# Results per page of the search page
+SEARCH_RESULTS_PER_PAGE = 20
+
+# Deepest search results page served; later pages are clamped to it
+SEARCH_MAX_PAGE = 100
+
+# Document pages per screen of the text reader
+TEXT_PAGES_PER_VIEW = 5
+
+
+def alogin_required(view_func):
+    """login_required for async views (Django 4.2's decorator only wraps sync views)."""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        # Resolving the lazy user hits the session and database, so do it off the event loop
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        # AI calls made by the view share the rate limit fairly per user
+        with ai_user_context(request.user.id):
+            return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+async def aget_object_or_404(klass, **kwargs):
+    """Async get_object_or_404; ``klass`` is a model or a queryset."""
+    queryset = klass._default_manager.all() if hasattr(klass, '_default_manager') else klass
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+arender = sync_to_async(render)
 
 
 def home(request):
@@ -39,96 +97,213 @@ def signup(request):
 @login_required
 def dashboard(request):
     """Main dashboard after login."""
-    documents = Document.objects.filter(user=request.user)[:5]
-    recent_tests = TestAttempt.objects.filter(user=request.user)[:5]
+    documents = Document.objects.listing().filter(user=request.user)[:5]
+    recent_tests = TestAttempt.objects.filter(user=request.user).select_related('test').defer('test__questions')[:5]
     recent_qa = QASession.objects.filter(user=request.user)[:5]
     
-    # Statistics
-    total_documents = documents.count()
-    total_tests = TestAttempt.objects.filter(user=request.user).count()
-    avg_score = TestAttempt.objects.filter(user=request.user).aggregate(Avg('score'))['score__avg'] or 0
+    # Statistics are kept up to date as documents and attempts are created
+    stats = get_user_stats(request.user)
     
     context = {
         'documents': documents,
         'recent_tests': recent_tests,
         'recent_qa': recent_qa,
-        'total_documents': total_documents,
-        'total_tests': total_tests,
-        'avg_score': round(avg_score, 1),
+        'total_documents': stats.document_count,
+        'total_tests': stats.attempt_count,
+        'avg_score': stats.average_percentage,
     }
     return render(request, 'core/dashboard.html', context)
 
 
-@login_required
-def upload_document(request):
+@alogin_required
+async def upload_document(request):
     """Upload and process PDF documents."""
     if request.method == 'POST':
-        form = DocumentUploadForm(request.POST, request.FILES)
+        form = DocumentUploadForm(request.POST, request.FILES, upload_error=getattr(request, 'upload_error', None))
         if form.is_valid():
-            document = form.save(commit=False)
-            document.user = request.user
-            document.save()
-            
-            # Process PDF
-            try:
-                # Extract text from PDF
-                pdf_content = extract_text_from_pdf(document.file)
-                
-                if pdf_content and not pdf_content.startswith("Error"):
-                    document.content = pdf_content
-                    
-                    # Generate summary
-                    summary = generate_summary(pdf_content)
-                    document.summary = summary
-                    document.is_processed = True
-                    document.save()
-                    
-                    messages.success(request, 'Document uploaded and processed successfully!')
-                else:
-                    document.content = pdf_content  # This will contain the error message
-                    document.summary = "Unable to process this PDF. Please ensure it contains readable text."
-                    document.is_processed = False
-                    document.save()
-                    
-                    messages.warning(request, 'Document uploaded but processing failed. Please check if the PDF contains readable text.')
-                    
-                return redirect('document_detail', document_id=document.id)
-                
-            except Exception as e:
-                document.content = f"Processing error: {str(e)}"
-                document.summary = "An error occurred while processing this document."
-                document.is_processed = False
-                document.save()
-                
-                messages.error(request, f'Error processing document: {str(e)}')
-                return redirect('document_detail', document_id=document.id)
+            document, processed = await sync_to_async(_store_upload)(request, form)
+            if processed:
+                messages.success(request, 'Document uploaded and processed successfully!')
+            else:
+                messages.success(request, 'Document uploaded! We are processing it in the background.')
+            return redirect('document_detail', document_id=document.id)
     else:
         form = DocumentUploadForm()
-    
-    return render(request, 'core/upload_document.html', {'form': form})
+
+    context = {
+        'form': form,
+        'max_upload_size': settings.DOCUMENT_UPLOAD_MAX_SIZE,
+        'upload_chunk_size': settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+    }
+    return await arender(request, 'core/upload_document.html', context)
+
+
+def _store_upload(request, form):
+    """Save an uploaded document; returns it and whether it was already processed."""
+    document = form.save(commit=False)
+    document.user = request.user
+    return _store_document(document, sha256_of_file(request.FILES['file']))
+
+
+def _store_document(document, sha256):
+    """Save a new document with its file's hash; returns it and whether it was already processed."""
+    # Identical files are stored once and processed once
+    cache_entry = save_document_upload(document, sha256)
+
+    if cache_entry.content and cache_entry.summary:
+        document.set_content(cache_entry.content, cache_entry.page_offsets)
+        document.summary = cache_entry.summary
+        document.is_processed = True
+        document.save(update_fields=['summary', 'is_processed', 'updated_at'])
+        record_hit(cache_entry)
+        return document, True
+
+    # Extraction and summarization run on the background job queue
+    enqueue_document_processing(document)
+    return document, False
+
+
+def _chunked_upload_state(upload):
+    return {
+        'id': str(upload.id),
+        'size': upload.size,
+        'received': upload.received,
+        'chunk_size': settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+    }
 
 
 @login_required
+@require_http_methods(['POST'])
+def start_chunked_upload(request):
+    """Start a resumable upload (used by the upload page for larger files)."""
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': "Missing file size."}, status=400)
+    try:
+        upload = uploads.start_chunked_upload(
+            request.user, request.POST.get('title', '').strip(), request.POST.get('file_name', ''), size,
+        )
+    except uploads.UploadRejected as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(_chunked_upload_state(upload), status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'PUT', 'DELETE'])
+def chunked_upload(request, upload_id):
+    """
+    GET: how much of a resumable upload has arrived. PUT: the next piece, as
+    the request body, at ``?offset=`` bytes. DELETE: cancel the upload.
+    """
+    upload = get_object_or_404(ChunkedUpload, id=upload_id, user=request.user)
+    if request.method == 'GET':
+        return JsonResponse(_chunked_upload_state(upload))
+    if request.method == 'DELETE':
+        upload.delete()
+        return HttpResponse(status=204)
+
+    try:
+        offset = int(request.GET.get('offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({'error': "Missing offset."}, status=400)
+    try:
+        uploads.append_chunk(upload, offset, request, length)
+        if not upload.is_complete:
+            return JsonResponse(_chunked_upload_state(upload))
+        path, sha256 = uploads.finish_chunked_upload(upload)
+    except uploads.ChunkOffsetMismatch:
+        upload.refresh_from_db()
+        return JsonResponse(_chunked_upload_state(upload), status=409)
+    except uploads.UploadRejected as e:
+        upload.delete()
+        return JsonResponse({'error': str(e)}, status=400)
+
+    with open(path, 'rb') as uploaded:
+        document = Document(user=request.user, title=upload.title, file=File(uploaded, name=upload.file_name))
+        document, processed = _store_document(document, sha256)
+    upload.delete()
+    if processed:
+        messages.success(request, 'Document uploaded and processed successfully!')
+    else:
+        messages.success(request, 'Document uploaded! We are processing it in the background.')
+    return JsonResponse({'redirect': reverse('document_detail', args=[document.id])})
+
+
+def _document_detail_changed(request, document_id):
+    documents = Document.objects.filter(id=document_id, user=request.user)
+    return latest_change(documents, 'updated_at', 'processing_jobs__updated_at')
+
+
+@login_required
+@conditional_page(_document_detail_changed)
 def document_detail(request, document_id):
     """Display document details and summary."""
-    document = get_object_or_404(Document, id=document_id, user=request.user)
-    return render(request, 'core/document_detail.html', {'document': document})
+    # The summary is rendered from the fragment cache, and only loaded on a miss
+    document = get_object_or_404(Document.objects.listing(), id=document_id, user=request.user)
+    job = document.processing_jobs.filter(kind=ProcessingJob.KIND_PROCESS).first()
+    context = {
+        'document': document,
+        'job': job,
+    }
+    return render(request, 'core/document_detail.html', context)
 
 
 @login_required
-def qa_session(request, document_id):
+def document_text(request, document_id):
+    """Read a document's extracted text a few pages at a time."""
+    document = get_object_or_404(Document.objects.listing(), id=document_id, user=request.user)
+    page_count = document.page_count
+    try:
+        first = min(max(int(request.GET.get('page', 1)), 1), max(page_count, 1))
+    except ValueError:
+        first = 1
+    # Only the pages on screen are loaded, however long the document
+    pages = document.read_pages(first, first + TEXT_PAGES_PER_VIEW - 1)
+    context = {
+        'document': document,
+        'pages': pages,
+        'page_count': page_count,
+        'previous_page': max(first - TEXT_PAGES_PER_VIEW, 1) if first > 1 else None,
+        'next_page': first + TEXT_PAGES_PER_VIEW if first + TEXT_PAGES_PER_VIEW <= page_count else None,
+    }
+    return render(request, 'core/document_text.html', context)
+
+
+@login_required
+def document_status(request, document_id):
+    """Processing status of a document, polled by the document detail page."""
+    document = get_object_or_404(Document.objects.listing(), id=document_id, user=request.user)
+    job = document.processing_jobs.filter(kind=ProcessingJob.KIND_PROCESS).first()
+    stage = None
+    if job:
+        stage = "AI service busy, retrying shortly" if job.is_waiting_to_retry else job.get_stage_display()
+    return JsonResponse({
+        'is_processed': document.is_processed,
+        'status': job.status if job else None,
+        'stage': stage,
+        'progress': job.progress if job else (100 if document.is_processed else 0),
+        'error': job.error if job else '',
+    })
+
+
+@alogin_required
+async def qa_session(request, document_id):
     """Q&A session for a document."""
-    document = get_object_or_404(Document, id=document_id, user=request.user)
+    document = await aget_object_or_404(Document.objects.listing(), id=document_id, user=request.user)
     qa_sessions = QASession.objects.filter(document=document, user=request.user)
     
     if request.method == 'POST':
         form = QAForm(request.POST)
         if form.is_valid():
             question = form.cleaned_data['question']
-            answer = answer_question(question, document.content)
+            # Only the passages relevant to the question are sent to the model
+            context = await sync_to_async(build_qa_context)(document, question)
+            answer = await aanswer_question(question, context)
             
             # Save Q&A session
-            QASession.objects.create(
+            await QASession.objects.acreate(
                 user=request.user,
                 document=document,
                 question=question,
@@ -145,19 +320,71 @@ def qa_session(request, document_id):
         'form': form,
         'qa_sessions': qa_sessions,
     }
-    return render(request, 'core/qa_session.html', context)
+    return await arender(request, 'core/qa_session.html', context)
 
 
-@login_required
-def generate_test(request, document_id):
+def _sse_event(event, data):
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def qa_stream(request, document_id):
+    """Stream the answer to a question as server-sent events, then save the Q&A session."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    # The lazy user and session hit the database, which async code must not do directly
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+
+    document = await aget_object_or_404(Document.objects.listing(), id=document_id, user=user)
+
+    form = QAForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    question = form.cleaned_data['question']
+    context = await sync_to_async(build_qa_context)(document, question)
+
+    async def event_stream():
+        # Runs after the view returns, in the context of whatever iterates the response
+        current_ai_user.set(user.id)
+        parts = []
+        async for text in astream_answer(question, context):
+            parts.append(text)
+            yield _sse_event('token', {'text': text})
+
+        qa = await QASession.objects.acreate(
+            user=user,
+            document=document,
+            question=question,
+            answer="".join(parts).strip(),
+        )
+        yield _sse_event('done', {'id': str(qa.id)})
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let a reverse proxy buffer the stream
+    return response
+
+
+@alogin_required
+async def generate_test(request, document_id):
     """Generate test questions for a document."""
-    document = get_object_or_404(Document, id=document_id, user=request.user)
+    document = await aget_object_or_404(Document.objects.listing(), id=document_id, user=request.user)
     
     if request.method == 'POST':
         try:
-            questions = generate_test_questions(document.content)
+            # Sample from the document's question bank; ask the model directly
+            # only while the bank is still being filled
+            questions = await sync_to_async(draw_test_questions)(document, TEST_QUESTION_COUNT)
+            if questions is None:
+                # Only the pages the prompt has room for are loaded, on this fallback path
+                content = await sync_to_async(document.read_text)(0, PROMPT_MAX_CHARS)
+                questions = await agenerate_test_questions(content, TEST_QUESTION_COUNT)
+            await sync_to_async(request_question_bank_refill)(document)
             if questions:
-                test = Test.objects.create(
+                test = await Test.objects.acreate(
                     user=request.user,
                     document=document,
                     title=f"Test for {document.title}",
@@ -171,18 +398,27 @@ def generate_test(request, document_id):
             messages.error(request, f'Error generating test: {str(e)}')
     
     # Show existing tests for this document
-    existing_tests = Test.objects.filter(document=document, user=request.user)
+    existing_tests = Test.objects.filter(document=document, user=request.user).prefetch_related('attempts')
     context = {
         'document': document,
         'existing_tests': existing_tests,
     }
-    return render(request, 'core/generate_test.html', context)
+    return await arender(request, 'core/generate_test.html', context)
+
+
+def _take_test_changed(request, test_id):
+    return latest_change(Test.objects.filter(id=test_id, user=request.user), 'created_at', 'document__updated_at')
 
 
 @login_required
+@conditional_page(_take_test_changed)
 def take_test(request, test_id):
     """Take a test."""
-    test = get_object_or_404(Test, id=test_id, user=request.user)
+    # The questions are rendered from the fragment cache, and only loaded on a miss
+    test = get_object_or_404(
+        Test.objects.select_related('document').defer('questions', 'document__summary'),
+        id=test_id, user=request.user,
+    )
     context = {
         'test': test,
     }
@@ -221,10 +457,21 @@ def submit_test(request, test_id):
         return redirect('take_test', test_id=test.id)
 
 
+def _test_result_changed(request, attempt_id):
+    attempts = TestAttempt.objects.filter(id=attempt_id, user=request.user)
+    return latest_change(attempts, 'completed_at', 'test__document__updated_at')
+
+
 @login_required
+@conditional_page(_test_result_changed)
 def test_result(request, attempt_id):
     """Display test results."""
-    attempt = get_object_or_404(TestAttempt, id=attempt_id, user=request.user)
+    attempt = get_object_or_404(
+        TestAttempt.objects.select_related('test__document').defer(
+            'answers', 'test__questions', 'test__document__summary',
+        ),
+        id=attempt_id, user=request.user,
+    )
     context = {
         'attempt': attempt,
     }
@@ -234,25 +481,63 @@ def test_result(request, attempt_id):
 @login_required
 def progress_tracking(request):
     """Progress tracking page."""
-    documents = Document.objects.filter(user=request.user)
-    test_attempts = TestAttempt.objects.filter(user=request.user).order_by('-completed_at')
+    documents = Document.objects.listing().filter(user=request.user).select_related('stats')
+    # Attempt history is paged by completion time; each row needs its test and document titles
+    attempts = TestAttempt.objects.filter(user=request.user).select_related('test__document').only(
+        'id', 'score', 'total_questions', 'completed_at', 'test__title', 'test__document__title',
+    )
+    test_attempts, next_cursor = keyset_page(
+        attempts, 'completed_at', cursor=request.GET.get('before'), per_page=ATTEMPTS_PER_PAGE,
+    )
     
-    # Calculate statistics
-    total_documents = documents.count()
-    total_tests = test_attempts.count()
-    if test_attempts:
-        avg_score = sum(attempt.percentage for attempt in test_attempts) / total_tests
-        recent_scores = [attempt.percentage for attempt in test_attempts[:10]]
-    else:
-        avg_score = 0
-        recent_scores = []
+    # Statistics are kept up to date as documents and attempts are created
+    stats = get_user_stats(request.user)
     
     context = {
         'documents': documents,
         'test_attempts': test_attempts,
-        'total_documents': total_documents,
-        'total_tests': total_tests,
-        'avg_score': round(avg_score, 1),
-        'recent_scores': recent_scores,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('before'),
+        'total_documents': stats.document_count,
+        'total_tests': stats.attempt_count,
+        'avg_score': stats.average_percentage,
+        'best_score': round(stats.best_percentage, 2),
+        'recent_scores': stats.recent_percentages,
     }
-    return render(request, 'core/progress_tracking.html', context)
\ No newline at end of file
+    return render(request, 'core/progress_tracking.html', context)
+
+
+@login_required
+def search(request):
+    """Full-text search across the user's documents, summaries and Q&A history."""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = min(max(int(request.GET.get('page', 1)), 1), SEARCH_MAX_PAGE)
+    except ValueError:
+        page = 1
+
+    results, has_next = search_index(request.user, query, page=page, per_page=SEARCH_RESULTS_PER_PAGE)
+    # Results carry ids only; fetch the document titles they link to in one query
+    titles = dict(
+        Document.objects.filter(id__in={result.document_id for result in results}).values_list('id', 'title')
+    )
+
+    context = {
+        'query': query,
+        'results': [(result, titles.get(result.document_id, '')) for result in results],
+        'page': page,
+        'has_next': has_next and page < SEARCH_MAX_PAGE,
+        'previous_page': page - 1,
+        'next_page': page + 1,
+        'search_available': search_is_available(),
+    }
+    return render(request, 'core/search.html', context)
+
+
+def metrics(request):
+    """Timing metrics in the Prometheus text format, for staff and scrapers with METRICS['TOKEN']."""
+    if not get_metrics_settings()['ENABLED']:
+        raise Http404()
+    if not can_read_metrics(request):
+        raise PermissionDenied()
+    return HttpResponse(render_metrics(), content_type=METRICS_CONTENT_TYPE)
@@ -4,7 +4,7 @@ Django settings for smartx_study project.
 
 import os
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -29,6 +29,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -42,7 +44,8 @@ ROOT_URLCONF = 'smartx_study.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend, timing each page render (see core/metrics.py)
+        'BACKEND': 'core.backends.templates.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -57,14 +60,52 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'smartx_study.wsgi.application'
+ASGI_APPLICATION = 'smartx_study.asgi.application'
 
-# Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database: SQLite by default, or Postgres with DB_ENGINE=postgresql (needs the psycopg package)
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='smartx_study'),
+            'USER': config('DB_USER', default=''),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            # Reuse connections across requests, checking them first. Under ASGI set
+            # DB_CONN_MAX_AGE=0 and pool with PgBouncer instead.
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),  # seconds
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.backends.sqlite3',  # Django's, plus the settings below
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0, cast=int),
+        }
     }
+
+# WAL is opt-in (SQLITE_JOURNAL_MODE=wal): it sticks to the database file and
+# adds -wal/-shm files next to it, which the checked-in db.sqlite3 shouldn't get
+SQLITE_JOURNAL_MODE = config('SQLITE_JOURNAL_MODE', default='')
+
+# Set on every new SQLite connection (see core/backends/sqlite3/base.py); empty means SQLite's default
+SQLITE_PRAGMAS = {
+    'journal_mode': SQLITE_JOURNAL_MODE,
+    # NORMAL is only safe against corruption in WAL mode
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='normal' if SQLITE_JOURNAL_MODE.lower() == 'wal' else ''),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=20000, cast=int),  # milliseconds
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),  # bytes
 }
+# Transactions take the write lock when they start, so they wait for it rather than fail
+SQLITE_TRANSACTION_MODE = config('SQLITE_TRANSACTION_MODE', default='IMMEDIATE')
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -106,8 +147,128 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'home'
 
+# AI backend (see core/providers.py): 'gemini', 'stub' or 'http'. Left empty, the stub
+# server is used when AI_STUB_SERVER_URL is set, and Gemini otherwise.
+AI_PROVIDER = config('AI_PROVIDER', default='')
+
 # Gemini API Configuration
 GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
+GEMINI_MODEL = config('GEMINI_MODEL', default='gemini-2.5-flash')
+
+# Local stub model server (manage.py stub_model_server)
+AI_STUB_SERVER_URL = config('AI_STUB_SERVER_URL', default='')
+
+# Local model server with an OpenAI-compatible API (llama.cpp, vLLM, Ollama, ...)
+AI_HTTP_SERVER = {
+    'URL': config('AI_HTTP_SERVER_URL', default='http://127.0.0.1:8080/v1'),
+    'MODEL': config('AI_HTTP_MODEL', default=''),  # empty: the server's default model
+    'API_KEY': config('AI_HTTP_API_KEY', default=''),
+    'TIMEOUT': 120,  # seconds
+}
+
+# Caches
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Persistent tier of the Gemini response cache, shared across worker processes
+    'ai_responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'ai_responses',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Rendered fragments of pages that don't change once created (see core/caching.py).
+    # File-based so that invalidating an entry reaches every worker process.
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'fragments',
+        'TIMEOUT': 60 * 60 * 24 * 7,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Gemini response cache (see core/ai_cache.py)
+AI_RESPONSE_CACHE = {
+    'ENABLED': config('AI_RESPONSE_CACHE_ENABLED', default=True, cast=bool),
+    'TTL': config('AI_RESPONSE_CACHE_TTL', default=60 * 60 * 24, cast=int),  # seconds
+    'MAX_ENTRIES': 512,  # in-memory LRU tier, per process
+    'PERSISTENT_CACHE': 'ai_responses',  # alias in CACHES, or None for memory only
+    # Regenerating a test should give fresh questions, so it bypasses the cache
+    'DISABLED_FUNCTIONS': ['generate_test_questions'],
+}
+
+# Background document processing
+DOCUMENT_PROCESSING_WORKERS = config('DOCUMENT_PROCESSING_WORKERS', default=2, cast=int)
+DOCUMENT_PROCESSING_STALE_AFTER = config('DOCUMENT_PROCESSING_STALE_AFTER', default=600, cast=int)  # seconds
+DOCUMENT_PROCESSING_MAX_ATTEMPTS = config('DOCUMENT_PROCESSING_MAX_ATTEMPTS', default=3, cast=int)
+DOCUMENT_PROCESSING_RETRY_DELAY = config('DOCUMENT_PROCESSING_RETRY_DELAY', default=60, cast=int)  # seconds, doubles per attempt
+
+# PDF text extraction
+PDF_EXTRACTION_WORKERS = config('PDF_EXTRACTION_WORKERS', default=os.cpu_count() or 1, cast=int)
+PDF_EXTRACTION_PAGE_TIMEOUT = config('PDF_EXTRACTION_PAGE_TIMEOUT', default=10, cast=int)  # seconds per page
+PDF_EXTRACTION_PARALLEL_MIN_PAGES = config('PDF_EXTRACTION_PARALLEL_MIN_PAGES', default=16, cast=int)
+
+# Retrieval for Q&A (see core/retrieval.py)
+QA_CHUNK_SIZE = 1200  # characters
+QA_CHUNK_OVERLAP = 200
+QA_RETRIEVAL_TOP_K = 6
+
+# Map-reduce summarization of long documents (see core/summarization.py)
+SUMMARY_SECTION_TOKENS = 2000  # approximate prompt budget per section
+SUMMARY_MAX_WORKERS = config('SUMMARY_MAX_WORKERS', default=4, cast=int)
+
+# Compressed storage of large text columns (see core/compression.py).
+# 'zstd' needs the optional zstandard package; zlib is always available.
+TEXT_COMPRESSION = {
+    'CODEC': config('TEXT_COMPRESSION_CODEC', default='zlib'),
+    'LEVEL': 6,
+    'MIN_LENGTH': 128,  # bytes; shorter values are stored as-is
+}
+
+# Rendered summaries kept per process by the markdown template filter
+MARKDOWN_CACHE_SIZE = 256
+
+# Per-document question bank that tests are sampled from (see core/question_bank.py)
+QUESTION_BANK_SIZE = config('QUESTION_BANK_SIZE', default=50, cast=int)  # unseen questions to keep ready
+QUESTION_BANK_REFILL_BELOW = config('QUESTION_BANK_REFILL_BELOW', default=15, cast=int)
+QUESTION_BANK_BATCH_QUESTIONS = 10  # questions per model call
+
+# Shared limits for every call to the AI backend (see core/ratelimit.py)
+AI_RATE_LIMIT = {
+    'REQUESTS_PER_MINUTE': config('AI_REQUESTS_PER_MINUTE', default=60, cast=int),
+    'BURST': config('AI_REQUEST_BURST', default=10, cast=int),
+    'MAX_CONCURRENT': config('AI_MAX_CONCURRENT', default=8, cast=int),
+    'MAX_CONCURRENT_PER_USER': config('AI_MAX_CONCURRENT_PER_USER', default=3, cast=int),
+    # Quota, overload and timeout errors are retried with jittered exponential backoff
+    'MAX_RETRIES': config('AI_MAX_RETRIES', default=4, cast=int),
+    'BACKOFF_BASE': 1.0,  # seconds
+    'BACKOFF_MAX': 30.0,
+}
+
+# Identical AI calls made at the same time share one request (see core/singleflight.py)
+AI_SINGLE_FLIGHT = {
+    'ENABLED': config('AI_SINGLE_FLIGHT_ENABLED', default=True, cast=bool),
+    'CROSS_PROCESS': True,  # coordinate worker processes through the database
+    'WAIT_TIMEOUT': 120,  # seconds to wait on another process before calling anyway
+    'RESULT_GRACE': 15,  # seconds a finished response stays readable for calls already waiting on it
+    'POLL_INTERVAL': 0.1,  # seconds
+}
+
+# Timing metrics, served at /metrics in the Prometheus text format (see core/metrics.py)
+METRICS = {
+    'ENABLED': config('METRICS_ENABLED', default=True, cast=bool),
+    # Server-Timing header with each response's database, template and AI time
+    'SERVER_TIMING': config('METRICS_SERVER_TIMING', default=DEBUG, cast=bool),
+    # Bearer token a scraper sends to read /metrics (staff users can always read it)
+    'TOKEN': config('METRICS_TOKEN', default=''),
+    # Client addresses allowed without the token; only meaningful with no reverse proxy in front
+    'ALLOWED_IPS': config('METRICS_ALLOWED_IPS', default='', cast=Csv()),
+}
 
 # Logging configuration
 LOGGING = {
@@ -128,9 +289,29 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        # DEBUG logs every request's timings
+        'core.metrics': {
+            'handlers': ['console'],
+            'level': config('METRICS_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+        # Don't log every request to the AI backend
+        'httpx': {
+            'level': 'WARNING',
+        },
     },
 }
 
 # File upload settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
\ No newline at end of file
+# Uploads stream to a temporary file on disk, hashed and checked as they arrive
+# (see core/uploads.py). Under ASGI the request body is also spooled to disk past
+# FILE_UPLOAD_MAX_MEMORY_SIZE, so keep it small.
+FILE_UPLOAD_HANDLERS = ['core.uploads.PDFUploadHandler']
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+DOCUMENT_UPLOAD_MAX_SIZE = config('DOCUMENT_UPLOAD_MAX_SIZE', default=10 * 1024 * 1024, cast=int)  # bytes
+
+# Resumable uploads: the upload page sends files larger than one chunk in pieces
+CHUNKED_UPLOAD_DIR = BASE_DIR / 'uploads' / 'partial'
+CHUNKED_UPLOAD_CHUNK_SIZE = config('CHUNKED_UPLOAD_CHUNK_SIZE', default=2 * 1024 * 1024, cast=int)  # bytes
+CHUNKED_UPLOAD_EXPIRY = config('CHUNKED_UPLOAD_EXPIRY', default=60 * 60 * 24, cast=int)  # seconds
\ No newline at end of file
@@ -6,6 +6,8 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeAnimations();
     initializeFormEnhancements();
     initializeNotifications();
+    initializeStreamingQA();
+    initializeResumableUploads();
 });
 
 // Tooltip initialization
@@ -219,6 +221,208 @@ function getNotificationIcon(type) {
     return icons[type] || 'info-circle';
 }
 
+// Streaming Q&A: render the answer token by token from the server-sent event stream
+function initializeStreamingQA() {
+    const forms = document.querySelectorAll('form[data-stream-url]');
+    if (!window.fetch || !window.ReadableStream || !window.TextDecoder) {
+        return;  // Fall back to the regular form submission
+    }
+
+    forms.forEach(form => {
+        form.addEventListener('submit', function(event) {
+            if (event.defaultPrevented) {
+                return;
+            }
+            event.preventDefault();
+            streamAnswer(form);
+        });
+    });
+}
+
+async function streamAnswer(form) {
+    const output = document.getElementById(form.dataset.streamTarget);
+    const questionEl = output.querySelector('[data-stream-question]');
+    const answerEl = output.querySelector('[data-stream-answer]');
+    const button = form.querySelector('button[type="submit"]');
+    const formData = new FormData(form);
+
+    questionEl.textContent = formData.get('question');
+    answerEl.textContent = '';
+    output.classList.remove('hidden');
+    showLoading(button);
+
+    // Once tokens have arrived the server may already have saved the answer,
+    // so resubmitting the form could ask and store the question twice
+    let received = false;
+    let finished = false;
+    try {
+        const response = await fetch(form.dataset.streamUrl, {
+            method: 'POST',
+            body: formData,
+            credentials: 'same-origin',
+            headers: { 'X-CSRFToken': formData.get('csrfmiddlewaretoken') },
+        });
+        if (!response.ok || !response.body) {
+            throw new Error(`Streaming request failed with status ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const event = parseServerSentEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                if (event.type === 'token') {
+                    received = true;
+                    answerEl.textContent += event.data.text;
+                } else if (event.type === 'done') {
+                    finished = true;
+                    form.reset();
+                }
+            }
+        }
+        if (!finished) {
+            throw new Error('The answer stream ended early');
+        }
+    } catch (error) {
+        if (received) {
+            console.warn('Streaming Q&A failed part way through:', error);
+            showNotification('The answer was interrupted. Reload the page to see whether it was saved.', 'error');
+            return;
+        }
+        console.warn('Streaming Q&A failed, falling back to a regular submit:', error);
+        output.classList.add('hidden');
+        HTMLFormElement.prototype.submit.call(form);
+        return;
+    } finally {
+        hideLoading(button);
+    }
+}
+
+function parseServerSentEvent(raw) {
+    const event = { type: 'message', data: null };
+    const dataLines = [];
+    raw.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            event.type = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trim());
+        }
+    });
+    if (dataLines.length) {
+        event.data = JSON.parse(dataLines.join('\n'));
+    }
+    return event;
+}
+
+// Resumable uploads: files larger than one chunk are sent in pieces, so a dropped
+// connection (or a reloaded page) only costs the piece that was in flight
+const UPLOAD_RETRY_DELAYS = [1000, 2000, 5000, 10000, 30000];
+
+function initializeResumableUploads() {
+    const forms = document.querySelectorAll('form[data-resumable-url]');
+    if (!window.fetch || !window.Blob || !Blob.prototype.slice) {
+        return;  // Fall back to the regular form submission
+    }
+
+    forms.forEach(form => {
+        form.addEventListener('submit', function(event) {
+            const input = form.querySelector('input[type="file"]');
+            const file = input && input.files[0];
+            // Small files go with the form in one request
+            if (event.defaultPrevented || !file || file.size <= Number(form.dataset.chunkSize)) {
+                return;
+            }
+            event.preventDefault();
+            resumableUpload(form, file);
+        });
+    });
+}
+
+async function resumableUpload(form, file) {
+    const button = form.querySelector('button[type="submit"]');
+    const formData = new FormData(form);
+    const csrfToken = formData.get('csrfmiddlewaretoken');
+    const startUrl = form.dataset.resumableUrl;
+    const storageKey = `resumable-upload:${file.name}:${file.size}:${file.lastModified}`;
+    showLoading(button);
+
+    try {
+        // Pick up an earlier attempt at the same file where it stopped
+        const previousId = loadFromStorage(storageKey);
+        let state = previousId ? await uploadRequest(`${startUrl}${previousId}/`).catch(() => null) : null;
+        if (!state) {
+            const body = new FormData();
+            body.append('title', formData.get('title'));
+            body.append('file_name', file.name);
+            body.append('size', file.size);
+            state = await uploadRequest(startUrl, { method: 'POST', body, csrfToken });
+            saveToStorage(storageKey, state.id);
+        }
+
+        const url = `${startUrl}${state.id}/`;
+        let failures = 0;
+        let resync = false;
+        while (!state.redirect) {
+            try {
+                if (resync) {
+                    state = await uploadRequest(url);
+                    resync = false;
+                    continue;
+                }
+                button.innerHTML = `<i class="fas fa-spinner fa-spin mr-2"></i>Uploading... ${Math.floor(100 * state.received / file.size)}%`;
+                const end = Math.min(state.received + state.chunk_size, file.size);
+                state = await uploadRequest(`${url}?offset=${state.received}`, {
+                    method: 'PUT',
+                    body: file.slice(state.received, end),
+                    csrfToken,
+                });
+                failures = 0;
+            } catch (error) {
+                if (error.status === 409) {
+                    state = error.data;  // Carry on from where the server says the file got to
+                } else if ((error.status && error.status < 500) || failures >= UPLOAD_RETRY_DELAYS.length) {
+                    throw error;
+                } else {
+                    await new Promise(resolve => setTimeout(resolve, UPLOAD_RETRY_DELAYS[failures++]));
+                    resync = true;
+                }
+            }
+        }
+        localStorage.removeItem(storageKey);
+        window.location.href = state.redirect;
+    } catch (error) {
+        if (error.status === 400) {
+            localStorage.removeItem(storageKey);
+        }
+        showNotification(error.message, 'error');
+        hideLoading(button);
+    }
+}
+
+async function uploadRequest(url, { method = 'GET', body = null, csrfToken = null } = {}) {
+    const headers = csrfToken ? { 'X-CSRFToken': csrfToken } : {};
+    const response = await fetch(url, { method, body, headers, credentials: 'same-origin' });
+    const data = await response.json().catch(() => null);
+    if (!response.ok || !data) {
+        const error = new Error((data && data.error) || `Upload failed with status ${response.status}`);
+        error.status = response.status;
+        error.data = data;
+        throw error;
+    }
+    return data;
+}
+
 // Utility functions
 function debounce(func, wait) {
     let timeout;